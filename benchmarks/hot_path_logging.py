@@ -0,0 +1,179 @@
+"""
+Per-frame cost of debug logging on the frame hot path.
+
+Every case is timed with silvair_otau_demo logger at DEBUG (records go to a handler which drops them),
+at WARNING (default console verbosity) and with logging disabled altogether. With DEBUG off the cost
+should be within noise of logging disabled.
+
+Run from repository root:
+    python -m benchmarks.hot_path_logging
+"""
+import logging
+import os
+import tempfile
+import timeit
+
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory
+
+LOGGER = logging.getLogger('silvair_otau_demo')
+
+CHUNK = bytes(range(16))
+PAGE_SIZE = 256
+REPEAT = 5
+NUMBER = 20000
+
+LEVELS = (
+    ('DEBUG', logging.DEBUG),
+    ('WARNING', logging.WARNING),
+    ('disabled', None),
+)
+
+
+class DropHandler(logging.Handler):
+    """
+    Handler formatting records like a real one, but writing them nowhere
+    """
+
+    def emit(self, record):
+        self.format(record)
+
+
+def set_level(level):
+    """
+    Set silvair_otau_demo logger level, None disables logging
+
+    :param level:   int or None, logging level
+    :return:        None
+    """
+    if level is None:
+        logging.disable(logging.CRITICAL)
+    else:
+        logging.disable(logging.NOTSET)
+        LOGGER.setLevel(level)
+
+
+def best_ns(func, number=NUMBER):
+    """
+    Best time of single call out of REPEAT runs
+
+    :param func:    callable, timed function
+    :param number:  int, calls per run
+    :return:        float, nanoseconds per call
+    """
+    return min(timeit.repeat(func, number=number, repeat=REPEAT)) / number * 1e9
+
+
+def bench_write_data(tmp_dir):
+    """
+    DFUMemory.write_data per chunk
+
+    :param tmp_dir: str, directory for DFU files
+    :return:        callable, timed function
+    """
+    dfu_memory = DFUMemory(os.path.join(tmp_dir, 'app_data'),
+                           os.path.join(tmp_dir, 'firmware'),
+                           os.path.join(tmp_dir, 'sha256'),
+                           PAGE_SIZE)
+    chunks_per_page = PAGE_SIZE // len(CHUNK)
+    state = {'chunks': chunks_per_page}
+
+    def write_data():
+        if state['chunks'] == chunks_per_page:
+            dfu_memory.create_page(PAGE_SIZE)
+            state['chunks'] = 0
+        dfu_memory.write_data(CHUNK)
+        state['chunks'] += 1
+
+    return write_data
+
+
+def bench_new_frame_notification():
+    """
+    Dispatcher.new_frame_notification with Write Data Event frames on the fast path
+
+    :return:    callable, timed function
+    """
+    from silvair_uart_common_libs.messages import UartCommand
+    from silvair_otau_demo.dispatcher import Dispatcher
+
+    class NullFSM:
+        def handle_message(self, msg):
+            pass
+
+        def dfu_write_data_payload_event(self, data):
+            return True
+
+    dispatcher = Dispatcher(NullFSM(), NullFSM())
+    dispatcher.write_data_fast_path = True
+    frame = bytes([len(CHUNK) + 1, UartCommand.DfuWriteDataEvent, len(CHUNK)]) + CHUNK
+
+    return lambda: dispatcher.new_frame_notification(frame)
+
+
+def bench_send_message():
+    """
+    Sender.send_message with a cached constant frame
+
+    :return:    callable, timed function
+    """
+    from silvair_uart_common_libs.message_types import DFUStatus
+    from silvair_uart_common_libs.messages import DfuPageStoreResponseMessage
+    from silvair_otau_demo.dispatcher import Sender
+
+    class NullAdapter:
+        def write_uart_frame(self, data):
+            pass
+
+    sender = Sender(NullAdapter())
+    msg = DfuPageStoreResponseMessage()
+    msg.status = DFUStatus.DFU_SUCCESS
+
+    return lambda: sender.send_message(msg)
+
+
+def bench_readable_hex():
+    """
+    Hex dump of a 128 byte frame, only paid with DEBUG on
+
+    :return:    callable, timed function
+    """
+    from silvair_otau_demo.dispatcher import bytes_to_readable_hex
+
+    frame = bytes(range(128))
+    return lambda: bytes_to_readable_hex(frame)
+
+
+def main():
+    handler = DropHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    LOGGER.addHandler(handler)
+    LOGGER.propagate = False
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        benchmarks = (
+            ('DFUMemory.write_data', lambda: bench_write_data(tmp_dir)),
+            ('Dispatcher.new_frame_notification', bench_new_frame_notification),
+            ('Sender.send_message', bench_send_message),
+            ('bytes_to_readable_hex', bench_readable_hex),
+        )
+
+        print('{:<36}'.format('ns/frame') + ''.join('{:>12}'.format(name) for name, _ in LEVELS))
+        for name, create in benchmarks:
+            try:
+                func = create()
+            except ImportError as e:
+                print('{:<36}skipped: {}'.format(name, e))
+                continue
+
+            results = []
+            for _, level in LEVELS:
+                set_level(level)
+                results.append(best_ns(func))
+
+            print('{:<36}'.format(name) + ''.join('{:>12.0f}'.format(result) for result in results))
+
+    set_level(logging.DEBUG)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+End to end OTAU throughput: McuOtauMock (DFU_Mgr, DFUMemory, DFU_NVM) fed by in-process ModemSimulator.
+
+Every combination of firmware size, supported page size and Write Data chunk size is run in a fresh process,
+so that peak RSS belongs to that single run. Reported per run:
+ - throughput in bytes/s, from DFU Init Request to final Page Store Response
+ - latency of handling single frame sent by modem (Dispatcher, FSMs, DFU_Mgr and response serialization),
+   50th, 90th and 99th percentile and max in microseconds
+ - peak RSS in KiB
+
+Results can be written to CSV and JSON. JSON results can be used as baseline of later runs, runs with throughput
+or p99 latency worse than baseline by more than tolerance are reported and make script exit with status 1.
+
+Run from repository root:
+    python -m benchmarks.otau_throughput --json baseline.json
+    python -m benchmarks.otau_throughput --baseline baseline.json
+    python -m benchmarks.otau_throughput --full --csv results.csv
+"""
+import csv
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import click
+
+from silvair_otau_demo.dfu_logic.dfu_memory import MIN_SUPPORTED_PAGE_SIZE, DFUStorageMode
+
+KIB = 1024
+MIB = 1024 * KIB
+
+FIRMWARE_SIZES = (4 * KIB, 256 * KIB, 1 * MIB)
+PAGE_SIZES = (MIN_SUPPORTED_PAGE_SIZE, 4 * KIB)
+CHUNK_SIZES = (64,)
+
+FULL_FIRMWARE_SIZES = (4 * KIB, 64 * KIB, 1 * MIB, 8 * MIB)
+FULL_PAGE_SIZES = (MIN_SUPPORTED_PAGE_SIZE, 1 * KIB, 4 * KIB, 16 * KIB, 64 * KIB)
+FULL_CHUNK_SIZES = (16, 64, 128)
+
+RUN_TIMEOUT = 600
+DEFAULT_TOLERANCE = 0.1
+
+FIELDS = ('firmware_size', 'page_size', 'chunk_size', 'storage_mode', 'bytes_per_s', 'frames',
+          'latency_p50_us', 'latency_p90_us', 'latency_p99_us', 'latency_max_us', 'peak_rss_kib')
+KEY_FIELDS = ('firmware_size', 'page_size', 'chunk_size', 'storage_mode')
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest rank percentile
+
+    :param sorted_values:   list, sorted values
+    :param fraction:        float, percentile as fraction (0.99 for p99)
+    :return:                value at percentile, 0 if no values
+    """
+    if not sorted_values:
+        return 0
+
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def peak_rss_kib():
+    """
+    Peak resident set size of current process
+
+    :return:    int, peak RSS in KiB, None where platform does not report it
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak_rss // KIB if sys.platform == 'darwin' else peak_rss
+
+
+def run_otau(config):
+    """
+    Run single OTAU, executed in a fresh process
+
+    :param config:  dict, firmware_size, page_size, chunk_size and storage_mode
+    :return:        dict, run result with FIELDS keys
+    """
+    from silvair_uart_common_libs.message_types import ModemState
+    from silvair_otau_demo.event_mgr import TemplateDFUEventMgr
+    from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr
+    from silvair_otau_demo.modem_sim import ModemSimulator
+    from silvair_otau_demo.script_mgr import McuOtauMock
+
+    logging.getLogger('silvair_otau_demo').setLevel(logging.WARNING)
+
+    class TimedModemSimulator(ModemSimulator):
+        """
+        ModemSimulator measuring time observers take to handle every frame
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def send_frame(self, data):
+            self.sent_frames += 1
+            for observer in list(self.observers):
+                start = time.perf_counter()
+                observer.new_frame_notification(data)
+                self.latencies.append(time.perf_counter() - start)
+
+    firmware = os.urandom(config['firmware_size'])
+    modem_sim = TimedModemSimulator(firmware, config['page_size'], config['chunk_size'],
+                                    initial_state=ModemState.Node)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        modem_sim.start()
+        mcu_otau_mock = McuOtauMock(modem_sim,
+                                    TemplateDFUEventMgr(),
+                                    DFUFailMgr(),
+                                    os.path.join(tmp_dir, 'app_data'),
+                                    os.path.join(tmp_dir, 'firmware'),
+                                    os.path.join(tmp_dir, 'sha256'),
+                                    os.path.join(tmp_dir, 'nvm'),
+                                    config['page_size'],
+                                    0,
+                                    None,
+                                    ("1300",),
+                                    config['storage_mode'])
+        try:
+            if not modem_sim.wait(RUN_TIMEOUT):
+                raise RuntimeError("OTAU failed: {}".format(modem_sim.error or 'timeout'))
+        finally:
+            modem_sim.stop()
+            mcu_otau_mock.delete_objects()
+
+    latencies = sorted(modem_sim.latencies)
+    result = dict(config)
+    result.update({
+        'bytes_per_s': round(config['firmware_size'] / modem_sim.dfu_time),
+        'frames': len(latencies),
+        'latency_p50_us': round(percentile(latencies, 0.5) * 1e6, 1),
+        'latency_p90_us': round(percentile(latencies, 0.9) * 1e6, 1),
+        'latency_p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+        'latency_max_us': round(latencies[-1] * 1e6, 1) if latencies else 0,
+        'peak_rss_kib': peak_rss_kib(),
+    })
+    return result
+
+
+def run_sweep(configs):
+    """
+    Run every config in its own process
+
+    :param configs: list of dicts, run configs
+    :return:        list of dicts, run results
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_otau, configs):
+            print_result(result)
+            results.append(result)
+
+    return results
+
+
+def print_result(result):
+    """
+    Print run result as table row
+
+    :param result:  dict, run result
+    :return:        None
+    """
+    print('{firmware_size:>10} {page_size:>7} {chunk_size:>6} {storage_mode:>7} {bytes_per_s:>12} '
+          '{latency_p50_us:>9} {latency_p90_us:>9} {latency_p99_us:>9} {latency_max_us:>10} {peak_rss_kib:>9}'
+          .format(**result))
+
+
+def print_header():
+    """
+    Print table header
+
+    :return:    None
+    """
+    print('{:>10} {:>7} {:>6} {:>7} {:>12} {:>9} {:>9} {:>9} {:>10} {:>9}'.format(
+        'fw_size', 'page', 'chunk', 'storage', 'bytes/s', 'p50_us', 'p90_us', 'p99_us', 'max_us', 'rss_kib'))
+
+
+def write_csv(path, results):
+    """
+    Write results to CSV file
+
+    :param path:    str, file path
+    :param results: list of dicts, run results
+    :return:        None
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def write_json(path, results):
+    """
+    Write results to JSON file
+
+    :param path:    str, file path
+    :param results: list of dicts, run results
+    :return:        None
+    """
+    with open(path, 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+
+
+def compare(results, baseline_path, tolerance):
+    """
+    Compare results with baseline JSON results
+
+    :param results:         list of dicts, run results
+    :param baseline_path:   str, path to JSON results written earlier with --json
+    :param tolerance:       float, allowed relative regression (0.1 for 10%)
+    :return:                int, number of regressions
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = {tuple(result[field] for field in KEY_FIELDS): result for result in json.load(f)['results']}
+
+    regressions = 0
+    print()
+    print('{:>10} {:>7} {:>6} {:>7} {:>14} {:>14}'.format('fw_size', 'page', 'chunk', 'storage',
+                                                         'bytes/s ratio', 'p99 ratio'))
+    for result in results:
+        key = tuple(result[field] for field in KEY_FIELDS)
+        if key not in baseline:
+            print('{:>10} {:>7} {:>6} {:>7} {:>14}'.format(*key, 'no baseline'))
+            continue
+
+        throughput_ratio = result['bytes_per_s'] / baseline[key]['bytes_per_s']
+        p99_ratio = result['latency_p99_us'] / baseline[key]['latency_p99_us'] \
+            if baseline[key]['latency_p99_us'] else 1.0
+
+        regression = throughput_ratio < 1 - tolerance or p99_ratio > 1 + tolerance
+        regressions += regression
+        print('{:>10} {:>7} {:>6} {:>7} {:>14.2f} {:>14.2f}{}'.format(*key, throughput_ratio, p99_ratio,
+                                                                       '  REGRESSION' if regression else ''))
+
+    return regressions
+
+
+@click.command()
+@click.option('--full', is_flag=True, help='Sweep firmware sizes up to 8 MiB and page sizes up to 64 KiB')
+@click.option('--firmware_size', type=int, multiple=True, help='Firmware size in bytes, use multiple times')
+@click.option('--page_size', type=int, multiple=True, help='Supported page size in bytes, use multiple times')
+@click.option('--chunk_size', type=int, multiple=True, help='Write Data chunk size in bytes, use multiple times')
+@click.option('--storage_mode', type=click.Choice([mode.value for mode in DFUStorageMode]), multiple=True,
+              help='DFUMemory storage mode, use multiple times')
+@click.option('--csv', 'csv_path', help='Write results to CSV file')
+@click.option('--json', 'json_path', help='Write results to JSON file, usable as baseline')
+@click.option('--baseline', help='Compare results with JSON results of earlier run')
+@click.option('--tolerance', default=DEFAULT_TOLERANCE, type=float,
+              help='Allowed relative throughput or p99 latency regression against baseline')
+def main(full, firmware_size, page_size, chunk_size, storage_mode, csv_path, json_path, baseline, tolerance):
+    """
+    Run OTAU throughput sweep
+    """
+    configs = [{'firmware_size': size, 'page_size': page, 'chunk_size': chunk, 'storage_mode': mode}
+               for size, page, chunk, mode in itertools.product(
+                   firmware_size or (FULL_FIRMWARE_SIZES if full else FIRMWARE_SIZES),
+                   page_size or (FULL_PAGE_SIZES if full else PAGE_SIZES),
+                   chunk_size or (FULL_CHUNK_SIZES if full else CHUNK_SIZES),
+                   storage_mode or (DFUStorageMode.MEMORY.value,))]
+
+    print_header()
+    results = run_sweep(configs)
+
+    if csv_path:
+        write_csv(csv_path, results)
+    if json_path:
+        write_json(json_path, results)
+    if baseline and compare(results, baseline, tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
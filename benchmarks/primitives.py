@@ -0,0 +1,331 @@
+"""
+Microbenchmarks of DFU primitives, to attribute per-page cost of OTAU to single operations:
+ - DFUMemory.write_data, page_store, calc_firmware_crc and calc_firmware_sha256, the latter two both with running
+   checksum known and rebuilt from stored firmware of several sizes
+ - DFU_NVM.update on tmpfs and on disk
+ - Dispatcher.new_frame_notification for every opcode handled by MCU, with FSMs doing nothing
+
+Reported per operation, memory traced with tracemalloc started right before every single operation:
+ - ns/op, best of several runs
+ - alloc B/op, peak of memory allocated by operation while it runs, so temporaries released before it ends count too
+ - held blocks/op and held B/op, memory blocks and bytes allocated by operation and still held after it
+
+Run from repository root:
+    python -m benchmarks.primitives
+    python -m benchmarks.primitives --disk_dir /mnt/data --offset 65536 --offset 8388608
+"""
+import contextlib
+import os
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import click
+
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory
+from silvair_otau_demo.dfu_logic.dfu_nvm import DFU_NVM
+
+KIB = 1024
+MIB = 1024 * KIB
+
+PAGE_SIZE = 4 * KIB
+CHUNK_SIZE = 64
+OFFSETS = (64 * KIB, 1 * MIB, 8 * MIB)
+TMPFS_DIR = '/dev/shm'
+
+REPEAT = 5
+# Minimal total time of single timed run, number of operations is calibrated to reach it
+MIN_RUN_TIME = 0.2
+ALLOCATION_OPS = 1000
+
+
+class Benchmark:
+    """
+    Single benchmarked operation. Operations with setup are timed one by one, so that setup is not timed.
+    """
+
+    def __init__(self, name: str, op, setup=None, number: int = None):
+        """
+        Initialize Benchmark
+
+        :param name:    str, operation name
+        :param op:      callable, benchmarked operation
+        :param setup:   callable or None, called before every operation, not timed
+        :param number:  int or None, operations per run, calibrated if None
+        """
+        self.name = name
+        self.op = op
+        self.setup = setup
+        self.number = number
+
+    def run(self, number: int):
+        """
+        Run operation number times
+
+        :param number:  int, number of operations
+        :return:        float, time of operations in seconds
+        """
+        if self.setup is None:
+            return timeit.Timer(self.op).timeit(number)
+
+        total = 0.0
+        for _ in range(number):
+            self.setup()
+            start = time.perf_counter()
+            self.op()
+            total += time.perf_counter() - start
+        return total
+
+    def calibrate(self):
+        """
+        Number of operations lasting at least MIN_RUN_TIME
+
+        :return:    int, operations per run
+        """
+        if self.number is not None:
+            return self.number
+
+        number = 1
+        while True:
+            if self.run(number) >= MIN_RUN_TIME:
+                return number
+            number *= 10
+
+    def ns_per_op(self):
+        """
+        Best time of single operation out of REPEAT runs
+
+        :return:    float, nanoseconds per operation
+        """
+        number = self.calibrate()
+        return min(self.run(number) for _ in range(REPEAT)) / number * 1e9
+
+    def allocations(self):
+        """
+        Memory allocated by operations. Tracing is started right before and stopped right after every operation,
+        so only memory allocated by the operation itself is traced, not by setup or earlier operations.
+
+        :return:    tuple, average per op of peak bytes allocated while running, blocks and bytes still held after
+                    operation
+        """
+        number = min(self.number or ALLOCATION_OPS, ALLOCATION_OPS)
+        ignored = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        allocated = 0
+        held_blocks = 0
+        held_size = 0
+
+        for _ in range(number):
+            if self.setup is not None:
+                self.setup()
+
+            tracemalloc.start()
+            try:
+                self.op()
+                size, peak = tracemalloc.get_traced_memory()
+                held_blocks += len(tracemalloc.take_snapshot().filter_traces(ignored).traces)
+            finally:
+                tracemalloc.stop()
+
+            allocated += peak
+            held_size += size
+
+        return allocated / number, held_blocks / number, held_size / number
+
+
+def create_dfu_memory(directory: str, firmware_size: int = 0):
+    """
+    Create DFUMemory with firmware file of given size already stored
+
+    :param directory:       str, directory for DFU files
+    :param firmware_size:   int, size of stored firmware
+    :return:                DFUMemory, memory ready to store pages
+    """
+    firmware_path = os.path.join(directory, 'firmware')
+    with open(firmware_path, 'wb') as f:
+        f.write(os.urandom(firmware_size))
+
+    dfu_memory = DFUMemory(os.path.join(directory, 'app_data'),
+                           firmware_path,
+                           os.path.join(directory, 'sha256'),
+                           PAGE_SIZE)
+    return dfu_memory
+
+
+def dfu_memory_benchmarks(stack: contextlib.ExitStack, directory: str, offsets):
+    """
+    DFUMemory benchmarks
+
+    :param stack:       contextlib.ExitStack, owns temporary directories of DFU files, which are removed on its exit
+    :param directory:   str, directory temporary directories are created in
+    :param offsets:     iterable, sizes of stored firmware checksums are rebuilt from
+    :return:            list, benchmarks
+    """
+    chunk = os.urandom(CHUNK_SIZE)
+    page = os.urandom(PAGE_SIZE)
+    dfu_memory = create_dfu_memory(stack.enter_context(tempfile.TemporaryDirectory(dir=directory)))
+
+    chunks_per_page = PAGE_SIZE // CHUNK_SIZE
+    state = {'chunks': chunks_per_page}
+
+    def write_data():
+        if state['chunks'] == chunks_per_page:
+            dfu_memory.create_page(PAGE_SIZE)
+            state['chunks'] = 0
+        dfu_memory.write_data(chunk)
+        state['chunks'] += 1
+
+    def fill_page():
+        dfu_memory.create_page(PAGE_SIZE)
+        dfu_memory.write_data(page)
+
+    benchmarks = [
+        Benchmark('DFUMemory.write_data {} B'.format(CHUNK_SIZE), write_data),
+        Benchmark('DFUMemory.page_store {} B'.format(PAGE_SIZE), dfu_memory.page_store, fill_page, 2000),
+        Benchmark('DFUMemory.calc_firmware_crc', dfu_memory.calc_firmware_crc),
+        Benchmark('DFUMemory.calc_firmware_sha256', dfu_memory.calc_firmware_sha256),
+    ]
+
+    for offset in offsets:
+        rebuilt = create_dfu_memory(stack.enter_context(tempfile.TemporaryDirectory(dir=directory)), offset)
+
+        def forget_crc(dfu_memory=rebuilt):
+            dfu_memory.firmware_crc = None
+
+        def forget_sha(dfu_memory=rebuilt):
+            dfu_memory.firmware_sha = None
+
+        benchmarks += [
+            Benchmark('DFUMemory.calc_firmware_crc rebuild @{}'.format(offset), rebuilt.calc_firmware_crc,
+                      forget_crc, 20),
+            Benchmark('DFUMemory.calc_firmware_sha256 rebuild @{}'.format(offset), rebuilt.calc_firmware_sha256,
+                      forget_sha, 20),
+        ]
+
+    return benchmarks
+
+
+def dfu_nvm_benchmarks(directories):
+    """
+    DFU_NVM benchmarks
+
+    :param directories: iterable of (str, str), names and directories NVM file is kept in
+    :return:            list, benchmarks
+    """
+    benchmarks = []
+    for name, directory in directories:
+        nvm = DFU_NVM(os.path.join(directory, 'nvm'))
+        state = {'offset': 0}
+
+        def update(nvm=nvm):
+            state['offset'] += PAGE_SIZE
+            nvm.update('firmware_offset', state['offset'])
+
+        def transient_update(nvm=nvm):
+            state['offset'] += PAGE_SIZE
+            nvm.update('firmware_offset', state['offset'], transient=True)
+
+        benchmarks += [
+            Benchmark('DFU_NVM.update {}'.format(name), update),
+            Benchmark('DFU_NVM.update transient {}'.format(name), transient_update),
+        ]
+
+    return benchmarks
+
+
+def dispatcher_benchmarks():
+    """
+    Dispatcher.new_frame_notification benchmarks, one per opcode handled by MCU
+
+    :return:    list, benchmarks
+    """
+    from silvair_uart_common_libs import message_factory
+    from silvair_uart_common_libs.message_types import DfuStatus, ModemState
+    from silvair_uart_common_libs.messages import UartCommand, PingRequestMessage, CurrentStateResponseMessage, \
+        InitNodeEventMessage, StartNodeResponseMessage, DfuInitRequestMessage, DfuStatusRequestMessage, \
+        DfuPageCreateRequestMessage, DfuWriteDataEventMessage, DfuPageStoreRequestMessage, DfuStateResponseMessage, \
+        DfuCancelResponseMessage
+    from silvair_otau_demo.dispatcher import Dispatcher
+
+    class NullFSM:
+        def handle_message(self, msg):
+            pass
+
+        def dfu_write_data_payload_event(self, data):
+            return True
+
+    def message(message_class, **fields):
+        msg = message_class()
+        for name, value in fields.items():
+            setattr(msg, name, value)
+        return msg
+
+    data = os.urandom(CHUNK_SIZE)
+    messages = (
+        message(PingRequestMessage, data=bytes(4)),
+        message(CurrentStateResponseMessage, state=ModemState.Node),
+        message(InitNodeEventMessage, model_ids=[]),
+        message(StartNodeResponseMessage),
+        message(DfuInitRequestMessage, firmware_size=MIB, firmware_sha256=bytes(32), app_data_length=4,
+                app_data=bytes(4)),
+        message(DfuStatusRequestMessage),
+        message(DfuPageCreateRequestMessage, requested_page_size=PAGE_SIZE),
+        message(DfuWriteDataEventMessage, data_len=len(data), data=data),
+        message(DfuPageStoreRequestMessage),
+        message(DfuStateResponseMessage, status=DfuStatus.InProgress),
+        message(DfuCancelResponseMessage),
+    )
+
+    benchmarks = []
+    for msg in messages:
+        try:
+            frame = message_factory.serialize_message(msg)
+        except Exception as e:
+            print('Dispatcher {} skipped: {}'.format(type(msg).__name__, e))
+            continue
+
+        dispatcher = Dispatcher(NullFSM(), NullFSM())
+        dispatcher.new_frame_notification(frame)
+
+        name = 'Dispatcher {}'.format(UartCommand(msg.type).name)
+        if msg.type == UartCommand.DfuWriteDataEvent:
+            name += ' fast path' if dispatcher.write_data_fast_path else ' (no fast path)'
+        benchmarks.append(Benchmark(name, lambda dispatcher=dispatcher, frame=frame:
+                                    dispatcher.new_frame_notification(frame)))
+
+    return benchmarks
+
+
+@click.command()
+@click.option('--disk_dir', default='.', help='Directory on disk for DFU files')
+@click.option('--tmpfs_dir', default=TMPFS_DIR, help='Directory on tmpfs for DFU_NVM file, skipped if missing')
+@click.option('--offset', type=int, multiple=True, help='Stored firmware size checksums are rebuilt from')
+def main(disk_dir, tmpfs_dir, offset):
+    """
+    Run DFU primitives microbenchmarks
+    """
+    nvm_directories = [('disk', disk_dir)]
+    if os.path.isdir(tmpfs_dir):
+        nvm_directories.insert(0, ('tmpfs', tmpfs_dir))
+
+    with contextlib.ExitStack() as stack:
+        benchmarks = dfu_memory_benchmarks(stack, disk_dir, offset or OFFSETS)
+        benchmarks += dfu_nvm_benchmarks((name, stack.enter_context(tempfile.TemporaryDirectory(dir=directory)))
+                                         for name, directory in nvm_directories)
+        try:
+            benchmarks += dispatcher_benchmarks()
+        except ImportError as e:
+            print('Dispatcher benchmarks skipped: {}'.format(e))
+
+        print('{:<48}{:>14}{:>14}{:>16}{:>12}'.format('operation', 'ns/op', 'alloc B/op', 'held blocks/op',
+                                                      'held B/op'))
+        for benchmark in benchmarks:
+            # Allocations are measured first, before timed runs grow buffers (i.e. firmware kept in RAM)
+            allocated, held_blocks, held_size = benchmark.allocations()
+            ns_per_op = benchmark.ns_per_op()
+            print('{:<48}{:>14.0f}{:>14.1f}{:>16.2f}{:>12.1f}'.format(benchmark.name, ns_per_op, allocated,
+                                                                       held_blocks, held_size))
+
+
+if __name__ == '__main__':
+    main()
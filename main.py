@@ -1,55 +1,137 @@
 import click
 import json
 import logging
+import logging.handlers
 import os
+import queue
+import signal
 import sys
 import time
 
 from silvair_otau_demo.app_data import AppData
-from silvair_otau_demo.console_out import ConsoleOut
+from silvair_otau_demo.console_out import ConsoleOut, DEFAULT_PROGRESS_REFRESH_RATE
 from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr, DFUFault
+from silvair_otau_demo.event_bus import EventBus, DEFAULT_EVENT_QUEUE_DEPTH
 from silvair_otau_demo.event_mgr import EventMgr
+from silvair_otau_demo.json_out import JsonLinesEventMgr
 from silvair_otau_demo.script_mgr import McuOtauMock
 from silvair_uart_common_libs.message_types import DFUStatus
 from silvair_uart_common_libs.uart_common_classes import UartAdapter
-from silvair_otau_demo.dfu_logic.dfu_memory import MIN_SUPPORTED_PAGE_SIZE
+from silvair_otau_demo.dfu_logic.dfu_memory import MIN_SUPPORTED_PAGE_SIZE, DFUStorageMode, DFUSyncPolicy
+from silvair_otau_demo.dfu_logic.dfu_page_index import PAGE_INDEX_SUFFIX
 
 LOGGER = logging.getLogger('silvair_otau_demo')
 LOGGER.setLevel(logging.DEBUG)
 FORMATTER = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# Stdout log levels selected with -v flags and cycled with SIGUSR1
+VERBOSITY_LEVELS = (logging.WARNING, logging.INFO, logging.DEBUG)
+LOG_FILE_LEVELS = ('DEBUG', 'INFO', 'WARNING')
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+# Event output modes: colored messages and progress bar, or JSON lines for runs without terminal
+OUTPUT_MODES = ('console', 'json')
 
-def config_logger_stdout(verbose, logger, formatter):
+
+def config_logger_stdout(verbose, formatter, stream=None):
     """
-    Configure stdout for given logger
+    Create stdout log handler
 
     :param verbose: Verbosity level
-    :param logger: logger object instance
     :param formatter: formatter for logger
+    :param stream: stream to write logs to, stdout if None
+    :return: logging.Handler
     """
-    ch_cli = logging.StreamHandler(sys.stdout)
+    ch_cli = logging.StreamHandler(stream or sys.stdout)
     ch_cli.setFormatter(formatter)
-    ch_cli.setLevel(logging.WARNING)
-    if verbose > 0:
-        if verbose == 1:
-            ch_cli.setLevel(logging.INFO)
-        elif verbose == 2:
-            ch_cli.setLevel(logging.DEBUG)
-    logger.addHandler(ch_cli)
+    ch_cli.setLevel(VERBOSITY_LEVELS[min(verbose, len(VERBOSITY_LEVELS) - 1)])
+    return ch_cli
 
 
-def config_logger_file(path, logger, formatter):
+def config_logger_file(path, formatter, level=logging.DEBUG, max_bytes=LOG_FILE_MAX_BYTES,
+                       backup_count=LOG_FILE_BACKUP_COUNT):
     """
-    Configure file log
+    Create file log handler, file is rotated when it grows over max_bytes
 
     :param path: Path to file
-    :param logger: logger object instance
     :param formatter: formatter for logger
+    :param level: file log level
+    :param max_bytes: size of file triggering rotation, 0 disables rotation
+    :param backup_count: number of rotated files to keep
+    :return: logging.Handler
     """
-    ch_file = logging.FileHandler(path)
+    ch_file = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
     ch_file.setFormatter(formatter)
-    ch_file.setLevel(logging.DEBUG)
-    logger.addHandler(ch_file)
+    ch_file.setLevel(level)
+    return ch_file
+
+
+def config_logger_queue(logger, handlers):
+    """
+    Route records of given logger through a queue to handlers served by a background thread, so that
+    logging never blocks on a slow terminal or disk. Logger level is set to the lowest handler level,
+    so that records no handler wants are not even created.
+
+    :param logger: logger object instance
+    :param handlers: list of handlers writing records
+    :return: logging.handlers.QueueListener, started listener, stop it to flush remaining records
+    """
+    log_queue = queue.Queue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(min(handler.level for handler in handlers))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def config_verbosity_signal(logger, listener, ch_cli):
+    """
+    Cycle stdout log level (warning, info, debug) on SIGUSR1, where platform supports it.
+    Signal handler only switches stdout handler level: logging from it could deadlock on the queue lock held by
+    interrupted code. Logger level is updated and the change is logged by returned function, called from normal
+    context.
+
+    :param logger: logger object instance
+    :param listener: QueueListener serving stdout handler
+    :param ch_cli: stdout handler
+    :return: callable, applies and logs pending level change
+    """
+    applied_levels = [ch_cli.level]
+
+    def next_verbosity(signum, frame):
+        index = VERBOSITY_LEVELS.index(ch_cli.level) if ch_cli.level in VERBOSITY_LEVELS else -1
+        ch_cli.setLevel(VERBOSITY_LEVELS[(index + 1) % len(VERBOSITY_LEVELS)])
+
+    def apply_verbosity_change():
+        level = ch_cli.level
+        if level == applied_levels[0]:
+            return
+
+        applied_levels[0] = level
+        logger.setLevel(min(handler.level for handler in listener.handlers))
+        logger.warning("Stdout log level changed to %s", logging.getLevelName(level))
+
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, next_verbosity)
+
+    return apply_verbosity_change
+
+
+def check_config_choice(config_file_path, key, value, choices):
+    """
+    Check that config file value is one of allowed choices
+
+    :param config_file_path:    str, path to configuration file
+    :param key:                 str, config key
+    :param value:               config value
+    :param choices:             list of allowed values
+    :return:                    value
+    """
+    if value not in choices:
+        raise click.BadParameter("{} has to be one of {}, not {!r}".format(key, ", ".join(choices), value),
+                                 param_hint=config_file_path)
+    return value
 
 
 def parse_config_file(config_file_path, logger):
@@ -78,7 +160,27 @@ def parse_config_file(config_file_path, logger):
             config_dict["pre_validation_fail"] = bool(config["pre_validation_fail"])
             config_dict["post_validation_fail"] = bool(config["post_validation_fail"])
             config_dict["log_file"] = config["log_file"]
+            config_dict["log_file_level"] = check_config_choice(config_file_path, "log_file_level",
+                                                                config.get("log_file_level", "DEBUG"),
+                                                                LOG_FILE_LEVELS)
+            config_dict["log_file_max_bytes"] = int(config.get("log_file_max_bytes", LOG_FILE_MAX_BYTES))
+            config_dict["log_file_backup_count"] = int(config.get("log_file_backup_count", LOG_FILE_BACKUP_COUNT))
             config_dict["model"] = config["model"]
+            config_dict["storage_mode"] = check_config_choice(config_file_path, "storage_mode",
+                                                              config.get("storage_mode", DFUStorageMode.MEMORY.value),
+                                                              [mode.value for mode in DFUStorageMode])
+            config_dict["sync_policy"] = check_config_choice(config_file_path, "sync_policy",
+                                                             config.get("sync_policy", DFUSyncPolicy.NONE.value),
+                                                             [policy.value for policy in DFUSyncPolicy])
+            config_dict["sync_interval_pages"] = int(config.get("sync_interval_pages", 0))
+            config_dict["sync_interval_bytes"] = int(config.get("sync_interval_bytes", 0))
+            config_dict["page_recovery"] = bool(config.get("page_recovery", False))
+            config_dict["frame_queue_depth"] = int(config.get("frame_queue_depth", 0))
+            config_dict["event_queue_depth"] = int(config.get("event_queue_depth", DEFAULT_EVENT_QUEUE_DEPTH))
+            config_dict["output"] = config.get("output", OUTPUT_MODES[0])
+            config_dict["progress_refresh_rate"] = float(config.get("progress_refresh_rate",
+                                                                    DEFAULT_PROGRESS_REFRESH_RATE))
+            config_dict["capture_file"] = config.get("capture_file") or None
     except FileNotFoundError:
         logger.error("File %s not found", config_file_path)
         raise
@@ -123,8 +225,33 @@ def remove_file(path):
 @click.option('-q', '--post_validation_fail', is_flag=True, help='Deliberately cause post validation fail')
 @click.option('-v', '--verbose', count=True, help='Verbosity level; -vv for full log')
 @click.option('-l', '--log_file', default='otau.log', help='File to save logs')
+@click.option('--log_file_level', type=click.Choice(LOG_FILE_LEVELS), default='DEBUG', help='File log level')
+@click.option('--log_file_max_bytes', default=LOG_FILE_MAX_BYTES, type=int,
+              help='Log file size triggering rotation, 0 disables rotation')
+@click.option('--log_file_backup_count', default=LOG_FILE_BACKUP_COUNT, type=int, help='Rotated log files to keep')
 @click.option('-t', '--forget_state', is_flag=True, default=False, help='Set to ignore saved state')
 @click.option('-r', '--clear', is_flag=True, help='Remove created files on start')
+@click.option('--storage_mode', type=click.Choice([mode.value for mode in DFUStorageMode]),
+              default=DFUStorageMode.MEMORY.value,
+              help='Keep whole received firmware in RAM (memory) or only current page (stream)')
+@click.option('--sync_policy', type=click.Choice([policy.value for policy in DFUSyncPolicy]),
+              default=DFUSyncPolicy.NONE.value,
+              help='When received firmware is synced to disk: never, every page, every interval or on completion')
+@click.option('--sync_interval_pages', default=0, type=int, help='Pages between syncs with interval sync policy')
+@click.option('--sync_interval_bytes', default=0, type=int, help='Bytes between syncs with interval sync policy')
+@click.option('--page_recovery', is_flag=True,
+              help='Drop only failed page and continue from the last stored one instead of failing whole OTAU')
+@click.option('--frame_queue_depth', default=0, type=int,
+              help='Queue up to this many received frames and process them on a worker thread, 0 disables queue')
+@click.option('--event_queue_depth', default=DEFAULT_EVENT_QUEUE_DEPTH, type=int,
+              help='Max number of events queued for output, further events are dropped')
+@click.option('--output', type=click.Choice(OUTPUT_MODES), default=OUTPUT_MODES[0],
+              help='Print events to console or write them to stdout as JSON lines, logs then go to stderr')
+@click.option('--progress_refresh_rate', default=DEFAULT_PROGRESS_REFRESH_RATE, type=float,
+              help='Max progress bar refreshes per second, 0 refreshes on every stored page')
+@click.option('--capture_file', type=str,
+              help='Capture every received and sent UART frame to file named after this path and session start time, '
+                   'compressed if name ends with .gz or .xz')
 @click.option('-m', '--model', type=str, multiple=True,
               help='Model to register, use multiple times to add more than one model. Example: -m 0003 -m 1300')
 def start(**kwargs):
@@ -142,17 +269,26 @@ def start(**kwargs):
     else:
         cli_args = kwargs
 
-    config_logger_stdout(kwargs["verbose"], LOGGER, FORMATTER)
-    config_logger_file(cli_args["log_file"], LOGGER, FORMATTER)
+    json_output = cli_args["output"] == 'json'
+    ch_cli = config_logger_stdout(kwargs["verbose"], FORMATTER, sys.stderr if json_output else None)
+    ch_file = config_logger_file(cli_args["log_file"],
+                                 FORMATTER,
+                                 logging.getLevelName(cli_args["log_file_level"]),
+                                 cli_args["log_file_max_bytes"],
+                                 cli_args["log_file_backup_count"])
+    log_listener = config_logger_queue(LOGGER, (ch_cli, ch_file))
+    apply_verbosity_change = config_verbosity_signal(LOGGER, log_listener, ch_cli)
 
     if int(cli_args["supported_page_size"]) < MIN_SUPPORTED_PAGE_SIZE:
         LOGGER.error("Supported page size has to be bigger than {:d}".format(MIN_SUPPORTED_PAGE_SIZE))
+        log_listener.stop()
         raise ValueError
 
     if cli_args["clear"]:
         LOGGER.debug("Clearing files")
         remove_file(cli_args["app_data_file"])
         remove_file(cli_args["firmware_file"])
+        remove_file(cli_args["firmware_file"] + PAGE_INDEX_SUFFIX)
         remove_file(cli_args["sha256_file"])
         remove_file(cli_args["nvm_file"])
 
@@ -164,7 +300,13 @@ def start(**kwargs):
     uart_adapter = UartAdapter(port=cli_args["com_port"])
     uart_adapter.start()
 
-    cli_event_manager = EventMgr(ConsoleOut)
+    if json_output:
+        event_consumer = JsonLinesEventMgr()
+    else:
+        ConsoleOut.set_max_refresh_rate(cli_args["progress_refresh_rate"])
+        event_consumer = EventMgr(ConsoleOut)
+    cli_event_manager = EventBus((event_consumer,), cli_args["event_queue_depth"])
+    cli_event_manager.start()
     dfu_fail_mgr = DFUFailMgr()
 
     if cli_args["pre_validation_fail"]:
@@ -177,23 +319,32 @@ def start(**kwargs):
         LOGGER.warning("Model not provided. Will register Light Lightness Server (1300)")
         cli_args["model"] = ("1300",)
 
+    mcu_otau_mock = None
     try:
-        McuOtauMock(uart_adapter,
-                    cli_event_manager,
-                    dfu_fail_mgr,
-                    cli_args["app_data_file"],
-                    cli_args["firmware_file"],
-                    cli_args["sha256_file"],
-                    cli_args["nvm_file"],
-                    cli_args["supported_page_size"],
-                    cli_args["max_mem_size"],
-                    cli_args["expected_app_data"],
-                    cli_args["model"],
-                    )
+        mcu_otau_mock = McuOtauMock(uart_adapter,
+                                    cli_event_manager,
+                                    dfu_fail_mgr,
+                                    cli_args["app_data_file"],
+                                    cli_args["firmware_file"],
+                                    cli_args["sha256_file"],
+                                    cli_args["nvm_file"],
+                                    cli_args["supported_page_size"],
+                                    cli_args["max_mem_size"],
+                                    cli_args["expected_app_data"],
+                                    cli_args["model"],
+                                    cli_args["storage_mode"],
+                                    cli_args["sync_policy"],
+                                    cli_args["sync_interval_pages"],
+                                    cli_args["sync_interval_bytes"],
+                                    cli_args["page_recovery"],
+                                    cli_args["frame_queue_depth"],
+                                    cli_args["capture_file"],
+                                    )
 
         try:
             while True:
                 time.sleep(1)
+                apply_verbosity_change()
         except KeyboardInterrupt:
             LOGGER.info("Caught Keyboard interrupt!")
 
@@ -202,7 +353,10 @@ def start(**kwargs):
 
     finally:
         uart_adapter.stop()
+        if mcu_otau_mock is not None:
+            mcu_otau_mock.delete_objects()
         cli_event_manager.stop()
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -27,5 +27,6 @@ setup(
     entry_points='''
     [console_scripts]
         silvair_otau_demo=main:start
+        silvair_otau_replay=silvair_otau_demo.replay:replay
     ''',
 )
@@ -1,9 +1,16 @@
 import logging
+import sys
+import time
+
 from termcolor import cprint
 from tqdm import tqdm
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_PROGRESS_REFRESH_RATE = 4
+# Weight of the latest throughput sample in the exponential moving average used for rate and ETA
+PROGRESS_SMOOTHING = 0.1
+
 
 class ConsoleOut:
     """
@@ -11,6 +18,22 @@ class ConsoleOut:
     """
     progress_bar_enabled = False
     pbar = None
+    max_refresh_rate = DEFAULT_PROGRESS_REFRESH_RATE
+
+    # Latest reported progress, rendered at most max_refresh_rate times per second
+    progress = None
+    progress_total = None
+    last_refresh_time = 0.0
+
+    @classmethod
+    def set_max_refresh_rate(cls, max_refresh_rate: float):
+        """
+        Set max progress bar refresh rate
+
+        :param max_refresh_rate:    float, max progress bar refreshes per second, 0 refreshes on every update
+        :return:                    None
+        """
+        cls.max_refresh_rate = max_refresh_rate
 
     @classmethod
     def print_standard_message(cls, msg: str):
@@ -62,16 +85,29 @@ class ConsoleOut:
         After calling this method and before calling stop_progress_bar,
         printing can cause undefined behaviour
 
+        Progress bar is not rendered when stdout is not a terminal, progress is only tracked
+        and logged when stopped.
+
         :param msg: int, progress implying 100% full progress bar
         :param msg: int, initial progress
         :return:    None
         """
-        if not cls.progress_bar_enabled:
+        if cls.progress_total is not None:
+            LOGGER.debug('Progress bar already started')
+            return
+
+        cls.progress = initial
+        cls.progress_total = total
+        cls.last_refresh_time = time.monotonic()
+
+        if sys.stdout.isatty():
             LOGGER.debug('Starting progress bar')
-            cls.pbar = tqdm(total=total, initial=initial, unit='bytes')
+            # Refresh rate is limited in update_progress_bar, tqdm renders on every update it gets
+            cls.pbar = tqdm(total=total, initial=initial, unit='bytes', unit_scale=True,
+                            smoothing=PROGRESS_SMOOTHING, mininterval=0)
             cls.progress_bar_enabled = True
         else:
-            LOGGER.debug('Progress bar already started')
+            LOGGER.debug('Stdout is not a terminal, progress bar is not rendered')
 
     @classmethod
     def update_progress_bar(cls, progress: int):
@@ -81,20 +117,34 @@ class ConsoleOut:
         :param progress:    int, new progress
         :return:            None
         """
-        if cls.progress_bar_enabled:
-            LOGGER.debug('Updating progress bar')
-            cls.pbar.update(progress - cls.pbar.last_print_n)
-        else:
-            LOGGER.debug('Cannot update not started progress bar')
+        if cls.progress_total is None:
+            return
+
+        cls.progress = progress
+        if not cls.progress_bar_enabled:
+            return
+
+        now = time.monotonic()
+        if cls.max_refresh_rate and now - cls.last_refresh_time < 1 / cls.max_refresh_rate:
+            return
+
+        cls.last_refresh_time = now
+        cls.pbar.update(progress - cls.pbar.n)
 
     @classmethod
     def stop_progress_bar(cls):
         """
-        Stop progress bar.
+        Stop progress bar. Last reported progress is rendered before closing.
         """
         if cls.progress_bar_enabled:
             LOGGER.debug('Closing progress bar')
+            cls.pbar.update(cls.progress - cls.pbar.n)
             cls.pbar.close()
+            cls.pbar = None
+        elif cls.progress_total is not None:
+            LOGGER.info('Progress: %d/%d bytes', cls.progress, cls.progress_total)
         else:
             LOGGER.debug('Cannot stop not started progress bar')
         cls.progress_bar_enabled = False
+        cls.progress = None
+        cls.progress_total = None
@@ -1,3 +1,7 @@
+import functools
+
+from silvair_uart_common_libs.messages import UartCommand
+
 from .states.dfu_fsm_states import DFUState
 
 from .states.dfu_state_standby import DFUStandbyState
@@ -10,6 +14,23 @@ DFU_STATE_CLASSES = {
     DFUState.UploadPage: DFUUploadPageState,
 }
 
+# Opcode of every message handled by DFU FSM and name of the state method handling it
+DFU_FSM_EVENTS = {
+    UartCommand.DfuInitRequest: 'dfu_init_request_message_event',
+    UartCommand.DfuInitResponse: 'dfu_init_response_message_event',
+    UartCommand.DfuStatusRequest: 'dfu_state_request_message_event',
+    UartCommand.DfuStatusResponse: 'dfu_state_response_message_event',
+    UartCommand.DfuPageCreateRequest: 'dfu_page_create_request_message_event',
+    UartCommand.DfuPageCreateResponse: 'dfu_page_create_response_message_event',
+    UartCommand.DfuWriteDataEvent: 'dfu_write_data_event_message_event',
+    UartCommand.DfuPageStoreRequest: 'dfu_page_store_request_message_event',
+    UartCommand.DfuPageStoreResponse: 'dfu_page_store_response_message_event',
+    UartCommand.DfuStateRequest: 'dfu_pre_validation_check_request_message_event',
+    UartCommand.DfuStateResponse: 'dfu_pre_validation_check_response_message_event',
+    UartCommand.DfuCancelRequest: 'dfu_cancel_request_message_event',
+    UartCommand.DfuCancelResponse: 'dfu_cancel_response_message_event',
+}
+
 
 class DFU_FSM:
     """
@@ -29,8 +50,14 @@ class DFU_FSM:
         self.current_state = None
         self.dfu_mgr = dfu_mgr
 
+        # Handlers of every state are bound once, change_state only swaps the table in use
+        self.state_handlers = {state_id: {opcode: functools.partial(getattr(state, event), self)
+                                          for opcode, event in DFU_FSM_EVENTS.items()}
+                               for state_id, state in DFU_STATE_CLASSES.items()}
+
         self.current_state_id = DFUState(init_state)
         self.current_state = DFU_STATE_CLASSES[self.current_state_id]
+        self.handlers = self.state_handlers[self.current_state_id]
 
     def start(self):
         """
@@ -52,8 +79,18 @@ class DFU_FSM:
         new_state = DFUState(new_state)
         self.current_state_id = new_state
         self.current_state = DFU_STATE_CLASSES[new_state]
+        self.handlers = self.state_handlers[new_state]
         self.current_state.on_enter(self)
 
+    def handle_message(self, msg):
+        """
+        Pass message to handler of current state
+
+        :param msg:             Received message, its opcode has to be one of DFU_FSM_EVENTS
+        :return:                None
+        """
+        self.handlers[msg.type](msg)
+
     def dfu_init_request_message_event(self, msg):
         """
         Standard DFU Init Request Message event handler
@@ -117,6 +154,15 @@ class DFU_FSM:
         """
         self.current_state.dfu_write_data_event_message_event(self, msg)
 
+    def dfu_write_data_payload_event(self, data):
+        """
+        Write Data Event payload handler, used by Dispatcher to skip creating a message
+
+        :param data:            memoryview, received data
+        :return:                True if data was handled, False if message has to be created and handled instead
+        """
+        return self.current_state.dfu_write_data_payload_event(self, data)
+
     def dfu_page_store_request_message_event(self, msg):
         """
         Standard Page Store Request Message event handler
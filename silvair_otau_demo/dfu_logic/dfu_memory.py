@@ -1,16 +1,41 @@
 import binascii
+import enum
 import hashlib
 import logging
+import os
+import time
+
+from .dfu_page_index import DFUPageIndex, PAGE_INDEX_SUFFIX
 
 LOGGER = logging.getLogger(__name__)
 
 MIN_SUPPORTED_PAGE_SIZE = 256
+FIRMWARE_FILE_CHUNK_SIZE = 64 * 1024
 
 
 class DFUMemoryError(Exception):
     pass
 
 
+class DFUStorageMode(enum.Enum):
+    """
+    Enumerator representing where stored firmware is kept.
+    """
+    MEMORY = 'memory'  # Whole firmware image is kept in RAM and mirrored to firmware file
+    STREAM = 'stream'  # Only current page is kept in RAM, stored pages go straight to firmware file
+
+
+class DFUSyncPolicy(enum.Enum):
+    """
+    Enumerator representing when stored pages are synced to disk.
+    Stored pages are always flushed to OS, policy only decides when OS is forced to write them to disk.
+    """
+    NONE = 'none'  # Never sync, leave it to OS
+    PAGE = 'page'  # Sync after every stored page
+    INTERVAL = 'interval'  # Sync after every sync_interval_pages pages or sync_interval_bytes bytes
+    COMPLETE = 'complete'  # Sync only when firmware file is closed
+
+
 class DFUMemory:
     """
     Mock memory for DFU update testing
@@ -21,7 +46,11 @@ class DFUMemory:
                  firmware_file: str,
                  sha256_file: str,
                  supported_page_size: int = 256,
-                 max_mem_size: int = 0):
+                 max_mem_size: int = 0,
+                 storage_mode: DFUStorageMode = DFUStorageMode.MEMORY,
+                 sync_policy: DFUSyncPolicy = DFUSyncPolicy.NONE,
+                 sync_interval_pages: int = 0,
+                 sync_interval_bytes: int = 0):
         """
         Initialize DFUMemory
 
@@ -30,16 +59,45 @@ class DFUMemory:
         :param sha256_file:         Path to file with SHA256
         :param supported_page_size: Max supported page size
         :param max_mem_size:        Max supported firmware image size, 0 implies unlimited
+        :param storage_mode:        DFUStorageMode, where stored firmware is kept
+        :param sync_policy:         DFUSyncPolicy, when stored pages are synced to disk
+        :param sync_interval_pages: Sync after this many stored pages with DFUSyncPolicy.INTERVAL, 0 disables
+        :param sync_interval_bytes: Sync after this many stored bytes with DFUSyncPolicy.INTERVAL, 0 disables
         """
         self.app_data_file_path = app_data_file
         self.firmware_file_path = firmware_file
         self.sha256_file_path = sha256_file
         self.supported_page_size = supported_page_size
         self.max_mem_size = max_mem_size
+        self.storage_mode = DFUStorageMode(storage_mode)
+        self.sync_policy = DFUSyncPolicy(sync_policy)
+        self.sync_interval_pages = sync_interval_pages
+        self.sync_interval_bytes = sync_interval_bytes
+
+        # Firmware file is opened on first stored page and kept open until closed or cleared
+        self.firmware_file_handle = None
+        self.unsynced_pages = 0
+        self.unsynced_bytes = 0
+        # Cumulative time in seconds spent writing, syncing and closing app data, firmware and page index files
+        self.io_time = 0.0
+
+        # Offset, length and CRC of every stored page, used to verify firmware file on resume
+        self.page_index = DFUPageIndex(firmware_file + PAGE_INDEX_SUFFIX)
+
+        # Page buffer is allocated once and reused for every page, only its filled region is stored
+        self.page_buffer = bytearray(supported_page_size)
+        self.page_buffer_view = memoryview(self.page_buffer)
 
         self.firmware_page_size = 0
-        self.firmware_page = bytes()
         self.firmware_page_offset = 0
+        self.firmware_page_invalid = False
+
+        # Running CRC32 of stored firmware, None until restored from a checkpoint or rebuilt on demand
+        self.firmware_crc = None
+        # Running CRC32 of stored firmware followed by the page being written, None when no page is open
+        self.firmware_page_crc = None
+        # Running SHA256 of stored firmware, None until rebuilt from firmware file on demand
+        self.firmware_sha = None
 
         try:
             with open(app_data_file, 'rb') as app_data_file:
@@ -48,14 +106,16 @@ class DFUMemory:
             LOGGER.debug("Unable to open app data file")
             self.app_data_memory = bytes()
 
+        self.firmware_memory = bytearray() if self.storage_mode == DFUStorageMode.MEMORY else None
+        self.firmware_offset = 0
+
         try:
             with open(firmware_file, 'rb') as firmware_file:
-                self.firmware_memory = firmware_file.read()
-                self.firmware_offset = firmware_file.tell()
+                if self.firmware_memory is not None:
+                    self.firmware_memory = bytearray(firmware_file.read())
+                self.firmware_offset = firmware_file.seek(0, os.SEEK_END)
         except FileNotFoundError:
             LOGGER.debug("Unable to open firmware file")
-            self.firmware_memory = bytes()
-            self.firmware_offset = 0
 
         LOGGER.debug("Initialized DFUMemory")
 
@@ -69,7 +129,8 @@ class DFUMemory:
         if self.max_mem_size > 0 and size > self.max_mem_size:
             raise DFUMemoryError("Firmware is too big. Maximum supported firmware size: {}".format(self.max_mem_size))
 
-        self.firmware_memory = bytearray()
+        if self.storage_mode == DFUStorageMode.MEMORY:
+            self.firmware_memory = bytearray()
         LOGGER.debug("Got firmware memory size to {:d}".format(size))
 
     def set_app_data_memory_size(self, size: int):
@@ -92,8 +153,10 @@ class DFUMemory:
         """
         if len(data) == self.app_data_memory_size:
             self.app_data_memory = data
+            io_start = time.perf_counter()
             with open(self.app_data_file_path, 'wb') as app_data_file:
                 app_data_file.write(self.app_data_memory)
+            self.io_time += time.perf_counter() - io_start
         else:
             LOGGER.debug("Attempted to write too big or too small app data, expected: %s got: %s",
                          str(self.app_data_memory_size), str(len(data)))
@@ -101,6 +164,26 @@ class DFUMemory:
 
         LOGGER.debug("Written app data memory")
 
+    @property
+    def firmware_page(self):
+        """
+        Data written to current page so far
+
+        :return:    memoryview, filled region of page buffer
+        """
+        return self.page_buffer_view[:self.firmware_page_offset]
+
+    def reset_page(self):
+        """
+        Discard current page
+
+        :return:        None
+        """
+        self.firmware_page_size = 0
+        self.firmware_page_offset = 0
+        self.firmware_page_invalid = False
+        self.firmware_page_crc = None
+
     def create_page(self, size: int):
         """
         Create page in memory
@@ -108,58 +191,314 @@ class DFUMemory:
         :param size:    int, page size
         :return:        None
         """
-        self.firmware_page = bytearray()
-        self.firmware_page_offset = 0
+        self.reset_page()
+
+        if size > self.supported_page_size:
+            raise DFUMemoryError("Page is too big. Maximum supported page size: {}".format(self.supported_page_size))
+
         self.firmware_page_size = size
+        self.firmware_page_crc = self.get_firmware_crc()
 
-        LOGGER.debug("Created page. Size: {:d}, offset {:d}".format(self.firmware_page_size, self.firmware_offset))
+        LOGGER.debug("Created page. Size: %d, offset %d", self.firmware_page_size, self.firmware_offset)
 
     def write_data(self, data: bytes):
         """
         Write part of page data to memory prepared earlier
 
-        :param data:    bytes, data to write
+        :param data:    bytes or memoryview, data to write
         :return:        None
         """
-        self.firmware_page += data
-        self.firmware_page_offset += len(data)
+        start = self.firmware_page_offset
+        end = start + len(data)
 
-        LOGGER.debug("Written data at offset {:04x}".format(self.firmware_page_offset))
+        if self.firmware_page_crc is None or end > self.firmware_page_size:
+            self.firmware_page_invalid = True
+            raise DFUMemoryError("Data does not fit in page. Page size: {}, end offset: {}".format(
+                self.firmware_page_size, end))
+
+        self.page_buffer_view[start:end] = data
+        self.firmware_page_offset = end
+        self.firmware_page_crc = binascii.crc32(data, self.firmware_page_crc)
+
+        LOGGER.debug("Written data at offset %04x", self.firmware_page_offset)
 
     def page_store(self):
         """
         Store page into firmware memory.
         """
-        if len(self.firmware_page) != self.firmware_page_size:
+        if self.firmware_page_crc is None or self.firmware_page_invalid or \
+                self.firmware_page_offset != self.firmware_page_size:
             LOGGER.debug('page store error')
             raise DFUMemoryError
 
-        self.firmware_memory += self.firmware_page
+        page = self.firmware_page
+        firmware_sha = self.get_firmware_sha()
+
+        io_start = time.perf_counter()
+        self.write_firmware_file(page)
+        self.page_index.append(self.firmware_offset, len(page), page)
+        self.apply_sync_policy()
+        self.io_time += time.perf_counter() - io_start
+
+        firmware_sha.update(page)
+        if self.firmware_memory is not None:
+            self.firmware_memory += page
         self.firmware_offset += self.firmware_page_offset
+        self.firmware_crc = self.firmware_page_crc
 
-        with open(self.firmware_file_path, 'ab') as firmware_file:
-            firmware_file.write(self.firmware_page)
+        page.release()
+        self.reset_page()
 
-        self.firmware_page = bytes()
-        self.firmware_page_offset = 0
+        LOGGER.debug("Stored page at offset %04x", self.firmware_offset)
 
-        LOGGER.debug("Stored page at offset {:04x}".format(self.firmware_offset))
+    def write_firmware_file(self, data):
+        """
+        Append data to firmware file
+
+        :param data:    bytes or memoryview, data to append
+        :return:        None
+        """
+        if self.firmware_file_handle is None:
+            self.firmware_file_handle = open(self.firmware_file_path, 'ab')
+
+        self.firmware_file_handle.write(data)
+        self.firmware_file_handle.flush()
+
+        self.unsynced_pages += 1
+        self.unsynced_bytes += len(data)
+
+    def apply_sync_policy(self):
+        """
+        Sync stored pages if sync policy requires it
+
+        :return:        None
+        """
+        if self.sync_policy == DFUSyncPolicy.PAGE:
+            self.sync()
+        elif self.sync_policy == DFUSyncPolicy.INTERVAL:
+            if 0 < self.sync_interval_pages <= self.unsynced_pages or \
+                    0 < self.sync_interval_bytes <= self.unsynced_bytes:
+                self.sync()
+
+    def sync(self):
+        """
+        Force OS to write stored pages to disk
+
+        :return:        None
+        """
+        if self.firmware_file_handle is not None and self.unsynced_pages:
+            self.firmware_file_handle.flush()
+            os.fsync(self.firmware_file_handle.fileno())
+            self.page_index.sync()
+            LOGGER.debug("Synced %d bytes of firmware file", self.unsynced_bytes)
+
+        self.unsynced_pages = 0
+        self.unsynced_bytes = 0
+
+    def is_synced(self):
+        """
+        Check if firmware stored so far is synced to disk
+
+        :return:        bool, True if sync policy syncs stored pages and all of them are synced
+        """
+        return self.sync_policy != DFUSyncPolicy.NONE and not self.unsynced_pages
+
+    def close(self):
+        """
+        Flush, sync (unless sync policy is none) and close firmware file and page index
+
+        :return:        None
+        """
+        if self.firmware_file_handle is None:
+            self.page_index.close()
+            return
+
+        io_start = time.perf_counter()
+        if self.sync_policy != DFUSyncPolicy.NONE:
+            self.sync()
+
+        self.page_index.close()
+        self.firmware_file_handle.close()
+        self.firmware_file_handle = None
+        self.unsynced_pages = 0
+        self.unsynced_bytes = 0
+        self.io_time += time.perf_counter() - io_start
+
+        LOGGER.debug("Closed firmware file")
+
+    def get_firmware_crc(self):
+        """
+        Get running CRC of stored firmware, rebuild it from firmware memory or firmware file if it is not known yet
+
+        :return:    int, CRC of stored firmware
+        """
+        if self.firmware_crc is None:
+            LOGGER.debug("Rebuilding firmware CRC")
+            if self.firmware_memory is not None:
+                self.firmware_crc = binascii.crc32(self.firmware_memory)
+            else:
+                self.firmware_crc = 0
+                for chunk in self.read_firmware_file():
+                    self.firmware_crc = binascii.crc32(chunk, self.firmware_crc)
+
+        return self.firmware_crc
+
+    def resume(self, offset: int = None, crc: int = None):
+        """
+        Resume from a checkpoint. Stored firmware is verified page by page against page index and truncated to
+        the last verified page boundary not past the checkpoint, running checksums are rebuilt on the way.
+        Without page index, data stored after the checkpoint is dropped and CRC is taken from the checkpoint.
+
+        :param offset:  int or None, firmware offset the checkpoint was made at, None if there is no checkpoint
+        :param crc:     int or None, CRC of firmware stored up to offset
+        :return:        int, firmware offset stored firmware was resumed at
+        """
+        if self.page_index.entries:
+            return self.verify_pages(self.firmware_offset if offset is None else offset, crc)
+
+        if offset is None:
+            return self.firmware_offset
+
+        if offset > self.firmware_offset:
+            LOGGER.warning("Firmware file is shorter than checkpoint (%d < %d), resuming from firmware file",
+                           self.firmware_offset, offset)
+            return self.firmware_offset
+
+        if offset < self.firmware_offset:
+            LOGGER.warning("Dropping %d bytes stored after checkpoint", self.firmware_offset - offset)
+            self.truncate(offset)
+
+        self.firmware_crc = crc
+        LOGGER.debug("Resumed from checkpoint at offset {:04x}".format(offset))
+        return offset
+
+    def verify_pages(self, max_offset: int, expected_crc: int = None):
+        """
+        Verify stored firmware page by page against page index and truncate it to the last verified page boundary.
+
+        :param max_offset:      int, pages ending after this offset are dropped
+        :param expected_crc:    int or None, expected CRC of firmware up to max_offset
+        :return:                int, verified firmware offset
+        """
+        firmware_crc = 0
+        firmware_sha = hashlib.sha256()
+        verified_offset = 0
+        verified_pages = 0
+
+        try:
+            with open(self.firmware_file_path, 'rb') as firmware_file:
+                for offset, length, page_crc in self.page_index.entries:
+                    if offset + length > max_offset:
+                        break
+
+                    page = firmware_file.read(length)
+                    if len(page) != length or (binascii.crc32(page) & 0xFFFFFFFF) != page_crc:
+                        LOGGER.warning("Stored page at offset %d is corrupted", offset)
+                        break
+
+                    firmware_crc = binascii.crc32(page, firmware_crc)
+                    firmware_sha.update(page)
+                    verified_offset = offset + length
+                    verified_pages += 1
+        except FileNotFoundError:
+            LOGGER.debug("Unable to open firmware file")
+
+        if verified_offset == max_offset and expected_crc is not None and expected_crc != firmware_crc:
+            LOGGER.warning("Firmware checkpoint CRC does not match stored pages, using CRC of stored pages")
+
+        if verified_offset != self.firmware_offset:
+            LOGGER.warning("Dropping %d bytes stored after last verified page",
+                           self.firmware_offset - verified_offset)
+            self.truncate(verified_offset)
+
+        self.page_index.truncate(verified_pages)
+        self.firmware_crc = firmware_crc
+        self.firmware_sha = firmware_sha
+
+        LOGGER.debug("Verified %d stored pages up to offset %04x", verified_pages, verified_offset)
+        return verified_offset
+
+    def find_corrupted_pages(self, first: int = 0, count: int = None):
+        """
+        Find stored pages which no longer match CRC32 taken when they were received.
+        Only pages in range are read from firmware file.
+
+        :param first:   int, number of first page to check
+        :param count:   int or None, number of pages to check, None checks up to the last page
+        :return:        list, firmware offsets of corrupted pages
+        """
+        return [self.page_index.entries[number][0]
+                for number in self.page_index.verify_pages(self.firmware_file_path, first, count)]
+
+    def truncate(self, offset: int):
+        """
+        Drop stored firmware after offset. Running checksums are rebuilt on demand.
+
+        :param offset:  int, new firmware offset
+        :return:        None
+        """
+        self.close()
+        self.reset_page()
+
+        try:
+            os.truncate(self.firmware_file_path, offset)
+        except FileNotFoundError:
+            LOGGER.debug("Unable to open firmware file")
+
+        if self.firmware_memory is not None:
+            del self.firmware_memory[offset:]
+
+        self.firmware_offset = offset
+        self.firmware_crc = None
+        self.firmware_sha = None
+
+        self.page_index.truncate_to_offset(offset)
 
     def calc_firmware_crc(self):
         """
-        Calculate CRC of data already stored in firmware memory
+        Calculate CRC of data already stored in firmware memory and data written to current page
 
         :return:    int, calculated CRC
         """
-        return (binascii.crc32(self.firmware_memory + self.firmware_page) & 0xFFFFFFFF)
+        if self.firmware_page_crc is not None:
+            return self.firmware_page_crc & 0xFFFFFFFF
+
+        return self.get_firmware_crc() & 0xFFFFFFFF
+
+    def get_firmware_sha(self):
+        """
+        Get running SHA256 of stored firmware, rebuild it by streaming firmware file if it is not known yet
+
+        :return:    hashlib SHA256 object fed with stored firmware
+        """
+        if self.firmware_sha is None:
+            LOGGER.debug("Rebuilding firmware SHA256 from firmware file")
+            self.firmware_sha = hashlib.sha256()
+            for chunk in self.read_firmware_file():
+                self.firmware_sha.update(chunk)
+
+        return self.firmware_sha
+
+    def read_firmware_file(self):
+        """
+        Stream firmware file in chunks, so it never has to be loaded whole
+
+        :return:    generator of bytes, consecutive chunks of firmware file
+        """
+        try:
+            with open(self.firmware_file_path, 'rb') as firmware_file:
+                for chunk in iter(lambda: firmware_file.read(FIRMWARE_FILE_CHUNK_SIZE), b''):
+                    yield chunk
+        except FileNotFoundError:
+            LOGGER.debug("Unable to open firmware file")
 
     def calc_firmware_sha256(self):
         """
-        Calculate SHA256 of data stored in firmware memory
+        Finalize SHA256 of data stored in firmware memory
 
         :return:    bytes, calculated SHA256
         """
-        sha = hashlib.sha256(self.firmware_memory).digest()
+        sha = self.get_firmware_sha().digest()
         sha = bytearray(sha)
         sha.reverse()
 
@@ -172,6 +511,8 @@ class DFUMemory:
         """
         Clear memory
         """
+        self.close()
+
         self.firmware_memory_size = 0
         self.app_data_memory_size = 0
 
@@ -179,9 +520,10 @@ class DFUMemory:
         self.app_data_memory = None
         self.firmware_offset = 0
         self.firmware_crc = 0
+        self.firmware_sha = hashlib.sha256()
 
-        self.firmware_page = bytes()
-        self.firmware_page_offset = 0
+        self.reset_page()
+        self.page_index.clear()
 
         self.app_data_file = open(self.app_data_file_path, 'wb')
         self.firmware_file = open(self.firmware_file_path, 'wb')
@@ -1,16 +1,17 @@
 import binascii
 import logging
+import time
 
 from silvair_uart_common_libs.message_types import DFUStatus
 from silvair_uart_common_libs.messages import GenericMessage, UartCommand, DfuInitResponseMessage, \
     DfuStatusResponseMessage, DfuPageCreateResponseMessage, DfuPageStoreResponseMessage, DfuCancelRequestMessage, \
     DfuStateRequestMessage
 
-from ..console_out import ConsoleOut
 from .dfu_fail_mgr import DFUFailMgr
 from .dfu_fsm import DFU_FSM
-from .dfu_memory import DFUMemory
+from .dfu_memory import DFUMemory, DFUMemoryError
 from .dfu_nvm import DFU_NVM
+from .dfu_session_timer import DFUSessionTimer
 from .states.dfu_fsm_states import DFUState
 
 LOGGER = logging.getLogger(__name__)
@@ -87,6 +88,36 @@ class DFU_FSM_EventMgr:
         """
         pass
 
+    def dfu_error(self, message: str):
+        """
+        Handle DFU error event
+
+        :param message: str, error description
+        :return:        None
+        """
+        pass
+
+    def dfu_session_timing(self, timing: dict):
+        """
+        Handle DFU session timing event, sent when DFU process ends
+
+        :param timing:  dict, session record: result, total time, time in every DFU state, cumulative time and count
+                        of init_otau, create_page, write_data, page_store and sha_validation phases, NVM writes
+                        and firmware file I/O, times in seconds
+        :return:        None
+        """
+        pass
+
+    def dfu_latency_summary(self, summary: dict):
+        """
+        Handle DFU latency summary event, sent when DFU process ends
+
+        :param summary: dict, opcode name -> {'count': int, 'latency_us': dict, 'cpu_us': dict}, frame handling
+                        latency and CPU time percentiles (p50, p90, p99, max) in microseconds
+        :return:        None
+        """
+        pass
+
 
 class DFU_Mgr:
     def __init__(self,
@@ -95,7 +126,9 @@ class DFU_Mgr:
                  memory: DFUMemory,
                  fail_mgr: DFUFailMgr,
                  nvm: str,
-                 expected_app_data: bytes):
+                 expected_app_data: bytes,
+                 page_recovery: bool = False,
+                 dispatch_stats=None):
         """
         DFU Manager initialization
 
@@ -104,6 +137,10 @@ class DFU_Mgr:
         :param memory:                  DFU_FSM_Memory, Mock memory object
         :param nvm:                     str, NVM file path
         :param expected_app_data:       bytes, expected app data, ignored if None
+        :param page_recovery:           bool, if True failed page is dropped and DFU process continues from
+                                        the last stored page, otherwise a failed page fails DFU process
+        :param dispatch_stats:          DispatchStats or None, frame handling times summarized when DFU process ends,
+                                        once the frame ending it is recorded
         """
 
         assert sender is not None
@@ -115,7 +152,10 @@ class DFU_Mgr:
         self.dfu_memory = memory
         self.fail_mgr = fail_mgr
         self.expected_app_data = expected_app_data
+        self.page_recovery = page_recovery
+        self.dispatch_stats = dispatch_stats
         self.nvm = DFU_NVM(nvm)
+        self.session_timer = DFUSessionTimer(self.dfu_memory, self.nvm)
 
         self.initial_state_id = self.nvm.get('current_state_id')
         self.firmware_image_size = self.nvm.get('firmware_image_size')
@@ -136,7 +176,8 @@ class DFU_Mgr:
 
             LOGGER.debug("initial state: {:s}".format(str(self.initial_state_id.name)))
             if self.initial_state_id == DFUState.Upload or self.initial_state_id == DFUState.UploadPage:
-
+                self.session_timer.start(resumed=True)
+                self.resume_from_checkpoint()
                 self.event_mgr.dfu_initialized(self.firmware_image_size,
                                                self.firmware_image_sha256,
                                                self.dfu_memory.app_data_memory,
@@ -169,18 +210,63 @@ class DFU_Mgr:
 
     def update_state(self, new_state_id: DFUState):
         """
-        Update OTAU state
+        Update OTAU state.
+        Upload state is written in a single record together with firmware checkpoint: offset and running CRC
+        of firmware stored so far. Stored pages are already flushed to firmware file at that point, so after
+        a process crash the checkpoint is never ahead of the firmware file. The record is synced to disk only
+        when stored pages are synced (per sync policy), otherwise after a power loss checkpoint and firmware
+        file can diverge and resume relies on verifying stored pages.
 
         :param new_state_id:    DFUState, New state
         :return:                None
         """
         self.current_state_id = new_state_id
-        self.nvm.update('current_state_id', new_state_id.value)
+
+        if new_state_id == DFUState.Upload:
+            self.nvm.update('firmware_checkpoint', {'offset': self.dfu_memory.firmware_offset,
+                                                    'crc': self.dfu_memory.get_firmware_crc()},
+                            transient=True)
+
+        # Upload Page lasts a single page and is not worth resuming from, write it only along with next state
+        self.nvm.update('current_state_id', new_state_id.value, new_state_id == DFUState.UploadPage,
+                        sync=new_state_id == DFUState.Upload and self.dfu_memory.is_synced())
+        self.session_timer.state_changed(new_state_id.name)
         self.event_mgr.dfu_state_changed(new_state_id)
 
+    def resume_from_checkpoint(self):
+        """
+        Bring firmware memory back to last verified page not past firmware checkpoint.
+        Offset reported in following status responses is the one firmware memory was resumed at.
+
+        :return:                None
+        """
+        firmware_checkpoint = self.nvm.get('firmware_checkpoint')
+        if firmware_checkpoint:
+            offset = self.dfu_memory.resume(firmware_checkpoint['offset'], firmware_checkpoint['crc'])
+        else:
+            offset = self.dfu_memory.resume()
+
+        LOGGER.info("Resuming DFU process at offset %d", offset)
+
     def init_otau(self, msg):
         """
-        Initialize DFU process.
+        Initialize DFU process, starting new DFU session. Rejected DFU Init Request ends the session as failed.
+
+        :param msg:             Received message
+        :return:                True if success, False otherwise
+        """
+        self.session_timer.start()
+        init_start = time.perf_counter()
+        initialized = self.init_dfu_process(msg)
+        self.session_timer.add('init_otau', time.perf_counter() - init_start)
+
+        if not initialized:
+            self.report_dfu_fail()
+        return initialized
+
+    def init_dfu_process(self, msg):
+        """
+        Validate DFU Init Request, prepare memory and send DFU Init Response.
 
         :param msg:             Received message
         :return:                True if success, False otherwise
@@ -196,7 +282,6 @@ class DFU_Mgr:
             if fault.should_send_response():
                 self.send_dfu_init_response(status=fault.status)
 
-            self.event_mgr.dfu_failed()
             return False
 
         if self.expected_app_data is not None and self.expected_app_data != msg.app_data:
@@ -205,7 +290,7 @@ class DFU_Mgr:
             str_expected = binascii.hexlify(self.expected_app_data).decode("ascii")
             str_got = binascii.hexlify(msg.app_data).decode("ascii")
 
-            ConsoleOut.print_error_message("Invalid app_data! expected: '{}', got: '{}'".format(str_expected, str_got))
+            self.event_mgr.dfu_error("Invalid app_data! expected: '{}', got: '{}'".format(str_expected, str_got))
             return False
 
         try:
@@ -214,7 +299,7 @@ class DFU_Mgr:
             self.dfu_memory.set_firmware_memory_size(msg.firmware_size)
         except Exception as err:
             self.send_dfu_init_response(status=DFUStatus.DFU_INSUFFICIENT_RESOURCES)
-            ConsoleOut.print_error_message("Initializing memory failed: {}".format(str(err)))
+            self.event_mgr.dfu_error("Initializing memory failed: {}".format(str(err)))
             LOGGER.debug("Initializing memory failed: %s", str(err))
             return False
 
@@ -317,7 +402,17 @@ class DFU_Mgr:
 
             return False
 
-        self.dfu_memory.create_page(msg.requested_page_size)
+        create_start = time.perf_counter()
+        try:
+            self.dfu_memory.create_page(msg.requested_page_size)
+        except DFUMemoryError as e:
+            self.send_page_create_response(status=DFUStatus.DFU_INSUFFICIENT_RESOURCES)
+
+            LOGGER.debug("Creating page failed: %s", str(e))
+            return False
+        finally:
+            self.session_timer.add('create_page', time.perf_counter() - create_start)
+
         self.send_page_create_response(status=DFUStatus.DFU_SUCCESS)
 
     def process_write_data(self, data):
@@ -327,13 +422,18 @@ class DFU_Mgr:
         :param data: Received data
         :return:     None
         """
-        self.dfu_memory.write_data(data)
+        write_start = time.perf_counter()
+        try:
+            self.dfu_memory.write_data(data)
+        except DFUMemoryError as e:
+            LOGGER.debug("Writing data failed: %s", str(e))
+        self.session_timer.add('write_data', time.perf_counter() - write_start)
 
     def page_store(self):
         """
         Validate and store page in memory
 
-        :return:    True if success, False otherwise
+        :return:    True if DFU process continues (page stored or dropped in page recovery mode), False otherwise
         """
         fault = self.fail_mgr.on_page_store_request_fault()
         if fault is not None:
@@ -342,18 +442,30 @@ class DFU_Mgr:
             if fault.should_send_response():
                 self.send_page_store_response(status=fault.status)
 
-            return False
+            return self.recover_failed_page()
 
+        store_start = time.perf_counter()
+        store_error = None
         try:
             self.dfu_memory.page_store()
         except Exception as e:
+            store_error = e
+        self.session_timer.add('page_store', time.perf_counter() - store_start)
+
+        if store_error is not None:
             self.send_page_store_response(status=DFUStatus.DFU_INVALID_OBJECT)
 
-            LOGGER.debug("Storing page failed: " + str(e))
-            return False
+            LOGGER.debug("Storing page failed: " + str(store_error))
+            return self.recover_failed_page()
 
         if self.dfu_memory.firmware_offset == self.firmware_image_size:
-            if self.dfu_memory.calc_firmware_sha256() == self.firmware_image_sha256:
+            self.dfu_memory.close()
+
+            validation_start = time.perf_counter()
+            sha_valid = self.dfu_memory.calc_firmware_sha256() == self.firmware_image_sha256
+            self.session_timer.add('sha_validation', time.perf_counter() - validation_start)
+
+            if sha_valid:
                 fault = self.fail_mgr.on_post_validation_fault()
                 if fault is not None:
                     LOGGER.debug("Failure manager called fault: %s", fault)
@@ -361,20 +473,22 @@ class DFU_Mgr:
                     if fault.should_send_response():
                         self.send_page_store_response(status=DFUStatus.DFU_INVALID_OBJECT)
 
-                    self.event_mgr.dfu_failed()
+                    self.report_dfu_fail()
                     return False
 
                 self.send_page_store_response(status=DFUStatus.DFU_FIRMWARE_SUCCESSFULLY_UPDATED)
 
                 self.event_mgr.dfu_page_stored(self.dfu_memory.firmware_offset)
                 self.event_mgr.dfu_update_complete()
+                self.report_session_end('complete')
 
                 LOGGER.info("Firmware successfully updated")
                 return False
 
             else:
+                self.report_corrupted_pages()
                 self.send_page_store_response(status=DFUStatus.DFU_INVALID_OBJECT)
-                self.event_mgr.dfu_failed()
+                self.report_dfu_fail()
                 return False
         else:
             self.send_page_store_response(status=DFUStatus.DFU_SUCCESS)
@@ -383,6 +497,34 @@ class DFU_Mgr:
             LOGGER.debug("Page store success")
             return True
 
+    def recover_failed_page(self):
+        """
+        Drop failed page in page recovery mode. Already stored pages are kept, so following status responses
+        report offset and CRC of the last stored page and modem can continue from there. Otherwise DFU fail is reported.
+
+        :return:    True if DFU process continues, False if it failed
+        """
+        if not self.page_recovery:
+            self.report_dfu_fail()
+            return False
+
+        self.dfu_memory.reset_page()
+        LOGGER.warning("Dropped failed page, continuing from offset %d", self.dfu_memory.firmware_offset)
+        return True
+
+    def report_corrupted_pages(self):
+        """
+        Pinpoint pages which changed on storage after they were received, when firmware SHA256 validation fails
+
+        :return:    None
+        """
+        corrupted_pages = self.dfu_memory.find_corrupted_pages()
+        if corrupted_pages:
+            LOGGER.error("Firmware SHA256 mismatch, stored pages at offsets %s are corrupted",
+                         ', '.join('{:04x}'.format(offset) for offset in corrupted_pages))
+        else:
+            LOGGER.error("Firmware SHA256 mismatch, stored pages match data as received")
+
     def drop_otau(self):
         """
         Drop ongoing OTAU process
@@ -404,3 +546,26 @@ class DFU_Mgr:
         Report DFU fail
         """
         self.event_mgr.dfu_failed()
+        self.report_session_end('failed')
+
+    def report_session_end(self, result: str):
+        """
+        Report phase timing and frame handling times of DFU session which ended, following session is timed and
+        summarized separately
+
+        :param result:  str, how session ended, 'complete' or 'failed'
+        :return:        None
+        """
+        self.event_mgr.dfu_session_timing(self.session_timer.record(result))
+        self.session_timer.start()
+
+        if self.dispatch_stats is not None:
+            # Frame ending the session is still being handled, summary is taken once its handling time is recorded
+            self.dispatch_stats.request_summary(self.event_mgr.dfu_latency_summary)
+
+    def close(self):
+        """
+        Close files used by DFU manager
+        """
+        self.dfu_memory.close()
+        self.nvm.close()
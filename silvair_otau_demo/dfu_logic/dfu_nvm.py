@@ -1,27 +1,77 @@
 import json
 import logging
+import os
+import time
 
 LOGGER = logging.getLogger(__name__)
 
+DEFAULT_COMPACTION_THRESHOLD = 1000
+
+
 class DFU_NVM:
     """
-    DFU Non Volatile Memory, allow to store serializable dict as JSON in a file
+    DFU Non Volatile Memory, allow to store serializable dict as JSON in a file.
+
+    File is an append only log. Every line is a JSON object with updated keys, later lines override earlier ones.
+    When the log grows over compaction threshold it is rewritten as a single line.
     """
-    def __init__(self, path = 'nvm'):
+    def __init__(self, path = 'nvm', compaction_threshold: int = DEFAULT_COMPACTION_THRESHOLD):
         """
         Init DFU_NVM
 
-        :param path: Path to file used to store state
+        :param path:                    Path to file used to store state
+        :param compaction_threshold:    Number of log lines after which log is compacted
         """
         self.path = path
+        self.compaction_threshold = compaction_threshold
+
+        self.data_dict = dict()
+        self.committed_dict = dict()
+        self.pending_dict = dict()
+        self.log_length = 0
+        self.file = None
+        # Set when log may end with torn record (i.e. after failed append), log is rewritten before next append
+        self.dirty = False
+        # Cumulative time in seconds and number of log appends and compactions
+        self.write_time = 0.0
+        self.write_count = 0
+
+        torn = False
+        unterminated = False
         try:
-            with open(path, 'r') as file:
-                self.data_dict = json.load(file)
+            # Lines are decoded one by one, so undecodable bytes are handled as torn record as well
+            with open(path, 'rb') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+
+                    if not isinstance(record, dict):
+                        # Only the last line can be torn by interrupted append, drop it and everything after it
+                        torn = True
+                        break
+
+                    self.committed_dict.update(record)
+                    self.log_length += 1
+                    # Appending after a line without newline would corrupt both records
+                    unterminated = not line.endswith(b'\n')
             LOGGER.debug("Successfully loaded data from file")
-        except:
-            self.data_dict = dict()
+        except OSError:
             LOGGER.debug("Unable to read data from file")
 
+        self.data_dict.update(self.committed_dict)
+
+        if torn:
+            LOGGER.warning("Dropped torn record from nvm file")
+
+        self.dirty = torn or unterminated
+        if self.dirty:
+            self.compact()
+
         LOGGER.info("DFU_NVM initialized")
 
     def get(self, key):
@@ -36,19 +86,131 @@ class DFU_NVM:
             self.update(key, None)
             return self.data_dict[key]
 
-    def update(self, key, value):
+    def update(self, key, value, transient: bool = False, sync: bool = False):
         """
         Update value related to key
 
-        :param key:     Key
-        :param value:   value
-        :return:        None
+        :param key:         Key
+        :param value:       value
+        :param transient:   if True value is not written until next non transient update
+        :param sync:        if True written record is synced to disk, so it survives power loss
+        :return:            None
         """
         self.data_dict.update( {key : value} )
+        self.pending_dict.update( {key : value} )
+
+        if not transient:
+            self.flush(sync)
+
+    def flush(self, sync: bool = False):
+        """
+        Append pending updates to log as a single record. If log may end with torn record, it is rewritten
+        with pending updates instead.
+
+        :param sync:    bool, if True appended record is synced to disk, rewritten log is always synced
+        :return:        None
+        """
+        if not self.pending_dict:
+            return
+
+        if self.dirty:
+            self.compact()
+            return
 
+        write_start = time.perf_counter()
         try:
-            with open(self.path, 'w') as file:
-                json.dump(self.data_dict, file)
+            if self.file is None:
+                self.file = open(self.path, 'a')
+
+            self.file.write(json.dumps(self.pending_dict) + '\n')
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
             LOGGER.debug("Successfully updated nvm file")
-        except:
-            LOGGER.error("Unable to update nvm file")
\ No newline at end of file
+        except OSError:
+            LOGGER.error("Unable to update nvm file")
+            # Record could be partially written, appending after it would lose every following record on load
+            self.dirty = True
+            return
+        except (TypeError, ValueError):
+            LOGGER.error("Unable to update nvm file")
+            return
+        finally:
+            self.write_time += time.perf_counter() - write_start
+            self.write_count += 1
+
+        self.committed_dict.update(self.pending_dict)
+        self.pending_dict = dict()
+        self.log_length += 1
+
+        if self.log_length > self.compaction_threshold:
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite log as a single record holding committed state and pending updates.
+        New log is written to temporary file which then atomically replaces the old one.
+
+        :return:    None
+        """
+        try:
+            self.close()
+        except OSError:
+            # Buffered part of failed append could not be written either, log is replaced anyway
+            pass
+
+        state = dict(self.committed_dict)
+        state.update(self.pending_dict)
+
+        tmp_path = self.path + '.tmp'
+        write_start = time.perf_counter()
+        try:
+            with open(tmp_path, 'w') as file:
+                file.write(json.dumps(state) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+            sync_directory(self.path)
+            LOGGER.debug("Compacted nvm file")
+        except (OSError, TypeError, ValueError):
+            LOGGER.error("Unable to compact nvm file")
+            return
+        finally:
+            self.write_time += time.perf_counter() - write_start
+            self.write_count += 1
+
+        self.committed_dict = state
+        self.pending_dict = dict()
+        self.log_length = 1
+        self.dirty = False
+
+    def close(self):
+        """
+        Close log file. Pending transient updates are not written.
+
+        :return:    None
+        """
+        if self.file is not None:
+            file, self.file = self.file, None
+            file.close()
+
+
+def sync_directory(path):
+    """
+    Sync directory containing path, so that rename of path survives power loss.
+    Not every platform allows opening directories, there it is silently skipped.
+
+    :param path:    str, path to file in directory to sync
+    :return:        None
+    """
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
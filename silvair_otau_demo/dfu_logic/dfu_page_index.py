@@ -0,0 +1,180 @@
+import binascii
+import logging
+import os
+import struct
+
+LOGGER = logging.getLogger(__name__)
+
+PAGE_INDEX_SUFFIX = '.idx'
+PAGE_INDEX_MAGIC = b'DFUIDX03'
+# Page offset, page length, CRC32 of page data
+PAGE_INDEX_RECORD = struct.Struct('<III')
+
+
+class DFUPageIndex:
+    """
+    Sidecar file of firmware file, holding offset, length and CRC32 of every stored page.
+    Any page range can be verified by reading just the pages in that range.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize DFUPageIndex and load entries from file
+
+        :param path:    Path to page index file
+        """
+        self.path = path
+        self.entries = []
+        self.file = None
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            LOGGER.debug("Unable to open page index file")
+            data = bytes()
+
+        if not data.startswith(PAGE_INDEX_MAGIC):
+            if data:
+                LOGGER.warning("Unsupported page index file format, ignoring stored pages index")
+            data = bytes()
+
+        records = data[len(PAGE_INDEX_MAGIC):]
+        records = records[:len(records) - len(records) % PAGE_INDEX_RECORD.size]
+
+        end = 0
+        for offset, length, crc in PAGE_INDEX_RECORD.iter_unpack(records):
+            if offset != end:
+                LOGGER.warning("Page index is not contiguous at offset %d, ignoring following pages", offset)
+                break
+
+            self.entries.append((offset, length, crc))
+            end = offset + length
+
+        if self.file_size(len(self.entries)) != len(data):
+            self.truncate(len(self.entries))
+
+    @staticmethod
+    def file_size(count: int):
+        """
+        Size of page index file holding count entries
+
+        :param count:   int, number of entries
+        :return:        int, file size in bytes
+        """
+        return len(PAGE_INDEX_MAGIC) + count * PAGE_INDEX_RECORD.size
+
+    @property
+    def end_offset(self):
+        """
+        Firmware offset right after last indexed page
+
+        :return:    int, end offset
+        """
+        if not self.entries:
+            return 0
+
+        offset, length, _ = self.entries[-1]
+        return offset + length
+
+    def append(self, offset: int, length: int, page: bytes):
+        """
+        Append entry of stored page
+
+        :param offset:  int, page offset in firmware
+        :param length:  int, page length
+        :param page:    bytes or memoryview, page data
+        :return:        None
+        """
+        crc = binascii.crc32(page) & 0xFFFFFFFF
+
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+
+        self.file.write(PAGE_INDEX_RECORD.pack(offset, length, crc))
+        self.file.flush()
+        self.entries.append((offset, length, crc))
+
+    def truncate(self, count: int):
+        """
+        Keep only first count page entries
+
+        :param count:   int, number of entries to keep
+        :return:        None
+        """
+        self.close()
+
+        self.entries = self.entries[:count]
+
+        with open(self.path, 'r+b' if os.path.exists(self.path) else 'wb') as file:
+            file.seek(0)
+            file.write(PAGE_INDEX_MAGIC)
+            file.truncate(self.file_size(count))
+
+    def truncate_to_offset(self, offset: int):
+        """
+        Keep only page entries ending at or before firmware offset
+
+        :param offset:  int, firmware offset
+        :return:        None
+        """
+        count = 0
+        for page_offset, length, _ in self.entries:
+            if page_offset + length > offset:
+                break
+            count += 1
+
+        self.truncate(count)
+
+    def verify_pages(self, firmware_path: str, first: int = 0, count: int = None):
+        """
+        Verify range of stored pages against their CRC32. Only pages in range are read from firmware file.
+
+        :param firmware_path:   str, path to firmware file
+        :param first:           int, number of first page to verify
+        :param count:           int or None, number of pages to verify, None verifies up to the last page
+        :return:                list, numbers of pages which do not match their CRC32
+        """
+        entries = self.entries[first:] if count is None else self.entries[first:first + count]
+        corrupted = []
+
+        try:
+            with open(firmware_path, 'rb') as firmware_file:
+                for number, (offset, length, crc) in enumerate(entries, first):
+                    firmware_file.seek(offset)
+                    page = firmware_file.read(length)
+                    if len(page) != length or (binascii.crc32(page) & 0xFFFFFFFF) != crc:
+                        corrupted.append(number)
+        except FileNotFoundError:
+            LOGGER.debug("Unable to open firmware file")
+            corrupted = list(range(first, first + len(entries)))
+
+        return corrupted
+
+    def sync(self):
+        """
+        Force OS to write page index to disk
+
+        :return:        None
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def clear(self):
+        """
+        Remove all page entries
+
+        :return:        None
+        """
+        self.truncate(0)
+
+    def close(self):
+        """
+        Close page index file
+
+        :return:        None
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
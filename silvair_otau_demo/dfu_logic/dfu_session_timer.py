@@ -0,0 +1,108 @@
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+# Phases timed by DFU_Mgr, reported even if they never happened in a session
+DFU_SESSION_PHASES = ('init_otau', 'create_page', 'write_data', 'page_store', 'sha_validation')
+
+
+class DFUSessionTimer:
+    """
+    Wall clock time of DFU session phases: cumulative time and count of every timed phase, time spent in every
+    DFU state, and time of NVM writes and firmware file I/O taken from DFU_NVM and DFUMemory counters.
+    Session lasts from DFU Init Request (or resume) until DFU process completes or fails.
+    """
+
+    def __init__(self, memory, nvm):
+        """
+        Initialize DFUSessionTimer
+
+        :param memory:  DFUMemory, provides io_time counter
+        :param nvm:     DFU_NVM, provides write_time and write_count counters
+        """
+        self.memory = memory
+        self.nvm = nvm
+
+        self.resumed = False
+        self.start_time = 0.0
+        self.phases = dict()
+        self.states = dict()
+        self.state_name = None
+        self.state_enter_time = 0.0
+        self.memory_io_time = 0.0
+        self.nvm_write_time = 0.0
+        self.nvm_write_count = 0
+
+        self.start()
+
+    def start(self, resumed: bool = False):
+        """
+        Start new session, dropping times of previous one
+
+        :param resumed: bool, True if session continues DFU process interrupted earlier
+        :return:        None
+        """
+        self.resumed = resumed
+        self.start_time = self.state_enter_time = time.monotonic()
+        self.phases = {phase: [0.0, 0] for phase in DFU_SESSION_PHASES}
+        self.states = dict()
+        self.memory_io_time = self.memory.io_time
+        self.nvm_write_time = self.nvm.write_time
+        self.nvm_write_count = self.nvm.write_count
+
+    def add(self, phase: str, seconds: float):
+        """
+        Add single occurrence of phase
+
+        :param phase:   str, phase name
+        :param seconds: float, phase duration
+        :return:        None
+        """
+        phase_time = self.phases.get(phase)
+        if phase_time is None:
+            phase_time = self.phases[phase] = [0.0, 0]
+
+        phase_time[0] += seconds
+        phase_time[1] += 1
+
+    def state_changed(self, state_name: str):
+        """
+        Account time spent in previous state
+
+        :param state_name:  str, name of new DFU state
+        :return:            None
+        """
+        now = time.monotonic()
+        if self.state_name is not None:
+            self.states[self.state_name] = self.states.get(self.state_name, 0.0) + now - self.state_enter_time
+
+        self.state_name = state_name
+        self.state_enter_time = now
+
+    def record(self, result: str):
+        """
+        Structured record of current session
+
+        :param result:  str, how session ended, i.e. 'complete' or 'failed'
+        :return:        dict, session record, times in seconds
+        """
+        now = time.monotonic()
+        states = dict(self.states)
+        if self.state_name is not None:
+            states[self.state_name] = states.get(self.state_name, 0.0) + now - self.state_enter_time
+
+        record = {
+            'result': result,
+            'resumed': self.resumed,
+            'total_s': round(now - self.start_time, 6),
+            'states_s': {name: round(seconds, 6) for name, seconds in states.items()},
+            'nvm_write_s': round(self.nvm.write_time - self.nvm_write_time, 6),
+            'nvm_write_count': self.nvm.write_count - self.nvm_write_count,
+            'file_io_s': round(self.memory.io_time - self.memory_io_time, 6),
+        }
+        for phase, (seconds, count) in self.phases.items():
+            record[phase + '_s'] = round(seconds, 6)
+            record[phase + '_count'] = count
+
+        return record
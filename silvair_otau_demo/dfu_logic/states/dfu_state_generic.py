@@ -103,6 +103,18 @@ class DFUGenericState:
         """
         pass
 
+    @staticmethod
+    def dfu_write_data_payload_event(fsm_instance, data):
+        """
+        Write Data Event payload decoded without creating a message. Not handled by default, so that message
+        goes through standard Write Data Event Message handler. Overload this in derivative class.
+
+        :param fsm_instance:    DFU Finite State Machine instance
+        :param data:            memoryview, received data
+        :return:                True if data was handled, False otherwise
+        """
+        return False
+
     @staticmethod
     def dfu_page_store_request_message_event(fsm_instance, msg):
         """
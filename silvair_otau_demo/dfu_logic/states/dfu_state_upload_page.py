@@ -79,10 +79,22 @@ class DFUUploadPageState(DFUGenericState):
         """
         fsm_instance.dfu_mgr.process_write_data(msg.data)
 
+    @staticmethod
+    def dfu_write_data_payload_event(fsm_instance, data):
+        """
+        Write data to memory.
+
+        :param fsm_instance:    DFU Finite State Machine instance
+        :param data:            memoryview, received data
+        :return:                True
+        """
+        fsm_instance.dfu_mgr.process_write_data(data)
+        return True
+
     @staticmethod
     def dfu_page_store_request_message_event(fsm_instance, msg):
         """
-        Handle page store event. Change state to Upload (if success) or Standby (if failed)
+        Handle page store event. Change state to Upload (if success or failed page was dropped) or Standby (if failed)
 
         :param fsm_instance:    DFU Finite State Machine instance
         :param msg:             Received message
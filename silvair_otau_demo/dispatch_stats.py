@@ -0,0 +1,169 @@
+import logging
+import time
+
+from silvair_uart_common_libs.messages import UartCommand
+
+LOGGER = logging.getLogger(__name__)
+
+# Every power of two range of values is split into 2 ** HISTOGRAM_SUB_BUCKET_BITS buckets, so that bucket bounds
+# differ from recorded values by at most 25%
+HISTOGRAM_SUB_BUCKET_BITS = 2
+HISTOGRAM_SUB_BUCKETS = 1 << HISTOGRAM_SUB_BUCKET_BITS
+# Values up to 2 ** 40 ns (about 18 minutes) fall into their own buckets, longer ones into the last bucket
+HISTOGRAM_BUCKETS = 39 * HISTOGRAM_SUB_BUCKETS
+HISTOGRAM_PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+# Clocks in nanoseconds, thread CPU time falls back to process CPU time where platform does not support it
+wall_clock_ns = getattr(time, 'perf_counter_ns', lambda: int(time.perf_counter() * 1e9))
+cpu_clock_ns = getattr(time, 'thread_time_ns', lambda: int(time.process_time() * 1e9))
+
+
+class LogHistogram:
+    """
+    Histogram of non-negative integer values in fixed log-scale buckets. Recording a value takes a few integer
+    operations and no allocations, percentiles are upper bounds of buckets they fall into.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty LogHistogram
+        """
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.max = 0
+
+    def record(self, value: int):
+        """
+        Record value
+
+        :param value:   int, non-negative value
+        :return:        None
+        """
+        if value < HISTOGRAM_SUB_BUCKETS:
+            index = max(value, 0)
+        else:
+            shift = value.bit_length() - HISTOGRAM_SUB_BUCKET_BITS - 1
+            index = min((shift << HISTOGRAM_SUB_BUCKET_BITS) + (value >> shift), HISTOGRAM_BUCKETS - 1)
+
+        self.buckets[index] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    @staticmethod
+    def bucket_upper_bound(index: int):
+        """
+        :param index:   int, bucket index
+        :return:        int, greatest value recorded in bucket
+        """
+        if index < HISTOGRAM_SUB_BUCKETS:
+            return index
+
+        shift = (index >> HISTOGRAM_SUB_BUCKET_BITS) - 1
+        top = index & (HISTOGRAM_SUB_BUCKETS - 1) | HISTOGRAM_SUB_BUCKETS
+        return ((top + 1) << shift) - 1
+
+    def percentile(self, fraction: float):
+        """
+        Value below or equal to given fraction of recorded values
+
+        :param fraction:    float, percentile as fraction (0.99 for p99)
+        :return:            int, upper bound of bucket percentile falls into, not greater than max, 0 if empty
+        """
+        rank = max(1, int(fraction * self.count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if index == HISTOGRAM_BUCKETS - 1:
+                    return self.max
+                return min(self.bucket_upper_bound(index), self.max)
+
+        return self.max
+
+    def snapshot(self):
+        """
+        Percentiles and max of recorded values
+
+        :return:    dict, p50, p90, p99 and max
+        """
+        snapshot = {name: self.percentile(fraction) for name, fraction in HISTOGRAM_PERCENTILES}
+        snapshot['max'] = self.max
+        return snapshot
+
+
+class DispatchStats:
+    """
+    Count, wall clock handling latency and thread CPU time of received frames, per opcode. Latency much longer than
+    CPU time means handling waits for I/O or other threads.
+
+    Summary requested while a frame is being handled (i.e. by the frame ending DFU process) is taken once that frame
+    is recorded, so it covers the frame too.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty DispatchStats
+        """
+        # Opcode -> (wall clock latency histogram, CPU time histogram), both in nanoseconds
+        self.opcodes = dict()
+        self.summary_handler = None
+
+    def record(self, opcode: int, latency_ns: int, cpu_time_ns: int):
+        """
+        Record handling of single frame
+
+        :param opcode:      int, frame opcode
+        :param latency_ns:  int, wall clock handling time in nanoseconds
+        :param cpu_time_ns: int, thread CPU time of handling in nanoseconds
+        :return:            None
+        """
+        histograms = self.opcodes.get(opcode)
+        if histograms is None:
+            histograms = self.opcodes[opcode] = (LogHistogram(), LogHistogram())
+
+        histograms[0].record(latency_ns)
+        histograms[1].record(cpu_time_ns)
+
+        summary_handler = self.summary_handler
+        if summary_handler is not None:
+            self.summary_handler = None
+            summary_handler(self.snapshot(reset=True))
+
+    def request_summary(self, summary_handler):
+        """
+        Request summary of recorded frames, passed to handler and reset when next frame (the one being handled)
+        is recorded
+
+        :param summary_handler: callable, called with snapshot of recorded frames
+        :return:                None
+        """
+        self.summary_handler = summary_handler
+
+    def snapshot(self, reset: bool = False):
+        """
+        Per opcode count and p50, p90, p99 and max of latency and CPU time in microseconds
+
+        :param reset:   bool, if True recorded frames are dropped after snapshot is taken
+        :return:        dict, opcode name -> {'count': int, 'latency_us': dict, 'cpu_us': dict}
+        """
+        opcodes = self.opcodes
+        if reset:
+            self.opcodes = dict()
+
+        return {opcode_name(opcode): {
+            'count': latency.count,
+            'latency_us': {name: round(value / 1000, 1) for name, value in latency.snapshot().items()},
+            'cpu_us': {name: round(value / 1000, 1) for name, value in cpu_time.snapshot().items()},
+        } for opcode, (latency, cpu_time) in sorted(opcodes.items())}
+
+
+def opcode_name(opcode: int):
+    """
+    :param opcode:  int, frame opcode
+    :return:        str, UartCommand name or hex value of unknown opcode
+    """
+    try:
+        return UartCommand(opcode).name
+    except ValueError:
+        return '0x{:02x}'.format(opcode)
@@ -1,14 +1,25 @@
+import collections
 import logging
 
 from silvair_uart_common_libs import message_factory
 from silvair_uart_common_libs.messages import UartCommand, GenericMessage, InvalidOpcode, InvalidLen
 from silvair_uart_common_libs.uart_common_classes import UartAdapterObserver
 
+from .dfu_logic.dfu_fsm import DFU_FSM_EVENTS
+from .dispatch_stats import DispatchStats, wall_clock_ns, cpu_clock_ns
+from .frame_cache import FrameCache
+from .frame_capture import FrameCapture
 from .dfu_logic.dfu_mgr import DFU_FSM_Output, DFU_FSM
-from .uart_logic.uart_fsm_mgr import UART_FSM_Output, UART_FSM
+from .uart_logic.uart_fsm_mgr import UART_FSM_EVENTS, UART_FSM_Output, UART_FSM
 
 LOGGER = logging.getLogger(__name__)
 
+# Frame passed by UartAdapter: payload length, opcode, payload
+FRAME_OPCODE_INDEX = 1
+# Write Data Event payload: data length, data
+WRITE_DATA_LENGTH_INDEX = 2
+WRITE_DATA_OFFSET = 3
+
 
 class Dispatcher(UartAdapterObserver):
     """
@@ -18,160 +29,124 @@ class Dispatcher(UartAdapterObserver):
     This class can be registered in UartAdapter as observer
     """
 
-    def __init__(self, uart_fsm: UART_FSM, dfu_fsm: DFU_FSM):
+    def __init__(self, uart_fsm: UART_FSM, dfu_fsm: DFU_FSM, capture: FrameCapture = None,
+                 stats: DispatchStats = None):
         """
         Initializes Dispatcher
+
+        :param uart_fsm:    UART_FSM, handles UART messages
+        :param dfu_fsm:     DFU_FSM, handles DFU messages
+        :param capture:     FrameCapture or None, records every received frame
+        :param stats:       DispatchStats or None, per opcode frame handling times are recorded to, new one if None
         """
         self.dfu_fsm = dfu_fsm
         self.uart_fsm = uart_fsm
+        self.capture = capture
+        self.stats = stats if stats is not None else DispatchStats()
+
+        # Opcode -> handler table, built once so that dispatching does not depend on opcode position
+        self.handlers = dict()
+        self.handlers.update((opcode, self.uart_fsm.handle_message) for opcode in UART_FSM_EVENTS)
+        self.handlers.update((opcode, self.dfu_fsm.handle_message) for opcode in DFU_FSM_EVENTS)
+
+        # Number of received messages per opcode with no handler
+        self.unhandled_opcodes = collections.Counter()
+
+        # Write Data Event fast path is checked against message_factory on first frame: None - not checked yet,
+        # True - frame layout matches, False - layout differs and every frame goes through message_factory
+        self.write_data_fast_path = None
 
         LOGGER.info("Dispatcher initialized")
 
     def new_frame_notification(self, data: bytes):
         """
-        Handles new frame coming. This function is called by UartAdapter.
+        Handles new frame coming and records its handling time. This function is called by UartAdapter.
+
+        :param data:    bytes, incoming message
+        :return:        None
+        """
+        if self.capture is not None:
+            self.capture.record_inbound(data)
+
+        start_ns = wall_clock_ns()
+        start_cpu_ns = cpu_clock_ns()
+        try:
+            self.handle_frame(data)
+        finally:
+            if len(data) > FRAME_OPCODE_INDEX:
+                cpu_time_ns = cpu_clock_ns() - start_cpu_ns
+                self.stats.record(data[FRAME_OPCODE_INDEX], wall_clock_ns() - start_ns, cpu_time_ns)
+
+    def handle_frame(self, data: bytes):
+        """
+        Decode frame and dispatch it, Write Data Event frames go straight to DFU FSM when possible.
 
         :param data:    bytes, incoming message
         :return:        None
         """
         try:
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug("Received data %s", bytes_to_readable_hex(data))
+
+            if self.write_data_fast_path is not False and len(data) >= WRITE_DATA_OFFSET and \
+                    data[FRAME_OPCODE_INDEX] == UartCommand.DfuWriteDataEvent and \
+                    data[WRITE_DATA_LENGTH_INDEX] == len(data) - WRITE_DATA_OFFSET:
+                if self.write_data_fast_path is None:
+                    self.check_write_data_fast_path(data)
+                elif self.dfu_fsm.dfu_write_data_payload_event(memoryview(data)[WRITE_DATA_OFFSET:]):
+                    return
 
-            LOGGER.debug("Received data " + bytes_to_readable_hex(data))
             msg = message_factory.deserialize_message(data)
-            LOGGER.debug("Dispatching UART message: " + str(msg))
+            LOGGER.debug("Dispatching UART message: %s", msg)
             self.dispatch(msg)
         except InvalidLen as e:
-            LOGGER.exception("Error while dispatching UART message " + str(type(e)))
+            LOGGER.exception("Error while dispatching UART message %s", type(e))
             return  # UART Error response can be added later
         except InvalidOpcode as e:
-            LOGGER.exception("Error while dispatching UART message " + str(type(e)))
+            LOGGER.exception("Error while dispatching UART message %s", type(e))
             return  # UART Error response can be added later
 
-    def dispatch(self, msg: GenericMessage):
+    def latency_snapshot(self, reset: bool = False):
         """
-        Dispatch parsed message to appropriate event handler.
+        Per opcode count and p50, p90, p99 and max of frame handling latency and CPU time in microseconds
 
-        :param msg:     GenericMessage or derivative, incoming message to dispatch
-        :return:        None
+        :param reset:   bool, if True recorded frames are dropped after snapshot is taken
+        :return:        dict, opcode name -> {'count': int, 'latency_us': dict, 'cpu_us': dict}
         """
-        if msg.type == UartCommand.PingRequest:
-            self.uart_fsm.ping_request_message_event(msg)
-
-        elif msg.type == UartCommand.PongResponse:
-            self.uart_fsm.pong_response_message_event(msg)
-
-        elif msg.type == UartCommand.InitDeviceEvent:
-            self.uart_fsm.init_device_event_message_event(msg)
-
-        elif msg.type == UartCommand.CreateInstancesRequest:
-            self.uart_fsm.create_instances_request_message_event(msg)
-
-        elif msg.type == UartCommand.CreateInstancesResponse:
-            self.uart_fsm.create_instances_response_message_event(msg)
-
-        elif msg.type == UartCommand.InitNodeEvent:
-            self.uart_fsm.init_node_event_message_event(msg)
-
-        elif msg.type == UartCommand.MeshMessageRequest:
-            self.uart_fsm.mesh_message_request_message_event(msg)
-
-        elif msg.type == UartCommand.OpcodeError:
-            self.uart_fsm.opcode_error_message_event(msg)
-
-        elif msg.type == UartCommand.StartNodeRequest:
-            self.uart_fsm.start_node_request_message_event(msg)
-
-        elif msg.type == UartCommand.StartNodeResponse:
-            self.uart_fsm.start_node_response_message_event(msg)
-
-        elif msg.type == UartCommand.FactoryResetRequest:
-            self.uart_fsm.factory_reset_request_message_event(msg)
-
-        elif msg.type == UartCommand.FactoryResetResponse:
-            self.uart_fsm.factory_reset_response_message_event(msg)
-
-        elif msg.type == UartCommand.FactoryResetEvent:
-            self.uart_fsm.factory_reset_event_message_event(msg)
-
-        elif msg.type == UartCommand.MeshMessageResponse:
-            self.uart_fsm.mesh_message_response_message_event(msg)
-
-        elif msg.type == UartCommand.CurrentStateRequest:
-            self.uart_fsm.current_state_request_message_event(msg)
+        return self.stats.snapshot(reset)
 
-        elif msg.type == UartCommand.CurrentStateResponse:
-            self.uart_fsm.current_state_response_message_event(msg)
-
-        elif msg.type == UartCommand.Error:
-            self.uart_fsm.error_message_event(msg)
-
-        elif msg.type == UartCommand.FirmwareVersionRequest:
-            self.uart_fsm.firmware_version_request_message_event(msg)
-
-        elif msg.type == UartCommand.FirmwareVersionResponse:
-            self.uart_fsm.firmware_version_response_message_event(msg)
-
-        elif msg.type == UartCommand.SensorUpdateRequest:
-            self.uart_fsm.sensor_update_request_message_event(msg)
-
-        elif msg.type == UartCommand.AttentionEvent:
-            self.uart_fsm.attention_event_message_event(msg)
-
-        elif msg.type == UartCommand.SoftResetRequest:
-            self.uart_fsm.soft_reset_request_message_event(msg)
-
-        elif msg.type == UartCommand.SoftResetResponse:
-            self.uart_fsm.soft_reset_response_message_event(msg)
-
-        elif msg.type == UartCommand.SensorUpdateResponse:
-            self.uart_fsm.sensor_update_response_message_event(msg)
-
-        elif msg.type == UartCommand.DeviceUUIDRequest:
-            self.uart_fsm.device_uuid_request_message_event(msg)
+    def check_write_data_fast_path(self, data: bytes):
+        """
+        Enable Write Data Event fast path if data it decodes from frame matches data decoded by message_factory.
 
-        elif msg.type == UartCommand.DeviceUUIDResponse:
-            self.uart_fsm.device_uuid_response_message_event(msg)
+        :param data:    bytes, incoming Write Data Event frame
+        :return:        None
+        """
+        msg = message_factory.deserialize_message(data)
+        self.write_data_fast_path = msg.type == UartCommand.DfuWriteDataEvent and \
+            bytes(msg.data) == bytes(data[WRITE_DATA_OFFSET:])
 
+        if self.write_data_fast_path:
+            LOGGER.debug("Write Data Event fast path enabled")
         else:
+            LOGGER.warning("Unexpected Write Data Event frame layout, fast path disabled")
 
-            if msg.type == UartCommand.DfuInitRequest:
-                self.dfu_fsm.dfu_init_request_message_event(msg)
-
-            elif msg.type == UartCommand.DfuInitResponse:
-                self.dfu_fsm.dfu_init_response_message_event(msg)
-
-            elif msg.type == UartCommand.DfuStatusRequest:
-                self.dfu_fsm.dfu_state_request_message_event(msg)
-
-            elif msg.type == UartCommand.DfuStatusResponse:
-                self.dfu_fsm.dfu_state_response_message_event(msg)
-
-            elif msg.type == UartCommand.DfuPageCreateRequest:
-                self.dfu_fsm.dfu_page_create_request_message_event(msg)
-
-            elif msg.type == UartCommand.DfuPageCreateResponse:
-                self.dfu_fsm.dfu_page_create_response_message_event(msg)
-
-            elif msg.type == UartCommand.DfuWriteDataEvent:
-                self.dfu_fsm.dfu_write_data_event_message_event(msg)
-
-            elif msg.type == UartCommand.DfuPageStoreRequest:
-                self.dfu_fsm.dfu_page_store_request_message_event(msg)
-
-            elif msg.type == UartCommand.DfuPageStoreResponse:
-                self.dfu_fsm.dfu_page_store_response_message_event(msg)
-
-            elif msg.type == UartCommand.DfuStateRequest:
-                self.dfu_fsm.dfu_pre_validation_check_request_message_event(msg)
-
-            elif msg.type == UartCommand.DfuStateResponse:
-                self.dfu_fsm.dfu_pre_validation_check_response_message_event(msg)
+    def dispatch(self, msg: GenericMessage):
+        """
+        Dispatch parsed message to appropriate event handler.
 
-            elif msg.type == UartCommand.DfuCancelRequest:
-                self.dfu_fsm.dfu_cancel_request_message_event(msg)
+        :param msg:     GenericMessage or derivative, incoming message to dispatch
+        :return:        None
+        """
+        try:
+            handler = self.handlers[msg.type]
+        except KeyError:
+            self.unhandled_opcodes[msg.type] += 1
+            if self.unhandled_opcodes[msg.type] == 1:
+                LOGGER.warning("No handler for UART message type %s, ignoring it", msg.type)
+            return
 
-            elif msg.type == UartCommand.DfuCancelResponse:
-                self.dfu_fsm.dfu_cancel_response_message_event(msg)
+        handler(msg)
 
 
 class Sender(UART_FSM_Output, DFU_FSM_Output):
@@ -180,27 +155,35 @@ class Sender(UART_FSM_Output, DFU_FSM_Output):
     forward them to UartAdapter.
     """
 
-    def __init__(self, uart_adapter):
+    def __init__(self, uart_adapter, capture: FrameCapture = None):
         """
         Initializes Sender.
+
+        :param uart_adapter:    UartAdapter, frames are written to
+        :param capture:         FrameCapture or None, records every sent frame
         """
         self.uart_adapter = uart_adapter
+        self.capture = capture
+        self.frame_cache = FrameCache(message_factory.serialize_message)
 
     def send_message(self, msg: GenericMessage):
         """
-        Serialize and send message to UartAdapter.
+        Serialize and send message to UartAdapter. Frames are taken from cache when possible.
 
         :param msg:     GenericMessage or derivative, message to be sent
         :return:        None
         """
         try:
-            data = message_factory.serialize_message(msg)
-            LOGGER.debug("Sending UART message " + bytes_to_readable_hex(data))
+            data = self.frame_cache.get_frame(msg)
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug("Sending UART message %s", bytes_to_readable_hex(data))
+            if self.capture is not None:
+                self.capture.record_outbound(data)
             self.uart_adapter.write_uart_frame(data)
         except InvalidLen as e:
-            LOGGER.exception("Error sending UART message: InvalidLen. {}".format(e))
+            LOGGER.exception("Error sending UART message: InvalidLen. %s", e)
         except InvalidOpcode as e:
-            LOGGER.exception("Error sending UART message: InvalidOpcode. {}".format(e))
+            LOGGER.exception("Error sending UART message: InvalidOpcode. %s", e)
 
 
 def bytes_to_readable_hex(data: bytes):
@@ -210,8 +193,4 @@ def bytes_to_readable_hex(data: bytes):
     :param data: bytes, data to convert
     :return:     str, hex
     """
-    output = str()
-    for byte in data:
-        output += hex(byte) + ' '
-
-    return output
+    return ''.join([hex(byte) + ' ' for byte in data])
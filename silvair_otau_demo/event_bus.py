@@ -0,0 +1,220 @@
+import _thread
+import collections
+import logging
+import threading
+import time
+
+from .dfu_logic.dfu_mgr import DFU_FSM_EventMgr
+from .event_mgr import TemplateDFUEventMgr
+from .uart_logic.uart_fsm_mgr import UART_FSM_EventMgr
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_EVENT_QUEUE_DEPTH = 1024
+
+# Names of all events published by UART and DFU FSMs
+EVENT_NAMES = tuple(sorted(name
+                           for event_mgr_class in (UART_FSM_EventMgr, DFU_FSM_EventMgr)
+                           for name in vars(event_mgr_class)
+                           if not name.startswith('_')))
+
+
+class EventSink:
+    """
+    Single consumer of EventBus. Events are queued in a bounded deque and delivered to consumer on sink own thread.
+    When sink falls behind and its queue is full, new events are dropped and counted.
+
+    Events are appended by the FSM thread and popped by sink thread without taking any lock, deque append and
+    popleft are atomic. Counters are updated by FSM thread only.
+
+    Consumers with event_time attribute have it set to monotonic publish time of every event before it is delivered.
+    """
+
+    def __init__(self, consumer: TemplateDFUEventMgr, max_depth: int = DEFAULT_EVENT_QUEUE_DEPTH, name: str = None):
+        """
+        Initialize EventSink
+
+        :param consumer:    TemplateDFUEventMgr or derivative, receives events on sink thread
+        :param max_depth:   int, max number of queued events
+        :param name:        str, sink name used in logs and thread name, consumer class name if None
+        """
+        self.consumer = consumer
+        self.max_depth = max_depth
+        self.name = name or type(consumer).__name__
+
+        # Queued (event name, args, publish time) tuples
+        self.events = collections.deque()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.worker = None
+
+        self.published_count = 0
+        self.dropped_count = 0
+
+    def start(self):
+        """
+        Start sink thread
+
+        :return:    None
+        """
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name='EventSink-' + self.name, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """
+        Stop sink thread after delivering already queued events
+
+        :return:    None
+        """
+        self.running = False
+        self.wakeup.set()
+
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join()
+        self.worker = None
+
+    def publish(self, name: str, args: tuple, event_time: float):
+        """
+        Queue event for delivery, drop it if queue is full
+
+        :param name:        str, event name (EventMgr method name)
+        :param args:        tuple, event arguments
+        :param event_time:  float, monotonic publish time
+        :return:            None
+        """
+        if len(self.events) >= self.max_depth:
+            self.dropped_count += 1
+            if self.dropped_count == 1:
+                LOGGER.warning("Event sink %s falls behind, dropping events", self.name)
+            return
+
+        self.events.append((name, args, event_time))
+        self.published_count += 1
+        self.wakeup.set()
+
+    def run(self):
+        """
+        Sink thread loop, delivers queued events to consumer
+
+        :return:    None
+        """
+        while True:
+            try:
+                name, args, event_time = self.events.popleft()
+            except IndexError:
+                if not self.running:
+                    return
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+
+            if hasattr(self.consumer, 'event_time'):
+                self.consumer.event_time = event_time
+
+            try:
+                getattr(self.consumer, name)(*args)
+            except SystemExit:
+                # Consumer wants to end the script (i.e. not recoverable UART error), exit() here would only
+                # end sink thread
+                LOGGER.info("Event sink %s requested exit", self.name)
+                _thread.interrupt_main()
+                return
+            except Exception:
+                LOGGER.exception("Event sink %s failed to handle %s event", self.name, name)
+
+    def metrics(self):
+        """
+        Snapshot of sink metrics
+
+        :return:    dict, current queue depth and event counters
+        """
+        return {
+            'depth': len(self.events),
+            'published': self.published_count,
+            'dropped': self.dropped_count,
+        }
+
+
+class EventBus(TemplateDFUEventMgr):
+    """
+    Event manager fanning out every event to independent sinks, each consuming events on its own thread,
+    so that slow sink (i.e. terminal) never delays handling of UART frames.
+    """
+
+    def __init__(self, consumers, max_depth: int = DEFAULT_EVENT_QUEUE_DEPTH):
+        """
+        Initialize EventBus
+
+        :param consumers:   iterable of TemplateDFUEventMgr or derivatives, event consumers
+        :param max_depth:   int, max number of events queued for single sink
+        """
+        self.sinks = [EventSink(consumer, max_depth) for consumer in consumers]
+
+        LOGGER.info("EventBus initialized with sinks: %s", ', '.join(sink.name for sink in self.sinks))
+
+    def start(self):
+        """
+        Start all sinks
+
+        :return:    None
+        """
+        for sink in self.sinks:
+            sink.start()
+
+    def stop(self):
+        """
+        Deliver queued events, stop all sinks and then their consumers
+
+        :return:    None
+        """
+        for sink in self.sinks:
+            sink.stop()
+
+        for sink in self.sinks:
+            if hasattr(sink.consumer, 'stop'):
+                sink.consumer.stop()
+
+            if sink.dropped_count:
+                LOGGER.warning("Event sink %s dropped %d events", sink.name, sink.dropped_count)
+
+        LOGGER.info("EventBus stopped: %s", self.metrics())
+
+    def publish(self, name: str, *args):
+        """
+        Publish event to all sinks
+
+        :param name:    str, event name (EventMgr method name)
+        :param args:    event arguments
+        :return:        None
+        """
+        event_time = time.monotonic()
+        for sink in self.sinks:
+            sink.publish(name, args, event_time)
+
+    def metrics(self):
+        """
+        Snapshot of metrics of all sinks
+
+        :return:    dict, sink name to sink metrics
+        """
+        return {sink.name: sink.metrics() for sink in self.sinks}
+
+
+def event_publisher(name: str):
+    """
+    Create EventBus method publishing given event
+
+    :param name:    str, event name
+    :return:        function, method publishing event
+    """
+    def publish_event(self, *args):
+        self.publish(name, *args)
+
+    publish_event.__name__ = name
+    publish_event.__doc__ = "Publish {} event to all sinks".format(name)
+    return publish_event
+
+
+for _event_name in EVENT_NAMES:
+    setattr(EventBus, _event_name, event_publisher(_event_name))
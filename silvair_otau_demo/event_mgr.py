@@ -4,12 +4,16 @@ from silvair_uart_common_libs.message_types import FactoryResetSource, Attention
 from silvair_uart_common_libs.messages import UartCommand
 
 from .dfu_logic.dfu_mgr import DFU_FSM_EventMgr
+from .dfu_logic.dfu_session_timer import DFU_SESSION_PHASES
 from .dfu_logic.states.dfu_fsm_states import DFUState
 from .uart_logic.states.uart_fsm_states import UART_FSMState
 from .uart_logic.uart_fsm_mgr import UART_FSM_EventMgr
 
 LOGGER = logging.getLogger(__name__)
 
+# UART errors after which script cannot continue
+NOT_RECOVERABLE_ERRORS = (Error.NoLicenseForModelRegistration, Error.NoResourcesForModelRegistration)
+
 
 class TemplateDFUEventMgr(UART_FSM_EventMgr, DFU_FSM_EventMgr):
     """
@@ -136,13 +140,35 @@ class EventMgr(TemplateDFUEventMgr):
             LOGGER.debug("UART Error! %s", error.name)
             error_handled = True
 
-        if error == Error.NoLicenseForModelRegistration or error == Error.NoResourcesForModelRegistration:
+        if error in NOT_RECOVERABLE_ERRORS:
             LOGGER.critical("Not recoverable error occurred: " + error.name)
             exit()
 
         if not error_handled:
             self.cli.print_error_message("UART Error! " + error.name)
 
+    def uart_startup_timing(self, timing: dict):
+        """
+        Handle UART startup timing event
+
+        :param timing:  dict, startup record, times in seconds
+        :return:        None
+        """
+        states = ", ".join("{} {:.3f} s".format(name, seconds) for name, seconds in timing['states_s'].items())
+        self.cli.print_informative_message("UART Node state reached in {:.3f} s ({})".format(timing['to_node_s'],
+                                                                                             states))
+
+    def uart_frame_queue_metrics(self, metrics: dict):
+        """
+        Handle frame queue metrics event. Metrics are logged, not printed, so that they do not break progress bar.
+
+        :param metrics: dict, frame queue metrics, times in seconds
+        :return:        None
+        """
+        LOGGER.info("Frame queue: depth %d, max depth %d, %d frames queued, %d dropped, wait avg %.6f s, "
+                    "max %.6f s in last %.1f s", metrics['depth'], metrics['max_depth'], metrics['enqueued'],
+                    metrics['dropped'], metrics['wait_time_avg'], metrics['wait_time_max'], metrics['interval'])
+
     def dfu_unexpected_message(self, dfu_msg: UartCommand):
         """
         Handle DFU unexpected message event
@@ -209,3 +235,48 @@ class EventMgr(TemplateDFUEventMgr):
         """
         self.cli.stop_progress_bar()
         self.cli.print_error_message("DFU Update failed!")
+
+    def dfu_error(self, message: str):
+        """
+        Handle DFU error event
+
+        :param message: str, error description
+        :return:        None
+        """
+        self.cli.print_error_message(message)
+
+    def dfu_session_timing(self, timing: dict):
+        """
+        Handle DFU session timing event
+
+        :param timing:  dict, session record, times in seconds
+        :return:        None
+        """
+        output = "DFU session {}{} in {:.3f} s\n".format(timing['result'], " (resumed)" if timing['resumed'] else "",
+                                                        timing['total_s'])
+        output += "States: " + ", ".join("{} {:.3f} s".format(name, seconds)
+                                         for name, seconds in timing['states_s'].items()) + "\n"
+        output += "Phases: " + ", ".join("{} {:.3f} s ({:d})".format(phase, timing[phase + '_s'],
+                                                                    timing[phase + '_count'])
+                                         for phase in DFU_SESSION_PHASES) + "\n"
+        output += "NVM writes {:.3f} s ({:d}), firmware file I/O {:.3f} s".format(
+            timing['nvm_write_s'], timing['nvm_write_count'], timing['file_io_s'])
+
+        self.cli.print_informative_message(output)
+
+    def dfu_latency_summary(self, summary: dict):
+        """
+        Handle DFU latency summary event
+
+        :param summary: dict, opcode name -> {'count': int, 'latency_us': dict, 'cpu_us': dict}
+        :return:        None
+        """
+        row = "{:<28}{:>8}" + "{:>10}" * 8
+        output = "Frame handling per opcode, latency and CPU time in us:\n"
+        output += row.format("opcode", "count", "p50", "p90", "p99", "max", "cpu p50", "cpu p90", "cpu p99", "cpu max")
+        for opcode, stats in summary.items():
+            output += "\n" + row.format(opcode, stats['count'],
+                                        *(stats['latency_us'][name] for name in ('p50', 'p90', 'p99', 'max')),
+                                        *(stats['cpu_us'][name] for name in ('p50', 'p90', 'p99', 'max')))
+
+        self.cli.print_informative_message(output)
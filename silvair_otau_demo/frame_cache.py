@@ -0,0 +1,148 @@
+import collections
+import logging
+import struct
+import threading
+
+from silvair_uart_common_libs.messages import UartCommand, GenericMessage
+
+LOGGER = logging.getLogger(__name__)
+
+FRAME_CACHE_SIZE = 64
+
+UINT32 = struct.Struct('<I')
+
+
+def encode_bytes(value):
+    """
+    Encode bytes-like field value
+
+    :param value:   bytes-like, field value
+    :return:        bytes, encoded value
+    """
+    if isinstance(value, int):
+        raise TypeError("Expected bytes-like value")
+
+    return bytes(value)
+
+
+# Fields which change from frame to frame and form the tail of serialized frame, in frame order.
+# Frames of these messages are cached by the remaining fields and the tail is patched in.
+PATCHED_FIELDS = {
+    UartCommand.DfuStatusResponse: (('firmware_offset', UINT32.pack), ('firmware_crc', UINT32.pack)),
+    UartCommand.PongResponse: (('data', encode_bytes),),
+}
+
+
+class FrameCache:
+    """
+    Bounded LRU cache of serialized frames keyed by message type and field values.
+
+    Messages with PATCHED_FIELDS are cached by their constant fields, variable fields are patched into cached frame.
+    First patched frame of every message type is compared with serialized one and if they differ, frames of that
+    type are always serialized.
+
+    Frames can be requested from several threads at once (i.e. FrameQueue worker and main thread), LRU order
+    is updated under a lock.
+    """
+
+    def __init__(self, serialize, max_size: int = FRAME_CACHE_SIZE):
+        """
+        Initialize FrameCache
+
+        :param serialize:   callable, serializes message into frame
+        :param max_size:    int, max number of cached frames
+        """
+        self.serialize = serialize
+        self.max_size = max_size
+
+        self.lock = threading.Lock()
+        self.frames = collections.OrderedDict()
+        self.verified_types = set()
+        self.unpatchable_types = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_frame(self, msg: GenericMessage):
+        """
+        Get serialized frame of message
+
+        :param msg:     GenericMessage or derivative, message to serialize
+        :return:        bytes, frame
+        """
+        try:
+            fields = vars(msg)
+        except TypeError:
+            return self.serialize(msg)
+
+        patched_fields = None
+        tail = None
+
+        if msg.type in PATCHED_FIELDS and msg.type not in self.unpatchable_types:
+            patched_fields = PATCHED_FIELDS[msg.type]
+            try:
+                tail = [encode(fields[name]) for name, encode in patched_fields]
+            except (KeyError, TypeError, ValueError, struct.error):
+                LOGGER.warning("Unable to patch %s frames, serializing them instead", msg.type)
+                self.unpatchable_types.add(msg.type)
+                patched_fields = None
+                tail = None
+
+        variable_names = [name for name, _ in patched_fields] if patched_fields else ()
+        key = (type(msg),
+               tuple(len(part) for part in tail) if tail is not None else None,
+               tuple(sorted(item for item in fields.items() if item[0] not in variable_names)))
+
+        try:
+            with self.lock:
+                frame = self.frames[key]
+                self.frames.move_to_end(key)
+                self.hits += 1
+        except KeyError:
+            frame = self.store(key, msg)
+            return frame
+        except TypeError:
+            # Some field value is not hashable, such messages are not cached
+            return self.serialize(msg)
+
+        if tail is not None:
+            tail = b''.join(tail)
+            frame = frame[:len(frame) - len(tail)] + tail
+
+            if msg.type not in self.verified_types:
+                expected = self.serialize(msg)
+                if frame != expected:
+                    LOGGER.warning("Patched %s frame differs from serialized one, serializing them instead", msg.type)
+                    self.unpatchable_types.add(msg.type)
+                    return expected
+
+                self.verified_types.add(msg.type)
+
+        return frame
+
+    def store(self, key, msg: GenericMessage):
+        """
+        Serialize message and store frame in cache, evicting least recently used one if cache is full
+
+        :param key:     tuple, cache key
+        :param msg:     GenericMessage or derivative, message to serialize
+        :return:        bytes, frame
+        """
+        frame = bytes(self.serialize(msg))
+
+        with self.lock:
+            self.misses += 1
+            self.frames[key] = frame
+            if len(self.frames) > self.max_size:
+                self.frames.popitem(last=False)
+
+        return frame
+
+    def clear(self):
+        """
+        Remove all cached frames
+
+        :return:        None
+        """
+        with self.lock:
+            self.frames.clear()
@@ -0,0 +1,242 @@
+import gzip
+import json
+import logging
+import lzma
+import os
+import struct
+import threading
+import time
+import zlib
+
+LOGGER = logging.getLogger(__name__)
+
+# Record kinds: frame received from modem, frame sent to modem, start of capture session
+CAPTURE_INBOUND = 0
+CAPTURE_OUTBOUND = 1
+CAPTURE_SESSION = 2
+
+# Record header: kind, seconds since session start (monotonic), payload length
+CAPTURE_RECORD = struct.Struct('<BdI')
+
+# Capture files are compressed according to extension, other files are not compressed
+CAPTURE_OPENERS = {
+    '.gz': gzip.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+}
+# Every batch of records is compressed on its own into a complete gzip member or xz stream, so that a capture file
+# cut short (i.e. process killed) loses at most the batch being written
+CAPTURE_COMPRESSORS = {
+    '.gz': gzip.compress,
+    '.xz': lzma.compress,
+    '.lzma': lzma.compress,
+}
+# Batch of records is written when it reaches this size or this many seconds after its first record
+CAPTURE_BATCH_SIZE = 64 * 1024
+CAPTURE_FLUSH_INTERVAL = 1.0
+
+
+def open_capture_file(path: str, mode: str):
+    """
+    Open capture file for reading, compressed according to its extension
+
+    :param path:    str, path to capture file
+    :param mode:    str, binary file mode, i.e. 'rb'
+    :return:        binary file object
+    """
+    opener = CAPTURE_OPENERS.get(os.path.splitext(path)[1].lower(), open)
+    return opener(path, mode)
+
+
+def session_capture_path(path: str, start_time: float):
+    """
+    Path of capture file of single session: session start time is inserted before extension,
+    i.e. otau.cap.gz -> otau.cap.20261017-153000.gz, with a counter added if such file already exists
+
+    :param path:        str, capture file path given by user
+    :param start_time:  float, session start time, seconds since epoch
+    :return:            str, path of new capture file
+    """
+    root, extension = os.path.splitext(path)
+    if extension.lower() not in CAPTURE_COMPRESSORS:
+        root, extension = path, ''
+
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(start_time))
+    session_path = '{}.{}{}'.format(root, stamp, extension)
+    number = 1
+    while os.path.exists(session_path):
+        number += 1
+        session_path = '{}.{}-{}{}'.format(root, stamp, number, extension)
+
+    return session_path
+
+
+class FrameCapture:
+    """
+    Records every frame received from and sent to modem, with monotonic timestamps, into capture file.
+
+    Capture file is a stream of length-prefixed records (CAPTURE_RECORD header followed by payload), compressed
+    with gzip or lzma according to file extension. Every capture session writes its own file, named after the given
+    path and session start time, starting with a CAPTURE_SESSION record, with JSON session info as payload, followed
+    by its frame records. Timestamps are relative to session start.
+
+    Records are written in batches, every batch compressed on its own. A batch is written when it is big enough
+    or CAPTURE_FLUSH_INTERVAL seconds after its first record, so a killed process loses only the last second of
+    frames and the file stays readable.
+    """
+
+    def __init__(self, path: str, info: dict = None):
+        """
+        Initialize FrameCapture and start capture session
+
+        :param path:    str, capture file path, session start time is inserted before its extension
+        :param info:    dict, JSON serializable session description (i.e. MCU config), stored in session record
+        """
+        session_info = {'time': time.time()}
+        session_info.update(info or {})
+
+        self.path = session_capture_path(path, session_info['time'])
+        self.compress = CAPTURE_COMPRESSORS.get(os.path.splitext(self.path)[1].lower())
+        self.lock = threading.Lock()
+        self.file = open(self.path, 'xb')
+        self.batch = bytearray()
+        self.flush_timer = None
+        self.start_time = time.monotonic()
+        self.frame_count = 0
+
+        self.write_record(CAPTURE_SESSION, json.dumps(session_info).encode())
+
+        LOGGER.info("Capturing UART frames to %s", self.path)
+
+    def write_record(self, kind: int, payload: bytes):
+        """
+        Add record to current batch
+
+        :param kind:    int, record kind
+        :param payload: bytes, record payload
+        :return:        None
+        """
+        timestamp = time.monotonic() - self.start_time
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.batch += CAPTURE_RECORD.pack(kind, timestamp, len(payload))
+            self.batch += payload
+
+            if len(self.batch) >= CAPTURE_BATCH_SIZE:
+                self.write_batch()
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(CAPTURE_FLUSH_INTERVAL, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def write_batch(self):
+        """
+        Write current batch to capture file. Called with lock held.
+
+        :return:    None
+        """
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        if not self.batch:
+            return
+
+        self.file.write(self.compress(bytes(self.batch)) if self.compress else self.batch)
+        self.file.flush()
+        self.batch = bytearray()
+
+    def flush(self):
+        """
+        Write records recorded so far to capture file
+
+        :return:    None
+        """
+        with self.lock:
+            if self.file is not None:
+                self.write_batch()
+
+    def record_inbound(self, data: bytes):
+        """
+        Record frame received from modem
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        self.frame_count += 1
+        self.write_record(CAPTURE_INBOUND, data)
+
+    def record_outbound(self, data: bytes):
+        """
+        Record frame sent to modem
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        self.frame_count += 1
+        self.write_record(CAPTURE_OUTBOUND, data)
+
+    def close(self):
+        """
+        Write remaining records and close capture file
+
+        :return:    None
+        """
+        with self.lock:
+            if self.file is None:
+                return
+
+            self.write_batch()
+            self.file.close()
+            self.file = None
+
+        LOGGER.info("Captured %d UART frames to %s", self.frame_count, self.path)
+
+
+def read_capture(path: str):
+    """
+    Read records of capture file. Truncated tail (i.e. after a crash) is ignored.
+
+    :param path:    str, path to capture file
+    :return:        generator of (kind, timestamp, payload) tuples
+    """
+    with open_capture_file(path, 'rb') as file:
+        while True:
+            try:
+                header = file.read(CAPTURE_RECORD.size)
+                if not header:
+                    return
+
+                if len(header) < CAPTURE_RECORD.size:
+                    raise EOFError
+
+                kind, timestamp, length = CAPTURE_RECORD.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length:
+                    raise EOFError
+            except (EOFError, lzma.LZMAError, zlib.error, OSError):
+                LOGGER.warning("Capture file %s is truncated, ignoring its tail", path)
+                return
+
+            yield kind, timestamp, payload
+
+
+def read_capture_sessions(path: str):
+    """
+    Read capture file split into sessions
+
+    :param path:    str, path to capture file
+    :return:        list of (dict, list) tuples, session info and (kind, timestamp, frame) records of session
+    """
+    sessions = []
+    for kind, timestamp, payload in read_capture(path):
+        if kind == CAPTURE_SESSION:
+            sessions.append((json.loads(payload.decode()), []))
+        elif sessions:
+            sessions[-1][1].append((kind, timestamp, payload))
+        else:
+            LOGGER.warning("Frame record outside of capture session, ignoring it")
+
+    return sessions
@@ -0,0 +1,231 @@
+import collections
+import logging
+import threading
+import time
+
+from silvair_uart_common_libs.uart_common_classes import UartAdapterObserver
+
+from .dfu_logic.dfu_fsm import DFU_FSM_EVENTS
+from .dispatcher import FRAME_OPCODE_INDEX
+from .frame_capture import FrameCapture
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_FRAME_QUEUE_DEPTH = 256
+# Seconds between metrics reports, reports of intervals without frames are skipped
+DEFAULT_METRICS_INTERVAL = 10.0
+
+
+class FrameQueue(UartAdapterObserver):
+    """
+    Bounded queue between UartAdapter and Dispatcher. UartAdapter thread only enqueues received frames,
+    a worker thread passes them to observer (Dispatcher).
+
+    Frames with priority opcodes (DFU by default) are passed before other frames. When queue is full,
+    the oldest non priority frame is dropped to make room for a priority one, otherwise the incoming frame
+    is dropped.
+
+    Queue depth and frame wait time metrics are collected per interval. With metrics handler given, worker thread
+    passes it metrics of every interval in which frames were queued, every metrics_interval seconds.
+    """
+
+    def __init__(self, observer, max_depth: int = DEFAULT_FRAME_QUEUE_DEPTH, priority_opcodes=None,
+                 metrics_handler=None, metrics_interval: float = DEFAULT_METRICS_INTERVAL,
+                 capture: FrameCapture = None):
+        """
+        Initialize FrameQueue
+
+        :param observer:            UartAdapterObserver, receives frames on worker thread
+        :param max_depth:           int, max number of queued frames
+        :param priority_opcodes:    iterable, opcodes of priority frames, DFU opcodes if None
+        :param metrics_handler:     callable or None, called with metrics dict on worker thread
+        :param metrics_interval:    float, seconds between metrics reports
+        :param capture:             FrameCapture or None, records every received frame as it arrives, including
+                                    dropped ones
+        """
+        self.observer = observer
+        self.max_depth = max_depth
+        self.priority_opcodes = frozenset(int(opcode) for opcode in (priority_opcodes or DFU_FSM_EVENTS))
+        self.metrics_handler = metrics_handler
+        self.metrics_interval = metrics_interval
+        self.capture = capture
+
+        # Queued (enqueue time, frame) pairs
+        self.priority_frames = collections.deque()
+        self.frames = collections.deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.worker = None
+
+        self.enqueued_count = 0
+        self.dropped_count = 0
+        self.dequeued_count = 0
+        self.processed_count = 0
+        self.max_depth_seen = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.metrics_start = time.monotonic()
+
+    @property
+    def depth(self):
+        """
+        Number of queued frames
+
+        :return:    int, queue depth
+        """
+        return len(self.priority_frames) + len(self.frames)
+
+    def start(self):
+        """
+        Start worker thread
+
+        :return:    None
+        """
+        with self.condition:
+            self.running = True
+
+        self.worker = threading.Thread(target=self.run, name='FrameQueue', daemon=True)
+        self.worker.start()
+        LOGGER.info("Frame queue started, max depth: %d", self.max_depth)
+
+    def stop(self):
+        """
+        Stop worker thread. Frames still in queue are dropped.
+
+        :return:    None
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join()
+        self.worker = None
+
+        LOGGER.info("Frame queue stopped: %s", self.metrics())
+
+    def new_frame_notification(self, data: bytes):
+        """
+        Enqueue new frame. This function is called by UartAdapter.
+
+        :param data:    bytes, incoming message
+        :return:        None
+        """
+        if self.capture is not None:
+            self.capture.record_inbound(data)
+
+        priority = len(data) > FRAME_OPCODE_INDEX and data[FRAME_OPCODE_INDEX] in self.priority_opcodes
+
+        with self.condition:
+            if self.depth >= self.max_depth:
+                self.dropped_count += 1
+                if priority and self.frames:
+                    self.frames.popleft()
+                else:
+                    LOGGER.warning("Frame queue full, dropping frame")
+                    return
+
+            (self.priority_frames if priority else self.frames).append((time.monotonic(), data))
+            self.enqueued_count += 1
+            self.max_depth_seen = max(self.max_depth_seen, self.depth)
+            self.condition.notify()
+
+    def run(self):
+        """
+        Worker thread loop, passes queued frames to observer and reports metrics
+
+        :return:    None
+        """
+        while True:
+            data = None
+            with self.condition:
+                while self.running and not self.depth and not self.metrics_due():
+                    self.condition.wait(self.time_to_metrics())
+
+                if not self.running:
+                    return
+
+                if self.depth:
+                    enqueue_time, data = (self.priority_frames or self.frames).popleft()
+
+                    wait_time = time.monotonic() - enqueue_time
+                    self.dequeued_count += 1
+                    self.wait_time_total += wait_time
+                    self.wait_time_max = max(self.wait_time_max, wait_time)
+
+            if self.metrics_due():
+                self.report_metrics()
+
+            if data is None:
+                continue
+
+            try:
+                self.observer.new_frame_notification(data)
+            except Exception:
+                LOGGER.exception("Error while processing queued frame")
+
+            with self.condition:
+                self.processed_count += 1
+
+    def metrics_due(self):
+        """
+        :return:    bool, True if metrics handler is set and metrics interval elapsed
+        """
+        return self.metrics_handler is not None and self.time_to_metrics() <= 0
+
+    def time_to_metrics(self):
+        """
+        :return:    float or None, seconds until next metrics report, None without metrics handler
+        """
+        if self.metrics_handler is None:
+            return None
+
+        return self.metrics_start + self.metrics_interval - time.monotonic()
+
+    def report_metrics(self):
+        """
+        Pass metrics of the elapsed interval to metrics handler, unless no frames were queued in it
+
+        :return:    None
+        """
+        metrics = self.metrics(reset=True)
+        if not (metrics['enqueued'] or metrics['dropped'] or metrics['depth']):
+            return
+
+        try:
+            self.metrics_handler(metrics)
+        except Exception:
+            LOGGER.exception("Error while reporting frame queue metrics")
+
+    def metrics(self, reset: bool = False):
+        """
+        Snapshot of queue metrics of current interval, i.e. since metrics were last reset
+
+        :param reset:   bool, if True new interval is started after snapshot is taken
+        :return:        dict, current and max queue depth, frame counters, frame wait times and interval length
+                        in seconds
+        """
+        with self.condition:
+            now = time.monotonic()
+            metrics = {
+                'depth': self.depth,
+                'max_depth': self.max_depth_seen,
+                'enqueued': self.enqueued_count,
+                'dropped': self.dropped_count,
+                'processed': self.processed_count,
+                'wait_time_avg': self.wait_time_total / self.dequeued_count if self.dequeued_count else 0.0,
+                'wait_time_max': self.wait_time_max,
+                'interval': now - self.metrics_start,
+            }
+
+            if reset:
+                self.enqueued_count = 0
+                self.dropped_count = 0
+                self.dequeued_count = 0
+                self.processed_count = 0
+                self.max_depth_seen = self.depth
+                self.wait_time_total = 0.0
+                self.wait_time_max = 0.0
+                self.metrics_start = now
+
+            return metrics
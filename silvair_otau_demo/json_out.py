@@ -0,0 +1,301 @@
+import json
+import logging
+import sys
+import threading
+import time
+
+from silvair_uart_common_libs.message_types import AttentionEvent, Error
+from silvair_uart_common_libs.messages import UartCommand
+
+from .dfu_logic.states.dfu_fsm_states import DFUState
+from .event_mgr import TemplateDFUEventMgr, NOT_RECOVERABLE_ERRORS
+from .uart_logic.states.uart_fsm_states import UART_FSMState
+
+LOGGER = logging.getLogger(__name__)
+
+JSON_BATCH_SIZE = 64
+JSON_FLUSH_INTERVAL = 1.0
+
+
+class JsonLinesEventMgr(TemplateDFUEventMgr):
+    """
+    Writes every event as a single line JSON object, for runs without terminal.
+
+    Each record has monotonic timestamp in seconds ("time") and event name ("event") followed by event fields.
+    Records are buffered and written in batches, after JSON_BATCH_SIZE records or JSON_FLUSH_INTERVAL seconds,
+    and immediately when DFU ends or UART error occurs.
+    """
+
+    # Set by EventSink to publish time of delivered event, current time is used if None
+    event_time = None
+
+    def __init__(self, stream=None, batch_size: int = JSON_BATCH_SIZE, flush_interval: float = JSON_FLUSH_INTERVAL):
+        """
+        Initialize JsonLinesEventMgr
+
+        :param stream:          text stream records are written to, stdout if None
+        :param batch_size:      int, max number of buffered records
+        :param flush_interval:  float, max time in seconds records are buffered
+        """
+        self.stream = stream or sys.stdout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.lock = threading.Lock()
+        self.records = []
+        self.flush_timer = None
+
+        self.firmware_size = 0
+        self.firmware_offset = 0
+
+        LOGGER.info("JsonLinesEventMgr initialized")
+
+    def write(self, event: str, flush: bool = False, **fields):
+        """
+        Buffer event record, flush buffered records if batch is full. Otherwise flush is scheduled after flush
+        interval, so record is written even if no further events come.
+
+        :param event:   str, event name
+        :param flush:   bool, if True records are flushed immediately
+        :param fields:  event fields
+        :return:        None
+        """
+        record = {'time': round(self.event_time if self.event_time is not None else time.monotonic(), 6),
+                  'event': event}
+        record.update(fields)
+
+        with self.lock:
+            self.records.append(json.dumps(record) + '\n')
+
+            if flush or len(self.records) >= self.batch_size:
+                self.write_records()
+            elif self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def write_records(self):
+        """
+        Write buffered records. Called with lock held.
+
+        :return:    None
+        """
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        if not self.records:
+            return
+
+        self.stream.write(''.join(self.records))
+        self.stream.flush()
+        self.records.clear()
+
+    def flush(self):
+        """
+        Write buffered records
+
+        :return:    None
+        """
+        with self.lock:
+            self.write_records()
+
+    def stop(self):
+        """
+        Write remaining records
+
+        :return:    None
+        """
+        self.flush()
+
+    def uart_unexpected_message(self, opcode: UartCommand):
+        """
+        Handle uart unexpected message event
+
+        :param opcode:  UartCommand (IntEnum), message opcode
+        :return:        None
+        """
+        self.write('uart_unexpected_message', opcode=opcode.name)
+
+    def uart_mesh_request(self, opcode: int, command: bytes):
+        """
+        Handle uart mesh request message event
+
+        :param opcode:  int, mesh opcode
+        :param command: bytes, mesh_command
+        :return:        None
+        """
+        self.write('uart_mesh_request', opcode=opcode, command=command.hex())
+
+    def uart_state_changed(self, state: UART_FSMState):
+        """
+        Handle uart state change event
+
+        :param state: UART_FSMState(IntEnum), new state
+        :return:      None
+        """
+        self.write('uart_state_changed', state=state.name)
+
+    def uart_registered_models(self, model_ids: list):
+        """
+        Handles uart registered models update event
+
+        :param model_ids:   list, list of registered model IDs
+        :return:            None
+        """
+        self.write('uart_registered_models', model_ids=[int(model_id) for model_id in model_ids])
+
+    def uart_firmware_version_update(self, firmware_version: bytes):
+        """
+        Handles firmware version update event
+
+        :param firmware_version:   bytes, new firmware version description
+        :return:                   None
+        """
+        self.write('uart_firmware_version_update', firmware_version=firmware_version.hex())
+
+    def uart_uuid_update(self, uuid: bytes):
+        """
+        Handles device uuid update event
+
+        :param uuid:   bytes, new uuid
+        :return:       None
+        """
+        self.write('uart_uuid_update', uuid=uuid.hex())
+
+    def uart_factory_reset(self):
+        """
+        Handle UART factory reset event
+
+        :return:        None
+        """
+        self.write('uart_factory_reset')
+
+    def uart_soft_reset(self):
+        """
+        Handle UART soft reset event
+        """
+        self.write('uart_soft_reset')
+
+    def uart_attention_event(self, attention: AttentionEvent):
+        """
+        Handle UART attention event
+
+        :param attention:   AttentionEvent(IntEnum), attention event description
+        :return:            None
+        """
+        self.write('uart_attention_event', attention=attention.name)
+
+    def uart_error(self, error: Error):
+        """
+        Handle UART error event
+
+        :param error:   Error(IntEnum), error event description
+        :return:        None
+        """
+        not_recoverable = error in NOT_RECOVERABLE_ERRORS
+        self.write('uart_error', flush=True, error=error.name, not_recoverable=not_recoverable)
+
+        if not_recoverable:
+            LOGGER.critical("Not recoverable error occurred: " + error.name)
+            exit()
+
+    def uart_startup_timing(self, timing: dict):
+        """
+        Handle UART startup timing event
+
+        :param timing:  dict, startup record, times in seconds
+        :return:        None
+        """
+        self.write('uart_startup_timing', **timing)
+
+    def uart_frame_queue_metrics(self, metrics: dict):
+        """
+        Handle frame queue metrics event
+
+        :param metrics: dict, frame queue metrics, times in seconds
+        :return:        None
+        """
+        self.write('uart_frame_queue_metrics', **metrics)
+
+    def dfu_unexpected_message(self, dfu_msg: UartCommand):
+        """
+        Handle DFU unexpected message event
+
+        :param dfu_msg:   UartCommand, message opcode
+        :return:          None
+        """
+        self.write('dfu_unexpected_message', opcode=dfu_msg.name)
+
+    def dfu_state_changed(self, state: DFUState):
+        """
+        Handle DFU state change event
+
+        :param state:   DFUState(IntEnum), new DFU state
+        :return:        None
+        """
+        self.write('dfu_state_changed', state=state.name)
+
+    def dfu_initialized(self, firmware_size: int, firmware_sha: bytes, app_data: bytes, initial: int = 0):
+        """
+        Handle DFU initialized event
+
+        :param firmware_size:   int, firmware size
+        :param firmware_sha:    bytes, firmware sha256
+        :param app_data:        bytes, received app data
+        :param initial          int, initial progress
+        :return:                None
+        """
+        self.firmware_size = firmware_size
+        self.firmware_offset = initial
+        self.write('dfu_initialized', firmware_size=firmware_size, firmware_sha256=firmware_sha.hex(),
+                   app_data=bytes(app_data).hex(), bytes=initial)
+
+    def dfu_page_stored(self, firmware_offset: int):
+        """
+        Handle DFU page stored event
+
+        :param firmware_offset: int, firmware offset
+        :return:                None
+        """
+        self.firmware_offset = firmware_offset
+        self.write('dfu_page_stored', bytes=firmware_offset, firmware_size=self.firmware_size)
+
+    def dfu_update_complete(self):
+        """
+        Handle DFU update complete event
+        """
+        self.write('dfu_update_complete', flush=True, bytes=self.firmware_offset, firmware_size=self.firmware_size)
+
+    def dfu_failed(self):
+        """
+        Handle DFU update failed event
+        """
+        self.write('dfu_failed', flush=True, bytes=self.firmware_offset, firmware_size=self.firmware_size)
+
+    def dfu_error(self, message: str):
+        """
+        Handle DFU error event
+
+        :param message: str, error description
+        :return:        None
+        """
+        self.write('dfu_error', flush=True, message=message)
+
+    def dfu_session_timing(self, timing: dict):
+        """
+        Handle DFU session timing event
+
+        :param timing:  dict, session record, times in seconds
+        :return:        None
+        """
+        self.write('dfu_session_timing', flush=True, **timing)
+
+    def dfu_latency_summary(self, summary: dict):
+        """
+        Handle DFU latency summary event
+
+        :param summary: dict, opcode name -> {'count': int, 'latency_us': dict, 'cpu_us': dict}
+        :return:        None
+        """
+        self.write('dfu_latency_summary', flush=True, opcodes=summary)
@@ -0,0 +1,437 @@
+import binascii
+import collections
+import hashlib
+import logging
+import threading
+import time
+
+from silvair_uart_common_libs import message_factory
+from silvair_uart_common_libs.message_types import DFUStatus, ModemState
+from silvair_uart_common_libs.messages import UartCommand, CurrentStateResponseMessage, InitDeviceEventMessage, \
+    CreateInstancesResponseMessage, InitNodeEventMessage, StartNodeResponseMessage, DfuInitRequestMessage, \
+    DfuStatusRequestMessage, DfuPageCreateRequestMessage, DfuWriteDataEventMessage, DfuPageStoreRequestMessage, \
+    PongResponseMessage, GenericMessage
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_SIM_PAGE_SIZE = 1024
+DEFAULT_SIM_CHUNK_SIZE = 64
+
+
+class ModemSimulator:
+    """
+    In-process UARTModem stand-in implementing UartAdapter interface.
+
+    Simulator answers UART FSM requests until MCU reaches Node state, starting from given modem state, and then
+    uploads firmware image with DfuInit, DfuStatus, DfuPageCreate, DfuWriteData and DfuPageStore messages,
+    checking every response. Upload continues from firmware offset reported by MCU, so resumed OTAU is simulated
+    as well.
+
+    Frames written by MCU are queued and handled on simulator thread, which also passes frames to observers,
+    the same way UartAdapter reader thread does.
+    """
+
+    def __init__(self,
+                 firmware: bytes,
+                 page_size: int = DEFAULT_SIM_PAGE_SIZE,
+                 chunk_size: int = DEFAULT_SIM_CHUNK_SIZE,
+                 app_data: bytes = bytes(),
+                 initial_state: ModemState = ModemState.InitDevice,
+                 model_ids: tuple = ()):
+        """
+        Initialize ModemSimulator
+
+        :param firmware:        bytes, firmware image to upload
+        :param page_size:       int, requested page size, smaller one is used if MCU supports less
+        :param chunk_size:      int, max data length of single Write Data Event
+        :param app_data:        bytes, app data sent in DFU Init Request
+        :param initial_state:   ModemState(IntEnum), modem state reported at start
+        :param model_ids:       tuple, model IDs reported in Create Instances Response and Init Node Event
+        """
+        assert page_size > 0 and chunk_size > 0
+
+        self.firmware = bytes(firmware)
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.app_data = bytes(app_data)
+        self.modem_state = ModemState(initial_state)
+        self.model_ids = list(model_ids)
+
+        self.observers = []
+        self.frames = collections.deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.worker = None
+
+        self.handlers = {
+            UartCommand.PingRequest: self.ping_request,
+            UartCommand.CurrentStateRequest: self.current_state_request,
+            UartCommand.CreateInstancesRequest: self.create_instances_request,
+            UartCommand.StartNodeRequest: self.start_node_request,
+            UartCommand.DfuInitResponse: self.dfu_init_response,
+            UartCommand.DfuStatusResponse: self.dfu_status_response,
+            UartCommand.DfuPageCreateResponse: self.dfu_page_create_response,
+            UartCommand.DfuPageStoreResponse: self.dfu_page_store_response,
+            UartCommand.DfuCancelRequest: self.dfu_cancel_request,
+        }
+
+        # Offset of first byte of current page and offset past its last byte
+        self.firmware_offset = 0
+        self.page_end = 0
+
+        self.completed = threading.Event()
+        self.error = None
+        self.dfu_start_time = None
+        self.dfu_end_time = None
+        self.sent_frames = 0
+        self.received_frames = 0
+
+    def start(self):
+        """
+        Start simulator thread
+
+        :return:    None
+        """
+        with self.condition:
+            self.running = True
+
+        self.worker = threading.Thread(target=self.run, name='ModemSimulator', daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """
+        Stop simulator thread
+
+        :return:    None
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.worker is not None and self.worker is not threading.current_thread():
+            self.worker.join()
+        self.worker = None
+
+    def register_observer(self, observer):
+        """
+        Register observer receiving frames sent by modem
+
+        :param observer:    UartAdapterObserver, i.e. Dispatcher
+        :return:            None
+        """
+        self.observers.append(observer)
+
+    def unregister_observer(self, observer):
+        """
+        Unregister observer
+
+        :param observer:    UartAdapterObserver, registered observer
+        :return:            None
+        """
+        self.observers.remove(observer)
+
+    def write_uart_frame(self, data: bytes):
+        """
+        Queue frame sent by MCU. This function is called by Sender.
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        with self.condition:
+            self.frames.append(bytes(data))
+            self.condition.notify()
+
+    def wait(self, timeout: float = None):
+        """
+        Wait until firmware upload ends
+
+        :param timeout: float, max time to wait in seconds, no limit if None
+        :return:        bool, True if whole firmware was uploaded and MCU reported successful update
+        """
+        return self.completed.wait(timeout) and self.error is None
+
+    @property
+    def dfu_time(self):
+        """
+        Time from DFU Init Request to final Page Store Response
+
+        :return:    float, time in seconds, None if upload has not ended
+        """
+        if self.dfu_start_time is None or self.dfu_end_time is None:
+            return None
+
+        return self.dfu_end_time - self.dfu_start_time
+
+    def run(self):
+        """
+        Simulator thread loop, handles frames sent by MCU
+
+        :return:    None
+        """
+        while True:
+            with self.condition:
+                while self.running and not self.frames:
+                    self.condition.wait()
+
+                if not self.running:
+                    return
+
+                data = self.frames.popleft()
+
+            try:
+                self.handle_frame(data)
+            except Exception as e:
+                LOGGER.exception("Error while handling MCU frame")
+                self.fail("Error while handling MCU frame: {}".format(e))
+
+    def handle_frame(self, data: bytes):
+        """
+        Deserialize and handle frame sent by MCU
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        self.received_frames += 1
+        msg = message_factory.deserialize_message(data)
+
+        handler = self.handlers.get(msg.type)
+        if handler is None:
+            LOGGER.debug("Modem simulator ignores %s", msg.type)
+            return
+
+        handler(msg)
+
+    def send_message(self, msg: GenericMessage):
+        """
+        Serialize message and pass it to observers
+
+        :param msg: GenericMessage or derivative, message sent by modem
+        :return:    None
+        """
+        self.send_frame(message_factory.serialize_message(msg))
+
+    def send_frame(self, data: bytes):
+        """
+        Pass frame to observers
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        self.sent_frames += 1
+        for observer in list(self.observers):
+            observer.new_frame_notification(data)
+
+    def fail(self, reason: str):
+        """
+        End upload with error
+
+        :param reason:  str, error description
+        :return:        None
+        """
+        if self.completed.is_set():
+            return
+
+        LOGGER.error("Modem simulator: %s", reason)
+        self.error = reason
+        self.dfu_end_time = time.monotonic()
+        self.completed.set()
+
+    def check_status(self, msg, expected: DFUStatus):
+        """
+        Check status of DFU response, fail upload if it is not expected one
+
+        :param msg:         GenericMessage or derivative, DFU response
+        :param expected:    DFUStatus, expected status
+        :return:            bool, True if status is expected one
+        """
+        if msg.status != expected:
+            self.fail("Unexpected {} status: {}, expected: {}".format(msg.type.name, msg.status, expected))
+            return False
+
+        return True
+
+    def ping_request(self, msg):
+        """
+        Respond to ping
+
+        :param msg: PingRequestMessage, received message
+        :return:    None
+        """
+        response = PongResponseMessage()
+        response.data = msg.data
+        self.send_message(response)
+
+    def current_state_request(self, msg):
+        """
+        Report modem state and continue to Node state
+
+        :param msg: CurrentStateRequestMessage, received message
+        :return:    None
+        """
+        response = CurrentStateResponseMessage()
+        response.state = self.modem_state
+        self.send_message(response)
+
+        if self.modem_state == ModemState.InitDevice:
+            event = InitDeviceEventMessage()
+            event.model_ids = self.model_ids
+            self.send_message(event)
+        elif self.modem_state in (ModemState.Device, ModemState.InitNode):
+            self.provision()
+        elif self.modem_state == ModemState.Node:
+            self.dfu_init()
+
+    def create_instances_request(self, msg):
+        """
+        Create model instances and continue to Node state
+
+        :param msg: CreateInstancesRequestMessage, received message
+        :return:    None
+        """
+        response = CreateInstancesResponseMessage()
+        response.model_ids = self.model_ids
+        self.send_message(response)
+
+        self.modem_state = ModemState.Device
+        self.provision()
+
+    def provision(self):
+        """
+        Simulate provisioning, Init Node Event moves MCU from Device to Init Node state and
+        repeated one triggers Start Node Request
+
+        :return:    None
+        """
+        if self.modem_state == ModemState.Device:
+            self.modem_state = ModemState.InitNode
+            self.send_init_node_event()
+
+        self.send_init_node_event()
+
+    def send_init_node_event(self):
+        """
+        Send Init Node Event
+
+        :return:    None
+        """
+        event = InitNodeEventMessage()
+        event.model_ids = self.model_ids
+        self.send_message(event)
+
+    def start_node_request(self, msg):
+        """
+        Start node and begin firmware upload
+
+        :param msg: StartNodeRequestMessage, received message
+        :return:    None
+        """
+        self.modem_state = ModemState.Node
+        self.send_message(StartNodeResponseMessage())
+        self.dfu_init()
+
+    def dfu_init(self):
+        """
+        Send DFU Init Request
+
+        :return:    None
+        """
+        LOGGER.info("Modem simulator starts upload of %d bytes", len(self.firmware))
+        self.dfu_start_time = time.monotonic()
+
+        request = DfuInitRequestMessage()
+        request.firmware_size = len(self.firmware)
+        request.firmware_sha256 = hashlib.sha256(self.firmware).digest()[::-1]
+        request.app_data_length = len(self.app_data)
+        request.app_data = self.app_data
+        self.send_message(request)
+
+    def dfu_init_response(self, msg):
+        """
+        Check DFU Init Response and ask for DFU status
+
+        :param msg: DfuInitResponseMessage, received message
+        :return:    None
+        """
+        if self.check_status(msg, DFUStatus.DFU_SUCCESS):
+            self.send_message(DfuStatusRequestMessage())
+
+    def dfu_status_response(self, msg):
+        """
+        Check DFU Status Response and start upload from reported offset
+
+        :param msg: DfuStatusResponseMessage, received message
+        :return:    None
+        """
+        if not self.check_status(msg, DFUStatus.DFU_SUCCESS):
+            return
+
+        if msg.firmware_offset >= len(self.firmware):
+            self.fail("Reported firmware offset {} past firmware size".format(msg.firmware_offset))
+            return
+
+        expected_crc = binascii.crc32(self.firmware[:msg.firmware_offset]) & 0xFFFFFFFF
+        if msg.firmware_crc != expected_crc:
+            self.fail("Reported firmware CRC {:08x}, expected {:08x}".format(msg.firmware_crc, expected_crc))
+            return
+
+        self.page_size = min(self.page_size, msg.supported_page_size)
+        self.firmware_offset = msg.firmware_offset
+        self.page_create()
+
+    def page_create(self):
+        """
+        Send DFU Page Create Request for next page
+
+        :return:    None
+        """
+        self.page_end = min(self.firmware_offset + self.page_size, len(self.firmware))
+
+        request = DfuPageCreateRequestMessage()
+        request.requested_page_size = self.page_end - self.firmware_offset
+        self.send_message(request)
+
+    def dfu_page_create_response(self, msg):
+        """
+        Check DFU Page Create Response, send page data and DFU Page Store Request
+
+        :param msg: DfuPageCreateResponseMessage, received message
+        :return:    None
+        """
+        if not self.check_status(msg, DFUStatus.DFU_SUCCESS):
+            return
+
+        for offset in range(self.firmware_offset, self.page_end, self.chunk_size):
+            event = DfuWriteDataEventMessage()
+            event.data = self.firmware[offset:min(offset + self.chunk_size, self.page_end)]
+            event.data_len = len(event.data)
+            self.send_message(event)
+
+        self.send_message(DfuPageStoreRequestMessage())
+
+    def dfu_page_store_response(self, msg):
+        """
+        Check DFU Page Store Response, continue with next page or end upload
+
+        :param msg: DfuPageStoreResponseMessage, received message
+        :return:    None
+        """
+        if self.page_end < len(self.firmware):
+            if self.check_status(msg, DFUStatus.DFU_SUCCESS):
+                self.firmware_offset = self.page_end
+                self.page_create()
+            return
+
+        if self.check_status(msg, DFUStatus.DFU_FIRMWARE_SUCCESSFULLY_UPDATED):
+            self.firmware_offset = self.page_end
+            self.dfu_end_time = time.monotonic()
+            LOGGER.info("Modem simulator uploaded firmware in %.3f s", self.dfu_time)
+            self.completed.set()
+
+    def dfu_cancel_request(self, msg):
+        """
+        MCU cancelled upload
+
+        :param msg: DfuCancelRequestMessage, received message
+        :return:    None
+        """
+        self.fail("MCU cancelled DFU")
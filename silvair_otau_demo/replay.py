@@ -0,0 +1,280 @@
+"""
+Offline replay of UART frame captures written with --capture_file.
+
+Every capture session is replayed against a fresh McuOtauMock, configured as in the capture: frames received
+from modem are fed to it, at recorded pace or as fast as possible, and frames it sends are compared with the
+ones sent when capture was recorded. Frames MCU sends on its own at start race with responses sent by UartAdapter
+reader thread, so frames sent in different order are reported, but only missing or additional frames make
+session mismatch. Every session is replayed in its own temporary directory of DFU files, empty or with files
+copied from given work directory, i.e. with files copied from the device the capture comes from. Files are looked up
+by names configured when capture was recorded. Files in work directory are never modified.
+
+Run:
+    silvair_otau_replay otau.cap.*.gz
+    python -m silvair_otau_demo.replay otau.cap.20261017-153000.xz --pace recorded --work_dir state/
+"""
+import collections
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import click
+
+from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr
+from silvair_otau_demo.dfu_logic.dfu_page_index import PAGE_INDEX_SUFFIX
+from silvair_otau_demo.dispatcher import bytes_to_readable_hex
+from silvair_otau_demo.event_mgr import TemplateDFUEventMgr
+from silvair_otau_demo.frame_capture import CAPTURE_INBOUND, CAPTURE_OUTBOUND, read_capture_sessions
+from silvair_otau_demo.script_mgr import McuOtauMock
+
+LOGGER = logging.getLogger(__name__)
+
+REPLAY_PACES = ('fast', 'recorded')
+# Names of DFU files replayed MCU works on, for captures without them in session info
+DEFAULT_DFU_FILES = {'app_data': 'app_data', 'firmware': 'firmware', 'sha256': 'sha256', 'nvm': 'nvm'}
+# Mismatching frames printed per session
+MAX_REPORTED_MISMATCHES = 10
+
+
+class ReplayAdapter:
+    """
+    UartAdapter stand-in feeding captured frames to observers and collecting frames written by MCU
+    """
+
+    def __init__(self):
+        """
+        Initialize ReplayAdapter
+        """
+        self.observers = []
+        self.written_frames = []
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def register_observer(self, observer):
+        """
+        :param observer:    UartAdapterObserver, notified about every fed frame
+        """
+        self.observers.append(observer)
+
+    def unregister_observer(self, observer):
+        """
+        :param observer:    UartAdapterObserver, registered observer
+        """
+        self.observers.remove(observer)
+
+    def write_uart_frame(self, data: bytes):
+        """
+        Collect frame written by MCU
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        self.written_frames.append(bytes(data))
+
+    def feed_frame(self, data: bytes):
+        """
+        Pass frame to observers, the same way UartAdapter passes frames received from modem
+
+        :param data:    bytes, frame
+        :return:        None
+        """
+        for observer in list(self.observers):
+            observer.new_frame_notification(data)
+
+
+def replay_session(info: dict, records: list, work_dir: str, pace: str = REPLAY_PACES[0],
+                   expected_app_data_file: str = None):
+    """
+    Replay single capture session against fresh McuOtauMock
+
+    :param info:                    dict, session info stored in capture
+    :param records:                 list, (kind, timestamp, frame) records of session
+    :param work_dir:                str, directory with DFU files
+    :param pace:                    str, 'fast' or 'recorded'
+    :param expected_app_data_file:  str or None, file with expected app data
+    :return:                        dict, replay result
+    """
+    inbound = [(timestamp, frame) for kind, timestamp, frame in records if kind == CAPTURE_INBOUND]
+    expected = [frame for kind, _, frame in records if kind == CAPTURE_OUTBOUND]
+
+    dfu_files = info.get('dfu_files', DEFAULT_DFU_FILES)
+
+    adapter = ReplayAdapter()
+    start_time = time.monotonic()
+    mcu_otau_mock = McuOtauMock(adapter,
+                                TemplateDFUEventMgr(),
+                                DFUFailMgr(),
+                                os.path.join(work_dir, dfu_files['app_data']),
+                                os.path.join(work_dir, dfu_files['firmware']),
+                                os.path.join(work_dir, dfu_files['sha256']),
+                                os.path.join(work_dir, dfu_files['nvm']),
+                                info['supported_page_size'],
+                                info['max_mem_size'],
+                                expected_app_data_file,
+                                info['model'],
+                                info['storage_mode'],
+                                page_recovery=info['page_recovery'])
+
+    handling_times = []
+    try:
+        for timestamp, frame in inbound:
+            if pace == 'recorded':
+                delay = start_time + timestamp - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            frame_start = time.perf_counter()
+            adapter.feed_frame(frame)
+            handling_times.append(time.perf_counter() - frame_start)
+    finally:
+        mcu_otau_mock.delete_objects()
+
+    actual = adapter.written_frames
+    missing, additional = diff_frames(expected, actual)
+
+    return {
+        'received_frames': len(inbound),
+        'expected_frames': len(expected),
+        'sent_frames': len(actual),
+        'missing_frames': missing,
+        'additional_frames': additional,
+        'reordered_frames': sum(expected_frame != actual_frame
+                                for expected_frame, actual_frame in zip(expected, actual)),
+        'recorded_time': records[-1][1] if records else 0.0,
+        'replay_time': time.monotonic() - start_time,
+        'handling_times': sorted(handling_times),
+    }
+
+
+def copy_dfu_files(info: dict, source_dir: str, target_dir: str):
+    """
+    Copy DFU files of capture session present in source directory to target directory
+
+    :param info:        dict, session info stored in capture
+    :param source_dir:  str, directory with DFU files
+    :param target_dir:  str, directory files are copied to
+    :return:            None
+    """
+    dfu_files = info.get('dfu_files', DEFAULT_DFU_FILES)
+    for name in list(dfu_files.values()) + [dfu_files['firmware'] + PAGE_INDEX_SUFFIX]:
+        source = os.path.join(source_dir, name)
+        if os.path.isfile(source):
+            shutil.copy2(source, os.path.join(target_dir, name))
+
+
+def diff_frames(expected: list, actual: list):
+    """
+    Compare recorded and replayed frames regardless of their order
+
+    :param expected:    list, frames sent when capture was recorded
+    :param actual:      list, frames sent during replay
+    :return:            tuple, lists of (index, frame) of recorded frames not sent during replay and of frames sent
+                        during replay only
+    """
+    expected_count = collections.Counter(expected)
+    actual_count = collections.Counter(actual)
+    missing = expected_count - actual_count
+    additional = actual_count - expected_count
+
+    def first_occurrences(frames, counts):
+        found = []
+        for index, frame in enumerate(frames):
+            if counts[frame]:
+                counts[frame] -= 1
+                found.append((index, frame))
+        return found
+
+    return first_occurrences(expected, missing), first_occurrences(actual, additional)
+
+
+def session_matches(result: dict):
+    """
+    :param result:  dict, replay result
+    :return:        bool, True if MCU sent the recorded frames, in any order
+    """
+    return not result['missing_frames'] and not result['additional_frames']
+
+
+def print_session_result(number: int, info: dict, result: dict):
+    """
+    Print replay result of single session
+
+    :param number:  int, session number
+    :param info:    dict, session info stored in capture
+    :param result:  dict, replay result
+    :return:        None
+    """
+    handling_times = result['handling_times']
+    click.echo("Session {} recorded {}: {} frames received, {} sent, replayed {} sent".format(
+        number, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info['time'])),
+        result['received_frames'], result['expected_frames'], result['sent_frames']))
+    click.echo("  time: recorded {:.3f} s, replay {:.3f} s".format(result['recorded_time'], result['replay_time']))
+    if handling_times:
+        click.echo("  frame handling: p50 {:.1f} us, p99 {:.1f} us, max {:.1f} us".format(
+            handling_times[len(handling_times) // 2] * 1e6,
+            handling_times[min(len(handling_times) - 1, int(0.99 * len(handling_times)))] * 1e6,
+            handling_times[-1] * 1e6))
+
+    for description, frames in (('recorded frame {} not sent', result['missing_frames']),
+                                ('replayed frame {} not recorded', result['additional_frames'])):
+        for index, frame in frames[:MAX_REPORTED_MISMATCHES]:
+            click.echo("  " + description.format(index) + ": " + bytes_to_readable_hex(frame))
+        if len(frames) > MAX_REPORTED_MISMATCHES:
+            click.echo("  ... {} more".format(len(frames) - MAX_REPORTED_MISMATCHES))
+    if result['reordered_frames']:
+        click.echo("  {} frames sent at different position than recorded".format(result['reordered_frames']))
+
+    click.echo("  {}".format("MATCH" if session_matches(result) else "MISMATCH"))
+
+
+@click.command()
+@click.argument('capture_files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--pace', type=click.Choice(REPLAY_PACES), default=REPLAY_PACES[0],
+              help='Feed frames as fast as possible or at recorded pace')
+@click.option('--work_dir', type=click.Path(exists=True, file_okay=False),
+              help='Directory with DFU files copied for every session, named as configured when capture was '
+                   'recorded (app_data, firmware, sha256, nvm by default), empty directory if not given')
+@click.option('-e', '--expected_app_data', type=str, help='File with expected app data (binary) used in pre validation')
+@click.option('--session', type=int, multiple=True, help='Replay only given session number, use multiple times')
+@click.option('-v', '--verbose', count=True, help='Verbosity level; -vv for full log')
+def replay(capture_files, pace, work_dir, expected_app_data, session, verbose):
+    """
+    Replay UART frame captures against fresh MCU and compare its responses with recorded ones.
+    Sessions are numbered across all capture files, in given order.
+    """
+    logging.basicConfig(level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(verbose, 2)],
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    sessions = [capture_session for capture_file in capture_files
+                for capture_session in read_capture_sessions(capture_file)]
+    if not sessions:
+        click.echo("No capture sessions in {}".format(', '.join(capture_files)))
+        sys.exit(1)
+
+    mismatching = 0
+    for number, (info, records) in enumerate(sessions, 1):
+        if session and number not in session:
+            continue
+
+        with tempfile.TemporaryDirectory() as session_dir:
+            if work_dir:
+                copy_dfu_files(info, work_dir, session_dir)
+
+            result = replay_session(info, records, session_dir, pace, expected_app_data)
+
+        print_session_result(number, info, result)
+        mismatching += not session_matches(result)
+
+    if mismatching:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    replay()
@@ -1,9 +1,12 @@
 import logging
 import os
 
-from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory, DFUStorageMode, DFUSyncPolicy
 from silvair_otau_demo.dfu_logic.dfu_mgr import DFU_Mgr
+from silvair_otau_demo.dispatch_stats import DispatchStats
 from silvair_otau_demo.dispatcher import Dispatcher, Sender
+from silvair_otau_demo.frame_capture import FrameCapture
+from silvair_otau_demo.frame_queue import FrameQueue
 from silvair_otau_demo.uart_logic.uart_fsm_mgr import UART_FSM
 from silvair_uart_common_libs.message_types import ModelID, ModelDesc
 
@@ -57,6 +60,13 @@ class McuOtauMock:
                  max_mem_size,
                  expected_app_data_file,
                  model,
+                 storage_mode=DFUStorageMode.MEMORY,
+                 sync_policy=DFUSyncPolicy.NONE,
+                 sync_interval_pages=0,
+                 sync_interval_bytes=0,
+                 page_recovery=False,
+                 frame_queue_depth=0,
+                 capture_file=None,
                  ):
         """
         :param uart_adapter:              UartAdapter object used to communicate with firmware
@@ -70,6 +80,15 @@ class McuOtauMock:
         :param max_mem_size:              int, max supported size of firmware in bytes, 0 implies unlimited
         :param expected_app_data_file:    str, path to app data file used in validation for OTAU
         :param model:                     str representing hex of models to register (with appropriate parameters)
+        :param storage_mode:              DFUStorageMode or str, where received firmware is kept during OTAU
+        :param sync_policy:               DFUSyncPolicy or str, when received firmware is synced to disk
+        :param sync_interval_pages:       int, pages between syncs with interval sync policy, 0 disables
+        :param sync_interval_bytes:       int, bytes between syncs with interval sync policy, 0 disables
+        :param page_recovery:             bool, if True failed page is dropped instead of failing whole OTAU
+        :param frame_queue_depth:         int, if not 0 received frames are queued and dispatched on a worker
+                                          thread, value is max number of queued frames
+        :param capture_file:              str or None, path every received and sent frame is captured to, session
+                                          start time is inserted before extension
         """
         self.uart_adapter = uart_adapter
         self.event_manager = event_manager
@@ -83,12 +102,22 @@ class McuOtauMock:
         self.max_mem_size = max_mem_size
         self.expected_app_data_file = expected_app_data_file
         self.model = model
-
+        self.storage_mode = DFUStorageMode(storage_mode)
+        self.sync_policy = DFUSyncPolicy(sync_policy)
+        self.sync_interval_pages = sync_interval_pages
+        self.sync_interval_bytes = sync_interval_bytes
+        self.page_recovery = page_recovery
+        self.frame_queue_depth = frame_queue_depth
+        self.capture_file = capture_file
+
+        self.capture = None
+        self.dispatch_stats = None
         self.sender = None
         self.uart_fsm = None
         self.dfu_memory = None
         self.dfu_mgr = None
         self.dfu_dispatcher = None
+        self.frame_queue = None
 
         try:
             with open(self.expected_app_data_file, 'rb') as f:
@@ -110,7 +139,10 @@ class McuOtauMock:
         Create and bind objects used in MCU DFU script. If config file is specified other arguments are ignored.
         """
         LOGGER.info("Starting application!")
-        self.sender = Sender(self.uart_adapter)
+        if self.capture_file:
+            self.capture = FrameCapture(self.capture_file, self.capture_info())
+        self.sender = Sender(self.uart_adapter, self.capture)
+        self.dispatch_stats = DispatchStats()
 
         models_to_register = parse_model_ids(self.model, LOGGER)
         self.uart_fsm = UART_FSM(self.sender, self.event_manager, default_models=models_to_register)
@@ -119,28 +151,76 @@ class McuOtauMock:
                                     self.firmware_file,
                                     self.sha256_file,
                                     self.supported_page_size,
-                                    self.max_mem_size)
+                                    self.max_mem_size,
+                                    self.storage_mode,
+                                    self.sync_policy,
+                                    self.sync_interval_pages,
+                                    self.sync_interval_bytes)
 
         self.dfu_mgr = DFU_Mgr(self.sender,
                                self.event_manager,
                                self.dfu_memory,
                                self.fail_manager,
                                self.nvm_file,
-                               self.expected_app_data)
-
-        self.dfu_dispatcher = Dispatcher(self.uart_fsm, self.dfu_mgr.dfu_fsm)
-        self.uart_adapter.register_observer(self.dfu_dispatcher)
+                               self.expected_app_data,
+                               self.page_recovery,
+                               self.dispatch_stats)
+
+        # Received frames are captured by UartAdapter observer, so that capture has them as they arrive
+        self.dfu_dispatcher = Dispatcher(self.uart_fsm, self.dfu_mgr.dfu_fsm,
+                                         None if self.frame_queue_depth else self.capture, self.dispatch_stats)
+
+        if self.frame_queue_depth:
+            self.frame_queue = FrameQueue(self.dfu_dispatcher, self.frame_queue_depth,
+                                          metrics_handler=self.event_manager.uart_frame_queue_metrics,
+                                          capture=self.capture)
+            self.uart_adapter.register_observer(self.frame_queue)
+        else:
+            self.uart_adapter.register_observer(self.dfu_dispatcher)
 
         self.uart_fsm.start()
         self.dfu_mgr.dfu_fsm.start()
 
+        if self.frame_queue is not None:
+            self.frame_queue.start()
+
+    def capture_info(self):
+        """
+        Config affecting MCU responses, stored in capture file so that capture can be replayed with the same config
+
+        :return:    dict, JSON serializable config
+        """
+        return {
+            'supported_page_size': int(self.supported_page_size),
+            'max_mem_size': int(self.max_mem_size),
+            'model': list(self.model),
+            'storage_mode': self.storage_mode.value,
+            'page_recovery': bool(self.page_recovery),
+            # Names of DFU files, so that replay finds them in directory copied from the device
+            'dfu_files': {'app_data': os.path.basename(self.app_data_file),
+                          'firmware': os.path.basename(self.firmware_file),
+                          'sha256': os.path.basename(self.sha256_file),
+                          'nvm': os.path.basename(self.nvm_file)},
+        }
+
     def delete_objects(self):
         """
-        Unregister dispatcher from observers and set objects to None for deletion.
+        Unregister dispatcher from observers, stop frame queue, close DFU files and capture file and set objects
+        to None for deletion.
         """
-        self.uart_adapter.unregister_observer(self.dfu_dispatcher)
+        if self.frame_queue is not None:
+            self.uart_adapter.unregister_observer(self.frame_queue)
+            self.frame_queue.stop()
+        else:
+            self.uart_adapter.unregister_observer(self.dfu_dispatcher)
+        self.dfu_mgr.close()
+        if self.capture is not None:
+            self.capture.close()
+        self.capture = None
+        self.dispatch_stats = None
         self.sender = None
         self.uart_fsm = None
         self.dfu_memory = None
         self.dfu_mgr = None
         self.dfu_dispatcher = None
+        self.frame_queue = None
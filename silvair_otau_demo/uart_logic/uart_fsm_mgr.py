@@ -1,4 +1,6 @@
+import functools
 import logging
+import time
 
 from silvair_uart_common_libs.message_types import FactoryResetSource, AttentionEvent, Error, ModelID, ModelDesc
 from silvair_uart_common_libs.messages import FirmwareVersionRequestMessage, DeviceUUIDRequestMessage, GenericMessage, \
@@ -19,6 +21,36 @@ UART_STATE_CLASSES = {
     UART_FSMState.Node: UARTNodeState,
 }
 
+# Opcode of every message handled by UART FSM and name of the state method handling it
+UART_FSM_EVENTS = {
+    UartCommand.PingRequest: 'ping_request_message_event',
+    UartCommand.PongResponse: 'pong_response_message_event',
+    UartCommand.InitDeviceEvent: 'init_device_event_message_event',
+    UartCommand.CreateInstancesRequest: 'create_instances_request_message_event',
+    UartCommand.CreateInstancesResponse: 'create_instances_response_message_event',
+    UartCommand.InitNodeEvent: 'init_node_event_message_event',
+    UartCommand.MeshMessageRequest: 'mesh_message_request_message_event',
+    UartCommand.OpcodeError: 'opcode_error_message_event',
+    UartCommand.StartNodeRequest: 'start_node_request_message_event',
+    UartCommand.StartNodeResponse: 'start_node_response_message_event',
+    UartCommand.FactoryResetRequest: 'factory_reset_request_message_event',
+    UartCommand.FactoryResetResponse: 'factory_reset_response_message_event',
+    UartCommand.FactoryResetEvent: 'factory_reset_event_message_event',
+    UartCommand.MeshMessageResponse: 'mesh_message_response_message_event',
+    UartCommand.CurrentStateRequest: 'current_state_request_message_event',
+    UartCommand.CurrentStateResponse: 'current_state_response_message_event',
+    UartCommand.Error: 'error_message_event',
+    UartCommand.FirmwareVersionRequest: 'firmware_version_request_message_event',
+    UartCommand.FirmwareVersionResponse: 'firmware_version_response_message_event',
+    UartCommand.SensorUpdateRequest: 'sensor_update_request_message_event',
+    UartCommand.AttentionEvent: 'attention_event_message_event',
+    UartCommand.SoftResetRequest: 'soft_reset_request_message_event',
+    UartCommand.SoftResetResponse: 'soft_reset_response_message_event',
+    UartCommand.SensorUpdateResponse: 'sensor_update_response_message_event',
+    UartCommand.DeviceUUIDRequest: 'device_uuid_request_message_event',
+    UartCommand.DeviceUUIDResponse: 'device_uuid_response_message_event',
+}
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -129,6 +161,26 @@ class UART_FSM_EventMgr:
         """
         pass
 
+    def uart_startup_timing(self, timing: dict):
+        """
+        Handle UART startup timing event, sent when UART FSM first reaches Node state
+
+        :param timing:  dict, startup record: time from start to Node and time spent in every state on the way,
+                        in seconds
+        :return:        None
+        """
+        pass
+
+    def uart_frame_queue_metrics(self, metrics: dict):
+        """
+        Handle frame queue metrics event, sent periodically while frames are queued between UartAdapter and
+        Dispatcher
+
+        :param metrics: dict, queue depth, frame counters and frame wait times of the elapsed interval, in seconds
+        :return:        None
+        """
+        pass
+
 
 class UART_FSM:
     """
@@ -152,11 +204,22 @@ class UART_FSM:
         assert sender is not None
         assert event_mgr is not None
 
+        # Handlers of every state are bound once, change_state only swaps the table in use
+        self.state_handlers = {state_id: {opcode: functools.partial(getattr(state, event), self)
+                                          for opcode, event in UART_FSM_EVENTS.items()}
+                               for state_id, state in UART_STATE_CLASSES.items()}
+
         self.current_state_id = init_state
         self.current_state = UART_STATE_CLASSES[init_state]
+        self.handlers = self.state_handlers[init_state]
         self.dispatcher = sender
         self.event_mgr = event_mgr
 
+        # Startup lasts from start until Node state is reached for the first time, None when it is over
+        self.startup_time = None
+        self.startup_states = dict()
+        self.state_enter_time = 0.0
+
         LOGGER.debug("Number of models to register: {:d}".format(len(default_models)))
         self.default_models_to_register = default_models
 
@@ -168,6 +231,7 @@ class UART_FSM:
 
         :return: None
         """
+        self.startup_time = self.state_enter_time = time.monotonic()
         self.current_state.on_enter(self)
 
         msg = FirmwareVersionRequestMessage()
@@ -184,13 +248,47 @@ class UART_FSM:
         :param new_state:   UART_FSMState, new state
         :return:            None
         """
+        if self.startup_time is not None:
+            now = time.monotonic()
+            state_name = self.current_state_id.name
+            self.startup_states[state_name] = self.startup_states.get(state_name, 0.0) + now - self.state_enter_time
+            self.state_enter_time = now
+
         self.current_state.on_exit(self)
         self.current_state_id = new_state
         self.current_state = UART_STATE_CLASSES[new_state]
+        self.handlers = self.state_handlers[new_state]
         self.current_state.on_enter(self)
 
         LOGGER.info('UART_FSM changed state to: ' + self.current_state_id.name)
 
+        if self.startup_time is not None and new_state == UART_FSMState.Node:
+            self.report_startup_timing()
+
+    def report_startup_timing(self):
+        """
+        Report time from start to Node state, broken down by states on the way
+
+        :return: None
+        """
+        timing = {
+            'to_node_s': round(self.state_enter_time - self.startup_time, 6),
+            'states_s': {name: round(seconds, 6) for name, seconds in self.startup_states.items()},
+        }
+        self.startup_time = None
+        self.startup_states = dict()
+
+        self.event_mgr.uart_startup_timing(timing)
+
+    def handle_message(self, msg):
+        """
+        Pass message to handler of current state
+
+        :param msg:             Received message, its opcode has to be one of UART_FSM_EVENTS
+        :return:                None
+        """
+        self.handlers[msg.type](msg)
+
     def ping_request_message_event(self, msg):
         """
         Standard Ping Request Message event handler
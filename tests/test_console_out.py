@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+
+from silvair_otau_demo.console_out import ConsoleOut
+
+
+class FakeProgressBar:
+    def __init__(self, total, initial, **kwargs):
+        self.total = total
+        self.n = initial
+        self.updates = []
+        self.closed = False
+
+    def update(self, n):
+        self.n += n
+        self.updates.append(n)
+
+    def close(self):
+        self.closed = True
+
+
+class ConsoleOutTests(unittest.TestCase):
+    def setUp(self):
+        tqdm_patcher = patch('silvair_otau_demo.console_out.tqdm', FakeProgressBar)
+        tqdm_patcher.start()
+        self.addCleanup(tqdm_patcher.stop)
+
+        stdout_patcher = patch('silvair_otau_demo.console_out.sys.stdout')
+        self.stdout_mock = stdout_patcher.start()
+        self.addCleanup(stdout_patcher.stop)
+        self.stdout_mock.isatty.return_value = True
+
+        self.addCleanup(ConsoleOut.set_max_refresh_rate, ConsoleOut.max_refresh_rate)
+        self.addCleanup(ConsoleOut.stop_progress_bar)
+
+    def test_updates_are_coalesced_and_final_progress_is_exact(self):
+        ConsoleOut.set_max_refresh_rate(0.001)
+        ConsoleOut.start_progress_bar(1024, 0)
+        pbar = ConsoleOut.pbar
+
+        for progress in range(16, 1024 + 1, 16):
+            ConsoleOut.update_progress_bar(progress)
+        self.assertEqual([], pbar.updates)
+
+        ConsoleOut.stop_progress_bar()
+        self.assertEqual(1024, pbar.n)
+        self.assertTrue(pbar.closed)
+
+    def test_every_update_is_rendered_without_rate_limit(self):
+        ConsoleOut.set_max_refresh_rate(0)
+        ConsoleOut.start_progress_bar(64, 16)
+        pbar = ConsoleOut.pbar
+
+        ConsoleOut.update_progress_bar(32)
+        ConsoleOut.update_progress_bar(48)
+
+        self.assertEqual([16, 16], pbar.updates)
+
+    def test_progress_bar_is_not_rendered_without_terminal(self):
+        self.stdout_mock.isatty.return_value = False
+
+        ConsoleOut.start_progress_bar(64, 0)
+        ConsoleOut.update_progress_bar(32)
+
+        self.assertIsNone(ConsoleOut.pbar)
+        self.assertFalse(ConsoleOut.progress_bar_enabled)
+        self.assertEqual(32, ConsoleOut.progress)
@@ -100,3 +100,28 @@ class DFU_FSMTests(unittest.TestCase):
         msg = DfuPageStoreRequestMessage()
         self.dfu_fsm.dfu_page_store_request_message_event(msg)
         self.assertEquals(self.dfu_fsm.current_state_id, DFUState.Standby)
+
+    def test_handle_message_follows_current_state(self):
+        self.test_dfu_init()
+
+        msg = DfuPageCreateRequestMessage()
+        msg.requested_page_size = 16
+        self.dfu_fsm.handle_message(msg)
+
+        self.dfu_mgr_mock.create_page.assert_called_once_with(msg)
+        self.assertEqual(self.dfu_fsm.current_state_id, DFUState.UploadPage)
+
+        write_msg = DfuWriteDataEventMessage()
+        write_msg.data_len = 4
+        write_msg.data = b"\xAA\xBB\xCC\xDD"
+        self.dfu_fsm.handle_message(write_msg)
+
+        self.dfu_mgr_mock.process_write_data.assert_called_once_with(write_msg.data)
+
+    def test_write_data_payload_handled_only_in_upload_page(self):
+        data = memoryview(b"\xAA\xBB\xCC\xDD")
+        self.assertFalse(self.dfu_fsm.dfu_write_data_payload_event(data))
+
+        self.test_dfu_page_create()
+        self.assertTrue(self.dfu_fsm.dfu_write_data_payload_event(data))
+        self.dfu_mgr_mock.process_write_data.assert_called_once_with(data)
@@ -0,0 +1,198 @@
+import binascii
+import hashlib
+import os
+import tempfile
+import unittest
+
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory, DFUMemoryError, DFUStorageMode, DFUSyncPolicy
+from silvair_otau_demo.dfu_logic.dfu_page_index import PAGE_INDEX_SUFFIX
+
+
+class DFUMemoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app_data_file = os.path.join(self.tmp_dir.name, 'app_data')
+        self.firmware_file = os.path.join(self.tmp_dir.name, 'firmware')
+        self.sha256_file = os.path.join(self.tmp_dir.name, 'sha256')
+
+        self.dfu_memory = self.create_memory()
+        self.dfu_memory.clear()
+        self.dfu_memory.set_firmware_memory_size(1024)
+
+    def tearDown(self):
+        self.dfu_memory.close()
+        self.tmp_dir.cleanup()
+
+    def create_memory(self, *args, **kwargs):
+        dfu_memory = DFUMemory(self.app_data_file, self.firmware_file, self.sha256_file, 256, 0, *args, **kwargs)
+        self.addCleanup(dfu_memory.close)
+        return dfu_memory
+
+    def store_page(self, dfu_memory, data, chunk_size=16):
+        dfu_memory.create_page(len(data))
+        for i in range(0, len(data), chunk_size):
+            dfu_memory.write_data(data[i:i + chunk_size])
+        dfu_memory.page_store()
+
+    def test_crc_follows_written_data(self):
+        page = bytes(range(64))
+
+        self.dfu_memory.create_page(len(page))
+        self.dfu_memory.write_data(page[:16])
+        self.assertEqual(binascii.crc32(page[:16]), self.dfu_memory.calc_firmware_crc())
+
+        self.dfu_memory.write_data(page[16:])
+        self.dfu_memory.page_store()
+        self.assertEqual(binascii.crc32(page), self.dfu_memory.calc_firmware_crc())
+
+        self.store_page(self.dfu_memory, page)
+        self.assertEqual(binascii.crc32(page + page), self.dfu_memory.calc_firmware_crc())
+
+    def test_crc_restored_from_checkpoint_without_page_index(self):
+        page = bytes(range(64))
+        self.store_page(self.dfu_memory, page)
+        crc = self.dfu_memory.get_firmware_crc()
+        self.store_page(self.dfu_memory, bytes(64))
+        self.dfu_memory.close()
+        os.remove(self.firmware_file + PAGE_INDEX_SUFFIX)
+
+        dfu_memory = self.create_memory()
+        self.assertEqual(len(page), dfu_memory.resume(len(page), crc))
+        self.assertEqual(crc, dfu_memory.calc_firmware_crc())
+        self.assertEqual(page, bytes(dfu_memory.firmware_memory))
+        self.assertEqual(len(page), os.path.getsize(self.firmware_file))
+
+        self.store_page(dfu_memory, page)
+        self.assertEqual(binascii.crc32(page + page), dfu_memory.calc_firmware_crc())
+        self.assertEqual(hashlib.sha256(page + page).digest()[::-1], dfu_memory.calc_firmware_sha256())
+
+    def test_resume_truncates_to_last_verified_page(self):
+        pages = [bytes([i]) * 64 for i in range(4)]
+        for page in pages:
+            self.store_page(self.dfu_memory, page)
+        self.dfu_memory.close()
+
+        with open(self.firmware_file, 'r+b') as f:
+            f.seek(2 * 64 + 10)
+            f.write(b'\xFF')
+
+        dfu_memory = self.create_memory()
+        self.assertEqual(2 * 64, dfu_memory.resume(3 * 64, 0))
+        self.assertEqual(2 * 64, os.path.getsize(self.firmware_file))
+        self.assertEqual(2, len(dfu_memory.page_index.entries))
+
+        self.store_page(dfu_memory, pages[2])
+        self.assertEqual(binascii.crc32(b''.join(pages[:3])), dfu_memory.calc_firmware_crc())
+        self.assertEqual(hashlib.sha256(b''.join(pages[:3])).digest()[::-1], dfu_memory.calc_firmware_sha256())
+
+    def test_resume_drops_torn_page(self):
+        page = bytes(range(64))
+        self.store_page(self.dfu_memory, page)
+        self.dfu_memory.close()
+
+        with open(self.firmware_file, 'ab') as f:
+            f.write(page[:10])
+
+        dfu_memory = self.create_memory()
+        self.assertEqual(len(page), dfu_memory.resume(2 * len(page), 0))
+        self.assertEqual(len(page), dfu_memory.firmware_offset)
+        self.assertEqual(binascii.crc32(page), dfu_memory.calc_firmware_crc())
+
+    def test_crc_rebuilt_without_checkpoint(self):
+        page = bytes(range(64))
+        self.store_page(self.dfu_memory, page)
+
+        dfu_memory = self.create_memory()
+        self.assertEqual(binascii.crc32(page), dfu_memory.calc_firmware_crc())
+
+    def test_sha256_follows_stored_pages(self):
+        page = bytes(range(64))
+        self.store_page(self.dfu_memory, page)
+        self.store_page(self.dfu_memory, page)
+
+        self.assertEqual(hashlib.sha256(page + page).digest()[::-1], self.dfu_memory.calc_firmware_sha256())
+
+    def test_sha256_rebuilt_from_firmware_file(self):
+        page = bytes(range(64))
+        self.store_page(self.dfu_memory, page)
+
+        dfu_memory = self.create_memory()
+        self.store_page(dfu_memory, page)
+
+        self.assertEqual(hashlib.sha256(page + page).digest()[::-1], dfu_memory.calc_firmware_sha256())
+
+    def test_page_buffer_is_reused(self):
+        page_buffer = self.dfu_memory.page_buffer
+
+        self.store_page(self.dfu_memory, bytes(range(64)))
+        self.store_page(self.dfu_memory, bytes(range(256)))
+
+        self.assertIs(page_buffer, self.dfu_memory.page_buffer)
+        with open(self.firmware_file, 'rb') as f:
+            self.assertEqual(bytes(range(64)) + bytes(range(256)), f.read())
+
+    def test_page_bigger_than_supported_is_rejected(self):
+        with self.assertRaises(DFUMemoryError):
+            self.dfu_memory.create_page(257)
+
+    def test_write_past_page_size_invalidates_page(self):
+        self.dfu_memory.create_page(16)
+        self.dfu_memory.write_data(bytes(8))
+
+        with self.assertRaises(DFUMemoryError):
+            self.dfu_memory.write_data(bytes(16))
+
+        self.dfu_memory.write_data(bytes(8))
+        with self.assertRaises(DFUMemoryError):
+            self.dfu_memory.page_store()
+
+    def test_stream_mode_keeps_only_current_page(self):
+        page = bytes(range(256))
+        dfu_memory = self.create_memory(DFUStorageMode.STREAM)
+        dfu_memory.clear()
+        dfu_memory.set_firmware_memory_size(1024)
+
+        for _ in range(4):
+            self.store_page(dfu_memory, page)
+
+        self.assertIsNone(dfu_memory.firmware_memory)
+        self.assertEqual(binascii.crc32(page * 4), dfu_memory.calc_firmware_crc())
+        self.assertEqual(hashlib.sha256(page * 4).digest()[::-1], dfu_memory.calc_firmware_sha256())
+
+        dfu_memory = self.create_memory(DFUStorageMode.STREAM)
+        self.assertIsNone(dfu_memory.firmware_memory)
+        self.assertEqual(len(page) * 4, dfu_memory.firmware_offset)
+        self.assertEqual(binascii.crc32(page * 4), dfu_memory.calc_firmware_crc())
+
+    def test_firmware_file_kept_open_until_closed(self):
+        page = bytes(range(64))
+        dfu_memory = self.create_memory(sync_policy=DFUSyncPolicy.INTERVAL, sync_interval_pages=2)
+        dfu_memory.clear()
+        dfu_memory.set_firmware_memory_size(1024)
+
+        self.store_page(dfu_memory, page)
+        firmware_file_handle = dfu_memory.firmware_file_handle
+        self.assertEqual(1, dfu_memory.unsynced_pages)
+        self.assertFalse(dfu_memory.is_synced())
+
+        self.store_page(dfu_memory, page)
+        self.assertIs(firmware_file_handle, dfu_memory.firmware_file_handle)
+        self.assertEqual(0, dfu_memory.unsynced_pages)
+        self.assertTrue(dfu_memory.is_synced())
+
+        dfu_memory.close()
+        self.assertIsNone(dfu_memory.firmware_file_handle)
+        self.assertTrue(firmware_file_handle.closed)
+        with open(self.firmware_file, 'rb') as f:
+            self.assertEqual(page + page, f.read())
+
+    def test_corrupted_pages_are_found(self):
+        for i in range(3):
+            self.store_page(self.dfu_memory, bytes([i]) * 64)
+        self.assertEqual([], self.dfu_memory.find_corrupted_pages())
+
+        with open(self.firmware_file, 'r+b') as f:
+            f.seek(64)
+            f.write(b'\xFF')
+
+        self.assertEqual([64], self.dfu_memory.find_corrupted_pages())
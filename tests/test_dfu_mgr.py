@@ -0,0 +1,183 @@
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from silvair_uart_common_libs.message_types import DFUStatus
+from silvair_uart_common_libs.messages import UartCommand, DfuInitRequestMessage, DfuPageCreateRequestMessage, \
+    DfuWriteDataEventMessage, DfuPageStoreRequestMessage
+
+from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr, DFUFault
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUMemory, DFUSyncPolicy
+from silvair_otau_demo.dfu_logic.dfu_mgr import DFU_Mgr
+from silvair_otau_demo.dfu_logic.states.dfu_fsm_states import DFUState
+from silvair_otau_demo.dispatch_stats import DispatchStats
+
+FIRMWARE = bytes(range(64))
+PAGE_SIZE = 16
+
+
+class DFU_MgrTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sender_mock = Mock()
+        self.event_mgr_mock = Mock()
+        self.fail_mgr = DFUFailMgr()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_dfu_mgr(self, page_recovery, expected_app_data=None, dispatch_stats=None,
+                       sync_policy=DFUSyncPolicy.NONE):
+        dfu_memory = DFUMemory(os.path.join(self.tmp_dir.name, 'app_data'),
+                               os.path.join(self.tmp_dir.name, 'firmware'),
+                               os.path.join(self.tmp_dir.name, 'sha256'),
+                               sync_policy=sync_policy)
+        dfu_mgr = DFU_Mgr(self.sender_mock,
+                          self.event_mgr_mock,
+                          dfu_memory,
+                          self.fail_mgr,
+                          os.path.join(self.tmp_dir.name, 'nvm'),
+                          expected_app_data,
+                          page_recovery,
+                          dispatch_stats)
+        self.addCleanup(dfu_mgr.close)
+
+        dfu_mgr.dfu_fsm.start()
+
+        msg = DfuInitRequestMessage()
+        msg.firmware_size = len(FIRMWARE)
+        msg.firmware_sha256 = hashlib.sha256(FIRMWARE).digest()[::-1]
+        msg.app_data_length = 4
+        msg.app_data = b"\xFF\xFF\xFF\xFF"
+        dfu_mgr.dfu_fsm.dfu_init_request_message_event(msg)
+
+        if expected_app_data is None:
+            self.assertEqual(DFUState.Upload, dfu_mgr.dfu_fsm.current_state_id)
+        return dfu_mgr
+
+    def send_page(self, dfu_mgr, data, page_size=PAGE_SIZE):
+        msg = DfuPageCreateRequestMessage()
+        msg.requested_page_size = page_size
+        dfu_mgr.dfu_fsm.dfu_page_create_request_message_event(msg)
+
+        msg = DfuWriteDataEventMessage()
+        msg.data_len = len(data)
+        msg.data = data
+        dfu_mgr.dfu_fsm.dfu_write_data_event_message_event(msg)
+
+        dfu_mgr.dfu_fsm.dfu_page_store_request_message_event(DfuPageStoreRequestMessage())
+
+        # Standby state sends its own request on enter, look for the last page store response
+        for call in reversed(self.sender_mock.send_message.call_args_list):
+            msg = call[0][0]
+            if msg.type == UartCommand.DfuPageStoreResponse:
+                return msg.status
+
+    def test_failed_page_fails_dfu_without_page_recovery(self):
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False)
+
+        self.assertEqual(DFUStatus.DFU_SUCCESS, self.send_page(dfu_mgr, FIRMWARE[:PAGE_SIZE]))
+        self.assertEqual(DFUStatus.DFU_INVALID_OBJECT, self.send_page(dfu_mgr, FIRMWARE[PAGE_SIZE:PAGE_SIZE + 8]))
+
+        self.assertEqual(DFUState.Standby, dfu_mgr.dfu_fsm.current_state_id)
+
+    def test_failed_page_reports_dfu_fail_without_page_recovery(self):
+        dispatch_stats = DispatchStats()
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False, dispatch_stats=dispatch_stats)
+
+        self.send_page(dfu_mgr, FIRMWARE[:PAGE_SIZE])
+        self.send_page(dfu_mgr, FIRMWARE[PAGE_SIZE:PAGE_SIZE + 8])
+
+        self.event_mgr_mock.dfu_failed.assert_called_once_with()
+        record = self.event_mgr_mock.dfu_session_timing.call_args[0][0]
+        self.assertEqual('failed', record['result'])
+        self.assertEqual(1, record['init_otau_count'])
+        self.assertEqual(2, record['page_store_count'])
+
+        # Summary is taken once dispatcher records handling of the page store request
+        dispatch_stats.record(UartCommand.DfuPageStoreRequest, 1000, 1000)
+        self.event_mgr_mock.dfu_latency_summary.assert_called_once()
+
+    def test_page_store_fault_reports_dfu_fail_without_page_recovery(self):
+        self.fail_mgr.add_on_page_store_request_fault(
+            DFUFault.create_fault_with_status(1, DFUStatus.DFU_OPERATION_FAILED))
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False)
+
+        self.assertEqual(DFUStatus.DFU_OPERATION_FAILED, self.send_page(dfu_mgr, FIRMWARE[:PAGE_SIZE]))
+
+        self.assertEqual(DFUState.Standby, dfu_mgr.dfu_fsm.current_state_id)
+        self.event_mgr_mock.dfu_failed.assert_called_once_with()
+        self.assertEqual('failed', self.event_mgr_mock.dfu_session_timing.call_args[0][0]['result'])
+
+    def synced_files(self, dfu_mgr, data):
+        with patch('os.fsync') as fsync_mock:
+            self.assertEqual(DFUStatus.DFU_SUCCESS, self.send_page(dfu_mgr, data))
+        return [call[0][0] for call in fsync_mock.call_args_list]
+
+    def test_checkpoint_is_synced_with_synced_pages(self):
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False, sync_policy=DFUSyncPolicy.PAGE)
+
+        synced_files = self.synced_files(dfu_mgr, FIRMWARE[:PAGE_SIZE])
+
+        self.assertIn(dfu_mgr.dfu_memory.firmware_file_handle.fileno(), synced_files)
+        self.assertEqual(dfu_mgr.nvm.file.fileno(), synced_files[-1])
+
+    def test_checkpoint_is_not_synced_without_sync_policy(self):
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False)
+
+        self.assertEqual([], self.synced_files(dfu_mgr, FIRMWARE[:PAGE_SIZE]))
+
+    def test_failed_page_is_dropped_with_page_recovery(self):
+        dfu_mgr = self.create_dfu_mgr(page_recovery=True)
+
+        self.assertEqual(DFUStatus.DFU_SUCCESS, self.send_page(dfu_mgr, FIRMWARE[:PAGE_SIZE]))
+        self.assertEqual(DFUStatus.DFU_INVALID_OBJECT, self.send_page(dfu_mgr, FIRMWARE[PAGE_SIZE:PAGE_SIZE + 8]))
+
+        self.assertEqual(DFUState.Upload, dfu_mgr.dfu_fsm.current_state_id)
+        self.assertEqual(PAGE_SIZE, dfu_mgr.dfu_memory.firmware_offset)
+        self.assertEqual(0, dfu_mgr.dfu_memory.firmware_page_offset)
+
+        for offset in range(PAGE_SIZE, len(FIRMWARE) - PAGE_SIZE, PAGE_SIZE):
+            self.assertEqual(DFUStatus.DFU_SUCCESS, self.send_page(dfu_mgr, FIRMWARE[offset:offset + PAGE_SIZE]))
+
+        self.assertEqual(DFUStatus.DFU_FIRMWARE_SUCCESSFULLY_UPDATED,
+                         self.send_page(dfu_mgr, FIRMWARE[-PAGE_SIZE:]))
+        self.event_mgr_mock.dfu_update_complete.assert_called_once_with()
+
+    def test_page_dropped_on_page_store_fault_with_page_recovery(self):
+        self.fail_mgr.add_on_page_store_request_fault(
+            DFUFault.create_fault_with_status(2, DFUStatus.DFU_OPERATION_FAILED))
+        dfu_mgr = self.create_dfu_mgr(page_recovery=True)
+
+        self.assertEqual(DFUStatus.DFU_SUCCESS, self.send_page(dfu_mgr, FIRMWARE[:PAGE_SIZE]))
+        self.assertEqual(DFUStatus.DFU_OPERATION_FAILED, self.send_page(dfu_mgr, FIRMWARE[PAGE_SIZE:2 * PAGE_SIZE]))
+
+        self.assertEqual(DFUState.Upload, dfu_mgr.dfu_fsm.current_state_id)
+        self.assertEqual(PAGE_SIZE, dfu_mgr.dfu_memory.firmware_offset)
+
+    def test_invalid_app_data_is_reported_as_dfu_error(self):
+        self.create_dfu_mgr(page_recovery=False, expected_app_data=b"\x00\x00\x00\x00")
+
+        self.event_mgr_mock.dfu_error.assert_called_once_with("Invalid app_data! expected: '00000000', got: 'ffffffff'")
+        self.event_mgr_mock.dfu_initialized.assert_not_called()
+
+    def test_rejected_init_request_ends_session_as_failed(self):
+        self.create_dfu_mgr(page_recovery=False, expected_app_data=b"\x00\x00\x00\x00")
+
+        self.event_mgr_mock.dfu_failed.assert_called_once_with()
+        record = self.event_mgr_mock.dfu_session_timing.call_args[0][0]
+        self.assertEqual('failed', record['result'])
+        self.assertEqual(1, record['init_otau_count'])
+
+    def test_pre_validation_fault_ends_session_as_failed(self):
+        self.fail_mgr.add_on_pre_validation_fault(
+            DFUFault.create_fault_with_status(1, DFUStatus.DFU_OPERATION_FAILED))
+        dfu_mgr = self.create_dfu_mgr(page_recovery=False, expected_app_data=b"\xFF\xFF\xFF\xFF")
+
+        self.assertEqual(DFUState.Standby, dfu_mgr.dfu_fsm.current_state_id)
+        self.event_mgr_mock.dfu_failed.assert_called_once_with()
+        record = self.event_mgr_mock.dfu_session_timing.call_args[0][0]
+        self.assertEqual('failed', record['result'])
+        self.assertEqual(1, record['init_otau_count'])
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from silvair_otau_demo.dfu_logic.dfu_nvm import DFU_NVM
+
+
+class DFU_NVMTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'nvm')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_nvm(self, *args, **kwargs):
+        nvm = DFU_NVM(self.path, *args, **kwargs)
+        self.addCleanup(nvm.close)
+        return nvm
+
+    def read_lines(self):
+        with open(self.path, 'r') as f:
+            return f.readlines()
+
+    def test_updates_are_appended(self):
+        nvm = self.create_nvm()
+        nvm.update('a', 1)
+        nvm.update('b', 2)
+        nvm.update('a', 3)
+        nvm.close()
+
+        self.assertEqual(3, len(self.read_lines()))
+        self.assertEqual({'a': 3, 'b': 2}, self.create_nvm().data_dict)
+
+    def test_transient_updates_are_coalesced(self):
+        nvm = self.create_nvm()
+        nvm.update('state', 1, transient=True)
+        nvm.update('offset', 16, transient=True)
+        self.assertFalse(os.path.exists(self.path))
+
+        nvm.update('state', 2)
+        nvm.close()
+
+        self.assertEqual([{'state': 2, 'offset': 16}], [json.loads(line) for line in self.read_lines()])
+
+    def test_pending_transient_updates_are_lost_on_restart(self):
+        nvm = self.create_nvm()
+        nvm.update('state', 1)
+        nvm.update('state', 2, transient=True)
+        nvm.close()
+
+        self.assertEqual(1, self.create_nvm().get('state'))
+
+    def test_log_is_compacted(self):
+        nvm = self.create_nvm(compaction_threshold=4)
+        for i in range(5):
+            nvm.update('i', i)
+        nvm.close()
+
+        self.assertEqual(1, len(self.read_lines()))
+        self.assertEqual(4, self.create_nvm().get('i'))
+
+    def test_torn_record_is_dropped(self):
+        nvm = self.create_nvm()
+        nvm.update('a', 1)
+        nvm.close()
+
+        with open(self.path, 'a') as f:
+            f.write('{"a": 2, "b"')
+
+        nvm = self.create_nvm()
+        self.assertEqual({'a': 1}, nvm.data_dict)
+
+        nvm.update('b', 3)
+        nvm.close()
+        self.assertEqual({'a': 1, 'b': 3}, self.create_nvm().data_dict)
+
+    def test_log_is_rewritten_after_failed_append(self):
+        nvm = self.create_nvm()
+        nvm.update('a', 1)
+
+        log_file = nvm.file
+        self.addCleanup(log_file.close)
+
+        def torn_write(data):
+            log_file.write(data[:5])
+            log_file.flush()
+            raise OSError("No space left on device")
+
+        nvm.file = Mock(write=torn_write)
+        nvm.update('b', 2)
+        self.assertEqual({'a': 1}, nvm.committed_dict)
+
+        nvm.update('c', 3)
+        nvm.update('a', 4)
+        nvm.close()
+
+        self.assertEqual({'a': 4, 'b': 2, 'c': 3}, self.create_nvm().data_dict)
+
+    def test_undecodable_record_is_dropped(self):
+        nvm = self.create_nvm()
+        nvm.update('a', 1)
+        nvm.close()
+
+        with open(self.path, 'ab') as f:
+            f.write(b'{"a": "\xff\xfe"}\n')
+
+        nvm = self.create_nvm()
+        self.assertEqual({'a': 1}, nvm.data_dict)
+
+        nvm.update('b', 3)
+        nvm.close()
+        self.assertEqual({'a': 1, 'b': 3}, self.create_nvm().data_dict)
+
+    def test_legacy_single_json_file_is_loaded(self):
+        with open(self.path, 'w') as f:
+            json.dump({'current_state_id': 2, 'firmware_image_size': 100}, f)
+
+        nvm = self.create_nvm()
+        nvm.update('firmware_image_size', 200)
+        nvm.close()
+
+        self.assertEqual({'current_state_id': 2, 'firmware_image_size': 200}, self.create_nvm().data_dict)
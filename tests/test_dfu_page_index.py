@@ -0,0 +1,75 @@
+import binascii
+import os
+import tempfile
+import unittest
+
+from silvair_otau_demo.dfu_logic.dfu_page_index import DFUPageIndex, PAGE_INDEX_MAGIC, PAGE_INDEX_RECORD
+
+
+class DFUPageIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'firmware.idx')
+        self.firmware_path = os.path.join(self.tmp_dir.name, 'firmware')
+        self.pages = [bytes([i]) * 64 for i in range(7)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_index(self):
+        page_index = DFUPageIndex(self.path)
+        self.addCleanup(page_index.close)
+        return page_index
+
+    def store_pages(self, page_index):
+        with open(self.firmware_path, 'wb') as f:
+            for number, page in enumerate(self.pages):
+                f.write(page)
+                page_index.append(number * 64, len(page), page)
+
+    def test_entries_follow_appended_pages(self):
+        page_index = self.create_index()
+        self.assertEqual(0, page_index.end_offset)
+
+        self.store_pages(page_index)
+
+        self.assertEqual([(number * 64, 64, binascii.crc32(page)) for number, page in enumerate(self.pages)],
+                         page_index.entries)
+        self.assertEqual(len(self.pages) * 64, page_index.end_offset)
+
+    def test_index_is_reloaded_from_file(self):
+        page_index = self.create_index()
+        self.store_pages(page_index)
+        page_index.close()
+
+        reloaded = self.create_index()
+        self.assertEqual(page_index.entries, reloaded.entries)
+
+    def test_truncate_keeps_first_entries(self):
+        page_index = self.create_index()
+        self.store_pages(page_index)
+        page_index.truncate(3)
+
+        self.assertEqual(3 * 64, page_index.end_offset)
+        self.assertEqual(len(PAGE_INDEX_MAGIC) + 3 * PAGE_INDEX_RECORD.size, os.path.getsize(self.path))
+
+    def test_verify_pages_reports_corrupted_pages_in_range(self):
+        page_index = self.create_index()
+        self.store_pages(page_index)
+
+        with open(self.firmware_path, 'r+b') as f:
+            f.seek(5 * 64 + 1)
+            f.write(b'\xFF')
+
+        self.assertEqual([5], page_index.verify_pages(self.firmware_path))
+        self.assertEqual([5], page_index.verify_pages(self.firmware_path, 4, 2))
+        self.assertEqual([], page_index.verify_pages(self.firmware_path, 0, 5))
+
+    def test_unsupported_format_is_ignored(self):
+        with open(self.path, 'wb') as f:
+            f.write(bytes(12))
+
+        page_index = self.create_index()
+        self.assertEqual([], page_index.entries)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(PAGE_INDEX_MAGIC, f.read())
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from silvair_otau_demo.dfu_logic.dfu_session_timer import DFUSessionTimer, DFU_SESSION_PHASES
+
+
+class DFUSessionTimerTests(unittest.TestCase):
+    def setUp(self):
+        self.memory = Mock(io_time=1.0)
+        self.nvm = Mock(write_time=2.0, write_count=10)
+        patcher = patch('silvair_otau_demo.dfu_logic.dfu_session_timer.time.monotonic', return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.timer = DFUSessionTimer(self.memory, self.nvm)
+
+    def test_record_contains_every_phase(self):
+        record = self.timer.record('failed')
+
+        self.assertEqual('failed', record['result'])
+        self.assertFalse(record['resumed'])
+        for phase in DFU_SESSION_PHASES:
+            self.assertEqual(0.0, record[phase + '_s'])
+            self.assertEqual(0, record[phase + '_count'])
+
+    def test_phases_states_and_counters_are_relative_to_session_start(self):
+        self.timer.start(resumed=True)
+        self.timer.state_changed('Upload')
+        self.timer.add('write_data', 0.25)
+        self.timer.add('write_data', 0.5)
+        self.monotonic.return_value = 101.5
+        self.timer.state_changed('UploadPage')
+        self.monotonic.return_value = 102.0
+        self.memory.io_time = 1.5
+        self.nvm.write_time = 2.25
+        self.nvm.write_count = 13
+
+        record = self.timer.record('complete')
+
+        self.assertTrue(record['resumed'])
+        self.assertEqual(2.0, record['total_s'])
+        self.assertEqual({'Upload': 1.5, 'UploadPage': 0.5}, record['states_s'])
+        self.assertEqual(0.75, record['write_data_s'])
+        self.assertEqual(2, record['write_data_count'])
+        self.assertEqual(0.5, record['file_io_s'])
+        self.assertEqual(0.25, record['nvm_write_s'])
+        self.assertEqual(3, record['nvm_write_count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
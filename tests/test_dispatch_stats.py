@@ -0,0 +1,69 @@
+import unittest
+
+from silvair_otau_demo.dispatch_stats import LogHistogram, DispatchStats, HISTOGRAM_BUCKETS, opcode_name
+
+
+class LogHistogramTests(unittest.TestCase):
+    def test_values_fall_into_buckets_bounding_them(self):
+        for value in list(range(100)) + [1000, 123456, 10 ** 9, 2 ** 40 - 1]:
+            histogram = LogHistogram()
+            histogram.record(value)
+
+            index = histogram.buckets.index(1)
+            self.assertLessEqual(value, LogHistogram.bucket_upper_bound(index))
+            self.assertLessEqual(LogHistogram.bucket_upper_bound(index), value * 1.25 + 1)
+            if index:
+                self.assertGreater(value, LogHistogram.bucket_upper_bound(index - 1))
+
+    def test_longer_values_fall_into_last_bucket(self):
+        histogram = LogHistogram()
+        histogram.record(2 ** 50)
+
+        self.assertEqual(1, histogram.buckets[HISTOGRAM_BUCKETS - 1])
+        self.assertEqual(2 ** 50, histogram.percentile(0.99))
+
+    def test_percentiles(self):
+        histogram = LogHistogram()
+        for value in range(1, 1001):
+            histogram.record(value * 1000)
+
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(1000 * 1000, snapshot['max'])
+        for name, expected in (('p50', 500 * 1000), ('p90', 900 * 1000), ('p99', 990 * 1000)):
+            self.assertGreaterEqual(snapshot[name], expected)
+            self.assertLessEqual(snapshot[name], expected * 1.25)
+
+    def test_empty_histogram(self):
+        self.assertEqual({'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}, LogHistogram().snapshot())
+
+
+class DispatchStatsTests(unittest.TestCase):
+    def test_snapshot_in_microseconds_per_opcode(self):
+        stats = DispatchStats()
+        stats.record(0xFE, 5000, 2000)
+
+        snapshot = stats.snapshot()
+
+        self.assertEqual({opcode_name(0xFE): {'count': 1,
+                                              'latency_us': {'p50': 5.0, 'p90': 5.0, 'p99': 5.0, 'max': 5.0},
+                                              'cpu_us': {'p50': 2.0, 'p90': 2.0, 'p99': 2.0, 'max': 2.0}}},
+                         snapshot)
+
+    def test_requested_summary_covers_frame_being_handled(self):
+        stats = DispatchStats()
+        summaries = []
+        stats.record(0xFE, 5000, 2000)
+
+        stats.request_summary(summaries.append)
+        self.assertEqual([], summaries)
+        stats.record(0xFE, 7000, 3000)
+        stats.record(0xFE, 1000, 1000)
+
+        self.assertEqual(1, len(summaries))
+        self.assertEqual(2, summaries[0][opcode_name(0xFE)]['count'])
+        self.assertEqual(1, stats.snapshot()[opcode_name(0xFE)]['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
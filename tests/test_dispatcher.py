@@ -0,0 +1,104 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from silvair_uart_common_libs.messages import UartCommand, PingRequestMessage, DfuWriteDataEventMessage
+
+from silvair_otau_demo.dispatcher import Dispatcher, WRITE_DATA_OFFSET
+
+
+def write_data_frame(data):
+    return bytes([len(data) + 1, UartCommand.DfuWriteDataEvent, len(data)]) + data
+
+
+class DispatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.uart_fsm_mock = Mock()
+        self.dfu_fsm_mock = Mock()
+
+        self.dispatcher = Dispatcher(self.uart_fsm_mock, self.dfu_fsm_mock)
+
+    def test_uart_message_is_passed_to_uart_fsm(self):
+        msg = PingRequestMessage()
+        self.dispatcher.dispatch(msg)
+
+        self.uart_fsm_mock.handle_message.assert_called_once_with(msg)
+        self.dfu_fsm_mock.handle_message.assert_not_called()
+
+    def test_dfu_message_is_passed_to_dfu_fsm(self):
+        msg = DfuWriteDataEventMessage()
+        self.dispatcher.dispatch(msg)
+
+        self.dfu_fsm_mock.handle_message.assert_called_once_with(msg)
+        self.uart_fsm_mock.handle_message.assert_not_called()
+
+    def test_unhandled_opcodes_are_counted(self):
+        msg = Mock()
+        msg.type = max(UartCommand) + 1
+
+        self.dispatcher.dispatch(msg)
+        self.dispatcher.dispatch(msg)
+
+        self.assertEqual(2, self.dispatcher.unhandled_opcodes[msg.type])
+        self.uart_fsm_mock.handle_message.assert_not_called()
+        self.dfu_fsm_mock.handle_message.assert_not_called()
+
+    @patch('silvair_otau_demo.dispatcher.message_factory')
+    def test_write_data_fast_path_skips_message_factory(self, message_factory_mock):
+        frame = write_data_frame(b"\xAA\xBB\xCC\xDD")
+        msg = DfuWriteDataEventMessage()
+        msg.data = frame[WRITE_DATA_OFFSET:]
+        message_factory_mock.deserialize_message.return_value = msg
+        self.dfu_fsm_mock.dfu_write_data_payload_event.return_value = True
+
+        self.dispatcher.new_frame_notification(frame)
+        self.assertTrue(self.dispatcher.write_data_fast_path)
+        self.dfu_fsm_mock.handle_message.assert_called_once_with(msg)
+        message_factory_mock.deserialize_message.reset_mock()
+
+        self.dispatcher.new_frame_notification(frame)
+        message_factory_mock.deserialize_message.assert_not_called()
+        data = self.dfu_fsm_mock.dfu_write_data_payload_event.call_args[0][0]
+        self.assertIsInstance(data, memoryview)
+        self.assertEqual(b"\xAA\xBB\xCC\xDD", bytes(data))
+
+    @patch('silvair_otau_demo.dispatcher.message_factory')
+    def test_write_data_not_handled_by_fast_path_goes_through_message_factory(self, message_factory_mock):
+        frame = write_data_frame(b"\xAA\xBB")
+        msg = DfuWriteDataEventMessage()
+        msg.data = frame[WRITE_DATA_OFFSET:]
+        message_factory_mock.deserialize_message.return_value = msg
+        self.dispatcher.write_data_fast_path = True
+        self.dfu_fsm_mock.dfu_write_data_payload_event.return_value = False
+
+        self.dispatcher.new_frame_notification(frame)
+        self.dfu_fsm_mock.handle_message.assert_called_once_with(msg)
+
+    @patch('silvair_otau_demo.dispatcher.message_factory')
+    def test_write_data_fast_path_disabled_on_layout_mismatch(self, message_factory_mock):
+        frame = write_data_frame(b"\xAA\xBB")
+        msg = DfuWriteDataEventMessage()
+        msg.data = b"\xBB"
+        message_factory_mock.deserialize_message.return_value = msg
+
+        self.dispatcher.new_frame_notification(frame)
+        self.dispatcher.new_frame_notification(frame)
+
+        self.assertFalse(self.dispatcher.write_data_fast_path)
+        self.dfu_fsm_mock.dfu_write_data_payload_event.assert_not_called()
+        self.assertEqual(2, self.dfu_fsm_mock.handle_message.call_count)
+
+    @patch('silvair_otau_demo.dispatcher.message_factory')
+    def test_frame_handling_time_is_recorded_per_opcode(self, message_factory_mock):
+        frame = write_data_frame(b"\xAA\xBB")
+        msg = DfuWriteDataEventMessage()
+        msg.data = frame[WRITE_DATA_OFFSET:]
+        message_factory_mock.deserialize_message.return_value = msg
+
+        self.dispatcher.new_frame_notification(frame)
+        self.dispatcher.new_frame_notification(frame)
+
+        snapshot = self.dispatcher.latency_snapshot(reset=True)
+        self.assertEqual([UartCommand.DfuWriteDataEvent.name], list(snapshot))
+        self.assertEqual(2, snapshot[UartCommand.DfuWriteDataEvent.name]['count'])
+        self.assertEqual({'p50', 'p90', 'p99', 'max'}, set(snapshot[UartCommand.DfuWriteDataEvent.name]['cpu_us']))
+        self.assertEqual({}, self.dispatcher.latency_snapshot())
@@ -0,0 +1,67 @@
+import threading
+import unittest
+from unittest.mock import Mock
+
+from silvair_otau_demo.event_bus import EventBus, EventSink, EVENT_NAMES
+
+
+class BlockingConsumer:
+    def __init__(self):
+        self.release = threading.Event()
+        self.offsets = []
+
+    def dfu_page_stored(self, firmware_offset):
+        self.release.wait(timeout=5)
+        self.offsets.append(firmware_offset)
+
+
+class EventBusTests(unittest.TestCase):
+    def test_events_are_delivered_to_all_sinks_on_their_threads(self):
+        consumers = [Mock(), Mock()]
+        caller_threads = []
+        for consumer in consumers:
+            consumer.dfu_page_stored.side_effect = lambda offset: caller_threads.append(threading.current_thread())
+
+        event_bus = EventBus(consumers)
+        event_bus.start()
+        event_bus.dfu_initialized(64, b"\x00", b"\xFF", 0)
+        event_bus.dfu_page_stored(16)
+        event_bus.dfu_update_complete()
+        event_bus.stop()
+
+        for consumer in consumers:
+            consumer.dfu_initialized.assert_called_once_with(64, b"\x00", b"\xFF", 0)
+            consumer.dfu_page_stored.assert_called_once_with(16)
+            consumer.dfu_update_complete.assert_called_once_with()
+            consumer.stop.assert_called_once_with()
+        self.assertNotIn(threading.current_thread(), caller_threads)
+        self.assertEqual(2, len(set(caller_threads)))
+
+    def test_all_events_are_published(self):
+        consumer = Mock()
+        event_bus = EventBus((consumer,))
+        event_bus.start()
+
+        for name in EVENT_NAMES:
+            getattr(event_bus, name)()
+        event_bus.stop()
+
+        for name in EVENT_NAMES:
+            getattr(consumer, name).assert_called_once_with()
+
+    def test_slow_sink_drops_events(self):
+        consumer = BlockingConsumer()
+        sink = EventSink(consumer, max_depth=2)
+        sink.start()
+        self.addCleanup(sink.stop)
+
+        for offset in range(0, 80, 16):
+            sink.publish('dfu_page_stored', (offset,), 0.0)
+
+        # First event may already be held by consumer, at most max_depth others are queued
+        self.assertGreaterEqual(sink.metrics()['dropped'], 2)
+        consumer.release.set()
+        sink.stop()
+
+        self.assertEqual(5, len(consumer.offsets) + sink.metrics()['dropped'])
+        self.assertEqual(sorted(consumer.offsets), consumer.offsets)
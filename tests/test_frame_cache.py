@@ -0,0 +1,97 @@
+import struct
+import threading
+import unittest
+from unittest.mock import Mock
+
+from silvair_uart_common_libs.messages import UartCommand
+
+from silvair_otau_demo.frame_cache import FrameCache
+
+
+class StatusResponse:
+    type = UartCommand.DfuStatusResponse
+
+    def __init__(self, status, firmware_offset, firmware_crc):
+        self.status = status
+        self.firmware_offset = firmware_offset
+        self.firmware_crc = firmware_crc
+
+
+class PageStoreResponse:
+    type = UartCommand.DfuPageStoreResponse
+
+    def __init__(self, status):
+        self.status = status
+
+
+def serialize(msg):
+    if msg.type == UartCommand.DfuStatusResponse:
+        return struct.pack('<BBBII', 10, msg.type, msg.status, msg.firmware_offset, msg.firmware_crc)
+    return struct.pack('<BBB', 1, msg.type, msg.status)
+
+
+class FrameCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.serialize_mock = Mock(side_effect=serialize)
+        self.frame_cache = FrameCache(self.serialize_mock, max_size=2)
+
+    def test_constant_frame_is_serialized_once(self):
+        for _ in range(3):
+            self.assertEqual(serialize(PageStoreResponse(0)), self.frame_cache.get_frame(PageStoreResponse(0)))
+
+        self.assertEqual(1, self.serialize_mock.call_count)
+        self.assertEqual(2, self.frame_cache.hits)
+
+    def test_least_recently_used_frame_is_evicted(self):
+        for status in (0, 1, 0, 2):
+            self.frame_cache.get_frame(PageStoreResponse(status))
+
+        self.assertEqual(2, len(self.frame_cache.frames))
+        self.serialize_mock.reset_mock()
+
+        self.frame_cache.get_frame(PageStoreResponse(0))
+        self.serialize_mock.assert_not_called()
+        self.frame_cache.get_frame(PageStoreResponse(1))
+        self.serialize_mock.assert_called_once()
+
+    def test_frames_requested_from_several_threads(self):
+        frame_cache = FrameCache(serialize, max_size=4)
+        errors = []
+
+        def send_frames():
+            try:
+                for i in range(2000):
+                    msg = PageStoreResponse(i % 7)
+                    self.assertEqual(serialize(msg), frame_cache.get_frame(msg))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=send_frames) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertLessEqual(len(frame_cache.frames), 4)
+        self.assertEqual(4 * 2000, frame_cache.hits + frame_cache.misses)
+
+    def test_variable_fields_are_patched(self):
+        for offset in range(0, 4096, 256):
+            msg = StatusResponse(0, offset, offset * 7)
+            self.assertEqual(serialize(msg), self.frame_cache.get_frame(msg))
+
+        # First frame is serialized and stored, second one is verified after patching
+        self.assertEqual(2, self.serialize_mock.call_count)
+        self.assertEqual(1, len(self.frame_cache.frames))
+
+    def test_patching_disabled_when_frame_layout_differs(self):
+        def serialize_crc_first(msg):
+            return struct.pack('<BBBII', 10, msg.type, msg.status, msg.firmware_crc, msg.firmware_offset)
+
+        frame_cache = FrameCache(serialize_crc_first)
+        for offset in range(0, 1024, 256):
+            msg = StatusResponse(0, offset, offset + 1)
+            self.assertEqual(serialize_crc_first(msg), frame_cache.get_frame(msg))
+
+        self.assertIn(UartCommand.DfuStatusResponse, frame_cache.unpatchable_types)
@@ -0,0 +1,156 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from click.testing import CliRunner
+
+from silvair_uart_common_libs.message_types import ModemState
+
+from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr
+from silvair_otau_demo.frame_capture import FrameCapture, read_capture, read_capture_sessions, CAPTURE_INBOUND, \
+    CAPTURE_OUTBOUND, CAPTURE_SESSION
+from silvair_otau_demo.modem_sim import ModemSimulator
+from silvair_otau_demo.replay import replay, replay_session, session_matches, copy_dfu_files
+from silvair_otau_demo.script_mgr import McuOtauMock
+
+FIRMWARE = bytes(i % 251 for i in range(2048 + 100))
+
+
+class FrameCaptureTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def record(self, capture, frames):
+        for kind, frame in frames:
+            if kind == CAPTURE_INBOUND:
+                capture.record_inbound(frame)
+            else:
+                capture.record_outbound(frame)
+
+    def capture(self, name, frames):
+        capture = FrameCapture(os.path.join(self.tmp_dir.name, name), {'supported_page_size': 1024})
+        self.record(capture, frames)
+        capture.close()
+        return capture.path
+
+    def test_every_session_is_captured_to_its_own_file(self):
+        first = [(CAPTURE_OUTBOUND, b"\x00\x01"), (CAPTURE_INBOUND, b"\x01\x02\x03")]
+        second = [(CAPTURE_INBOUND, b"\x02" * 300)]
+
+        for name in ('capture', 'capture.gz', 'capture.xz'):
+            with self.subTest(name=name):
+                paths = [self.capture(name, frames) for frames in (first, second)]
+
+                self.assertNotEqual(paths[0], paths[1])
+                self.assertTrue(paths[0].endswith(os.path.splitext(name)[1]))
+                for path, frames in zip(paths, (first, second)):
+                    [(info, records)] = read_capture_sessions(path)
+                    self.assertEqual(1024, info['supported_page_size'])
+                    self.assertEqual(frames, [(kind, frame) for kind, _, frame in records])
+                    timestamps = [timestamp for _, timestamp, _ in records]
+                    self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_flushed_frames_are_read_without_close(self):
+        for name in ('capture', 'capture.gz', 'capture.xz'):
+            with self.subTest(name=name):
+                capture = FrameCapture(os.path.join(self.tmp_dir.name, name))
+                self.addCleanup(capture.close)
+                self.record(capture, [(CAPTURE_INBOUND, bytes([i]) * 40) for i in range(100)])
+                capture.flush()
+                # Recorded after the last flush, lost when writer is abandoned
+                capture.record_outbound(b"\xFF" * 40)
+
+                records = list(read_capture(capture.path))
+
+                self.assertEqual([bytes([i]) * 40 for i in range(100)], [frame for _, _, frame in records[1:]])
+
+    def test_truncated_capture_tail_is_ignored(self):
+        path = self.capture('capture.gz', [(CAPTURE_INBOUND, b"\x01" * 100)] * 50)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-20])
+
+        records = list(read_capture(path))
+
+        self.assertEqual(CAPTURE_SESSION, records[0][0])
+        self.assertTrue(all(frame == b"\x01" * 100 for _, _, frame in records[1:]))
+
+    def capture_otau(self):
+        capture_file = os.path.join(self.tmp_dir.name, 'otau.cap.gz')
+        device_dir = os.path.join(self.tmp_dir.name, 'device')
+        os.mkdir(device_dir)
+        modem_sim = ModemSimulator(FIRMWARE, page_size=512, chunk_size=64, initial_state=ModemState.Node)
+        self.addCleanup(modem_sim.stop)
+        mcu_otau_mock = McuOtauMock(modem_sim,
+                                    Mock(),
+                                    DFUFailMgr(),
+                                    os.path.join(device_dir, 'otau_app_data'),
+                                    os.path.join(device_dir, 'otau_firmware.bin'),
+                                    os.path.join(device_dir, 'otau_sha256'),
+                                    os.path.join(device_dir, 'otau.nvm'),
+                                    1024,
+                                    0,
+                                    None,
+                                    ("1300",),
+                                    capture_file=capture_file)
+        # Simulator started after MCU, so that frames MCU sends at start are recorded before modem responses
+        modem_sim.start()
+        self.assertTrue(modem_sim.wait(timeout=10), modem_sim.error)
+        modem_sim.stop()
+        capture_path = mcu_otau_mock.capture.path
+        mcu_otau_mock.delete_objects()
+        return modem_sim, capture_path
+
+    def test_captured_otau_replays_with_matching_responses(self):
+        modem_sim, capture_path = self.capture_otau()
+        [(info, records)] = read_capture_sessions(capture_path)
+        replay_dir = os.path.join(self.tmp_dir.name, 'replay')
+        os.mkdir(replay_dir)
+
+        result = replay_session(info, records, replay_dir)
+
+        self.assertTrue(session_matches(result), (result['missing_frames'], result['additional_frames']))
+        self.assertEqual(modem_sim.sent_frames, result['received_frames'])
+        with open(os.path.join(replay_dir, 'otau_firmware.bin'), 'rb') as f:
+            self.assertEqual(FIRMWARE, f.read())
+
+        info['supported_page_size'] = 256
+        replay_dir = os.path.join(self.tmp_dir.name, 'replay_256')
+        os.mkdir(replay_dir)
+        result = replay_session(info, records, replay_dir)
+
+        self.assertFalse(session_matches(result))
+
+    def test_replay_sessions_start_from_copies_of_work_dir(self):
+        _, capture_path = self.capture_otau()
+        work_dir = os.path.join(self.tmp_dir.name, 'work')
+        os.mkdir(work_dir)
+        with open(os.path.join(work_dir, 'otau.nvm'), 'w'):
+            pass
+
+        # The same session twice, the second one would resume from DFU state left by the first one in shared files
+        result = CliRunner().invoke(replay, [capture_path, capture_path, '--work_dir', work_dir])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(2, result.output.splitlines().count('  MATCH'))
+        self.assertEqual(['otau.nvm'], os.listdir(work_dir))
+        self.assertEqual(0, os.path.getsize(os.path.join(work_dir, 'otau.nvm')))
+
+    def test_dfu_files_are_copied_by_configured_names(self):
+        _, capture_path = self.capture_otau()
+        [(info, _)] = read_capture_sessions(capture_path)
+        device_dir = os.path.join(self.tmp_dir.name, 'device')
+        replay_dir = os.path.join(self.tmp_dir.name, 'replay')
+        os.mkdir(replay_dir)
+
+        copy_dfu_files(info, device_dir, replay_dir)
+
+        self.assertEqual(sorted(os.listdir(device_dir)), sorted(os.listdir(replay_dir)))
+        self.assertIn('otau.nvm', os.listdir(replay_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
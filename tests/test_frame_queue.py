@@ -0,0 +1,128 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from silvair_uart_common_libs.messages import UartCommand
+
+from silvair_otau_demo.frame_capture import FrameCapture, read_capture, CAPTURE_INBOUND
+from silvair_otau_demo.frame_queue import FrameQueue
+
+
+def frame(opcode, payload=b"\x00"):
+    return bytes([len(payload), opcode]) + payload
+
+
+class RecordingObserver:
+    def __init__(self):
+        self.frames = []
+        self.received = threading.Event()
+        self.expected = 0
+
+    def new_frame_notification(self, data):
+        self.frames.append(data)
+        if len(self.frames) >= self.expected:
+            self.received.set()
+
+
+class FrameQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.observer = RecordingObserver()
+
+    def create_queue(self, max_depth=8, **kwargs):
+        frame_queue = FrameQueue(self.observer, max_depth, **kwargs)
+        self.addCleanup(frame_queue.stop)
+        return frame_queue
+
+    def wait_for_frames(self, count):
+        self.observer.expected = count
+        self.assertTrue(self.observer.received.wait(timeout=5))
+
+    def test_frames_are_passed_on_worker_thread(self):
+        frame_queue = self.create_queue()
+        frame_queue.start()
+
+        frame_queue.new_frame_notification(frame(UartCommand.PingRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.DfuWriteDataEvent))
+        self.wait_for_frames(2)
+
+        self.assertEqual(2, frame_queue.metrics()['enqueued'])
+        self.assertIsNot(threading.current_thread(), frame_queue.worker)
+
+    def test_dfu_frames_are_passed_first(self):
+        frame_queue = self.create_queue()
+
+        frame_queue.new_frame_notification(frame(UartCommand.SensorUpdateRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.MeshMessageRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.DfuWriteDataEvent))
+        frame_queue.start()
+        self.wait_for_frames(3)
+
+        self.assertEqual([frame(UartCommand.DfuWriteDataEvent),
+                          frame(UartCommand.SensorUpdateRequest),
+                          frame(UartCommand.MeshMessageRequest)], self.observer.frames)
+
+    def test_full_queue_drops_non_priority_frames(self):
+        frame_queue = self.create_queue(max_depth=2)
+
+        frame_queue.new_frame_notification(frame(UartCommand.SensorUpdateRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.MeshMessageRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.PingRequest))
+        frame_queue.new_frame_notification(frame(UartCommand.DfuWriteDataEvent))
+        frame_queue.start()
+        self.wait_for_frames(2)
+        time.sleep(0.05)
+
+        self.assertEqual([frame(UartCommand.DfuWriteDataEvent), frame(UartCommand.MeshMessageRequest)],
+                         self.observer.frames)
+        metrics = frame_queue.metrics()
+        self.assertEqual(2, metrics['dropped'])
+        self.assertEqual(2, metrics['max_depth'])
+        self.assertEqual(0, metrics['depth'])
+        self.assertGreater(metrics['wait_time_max'], 0)
+
+    def test_frames_are_captured_as_they_arrive(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        capture = FrameCapture(os.path.join(tmp_dir.name, 'capture'))
+        frame_queue = self.create_queue(max_depth=1, capture=capture)
+
+        frames = [frame(UartCommand.SensorUpdateRequest), frame(UartCommand.PingRequest)]
+        for data in frames:
+            frame_queue.new_frame_notification(data)
+        capture.close()
+
+        self.assertEqual(1, frame_queue.metrics()['dropped'])
+        captured = [payload for kind, _, payload in read_capture(capture.path) if kind == CAPTURE_INBOUND]
+        self.assertEqual(frames, captured)
+
+    def test_metrics_are_reported_per_interval(self):
+        reports = []
+        reported = threading.Event()
+
+        def metrics_handler(metrics):
+            reports.append(metrics)
+            reported.set()
+
+        frame_queue = self.create_queue(metrics_handler=metrics_handler, metrics_interval=0.05)
+        frame_queue.start()
+
+        for _ in range(3):
+            frame_queue.new_frame_notification(frame(UartCommand.DfuWriteDataEvent))
+        self.wait_for_frames(3)
+        self.assertTrue(reported.wait(timeout=5))
+        time.sleep(0.1)
+
+        # Intervals without frames are not reported, metrics start over after every report
+        report_count = len(reports)
+        time.sleep(0.2)
+        self.assertEqual(report_count, len(reports))
+        self.assertEqual(0, frame_queue.metrics()['enqueued'])
+
+        self.assertEqual(3, sum(metrics['enqueued'] for metrics in reports))
+        self.assertEqual(0, sum(metrics['dropped'] for metrics in reports))
+        self.assertGreaterEqual(max(metrics['max_depth'] for metrics in reports), 1)
+        for metrics in reports:
+            self.assertGreaterEqual(metrics['wait_time_max'], metrics['wait_time_avg'])
+            self.assertGreaterEqual(metrics['interval'], 0.05)
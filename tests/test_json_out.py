@@ -0,0 +1,76 @@
+import io
+import json
+import time
+import unittest
+
+from silvair_uart_common_libs.message_types import Error
+
+from silvair_otau_demo.dfu_logic.states.dfu_fsm_states import DFUState
+from silvair_otau_demo.json_out import JsonLinesEventMgr
+
+
+class JsonLinesEventMgrTests(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def records(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_are_written_in_batches(self):
+        event_mgr = JsonLinesEventMgr(self.stream, batch_size=3, flush_interval=60)
+
+        event_mgr.dfu_state_changed(DFUState.Upload)
+        event_mgr.dfu_initialized(64, b"\x01\x02", b"\xFF", 0)
+        self.assertEqual('', self.stream.getvalue())
+
+        event_mgr.dfu_page_stored(16)
+        records = self.records()
+        self.assertEqual(['dfu_state_changed', 'dfu_initialized', 'dfu_page_stored'],
+                         [record['event'] for record in records])
+        self.assertEqual('Upload', records[0]['state'])
+        self.assertEqual({'firmware_size': 64, 'firmware_sha256': '0102', 'app_data': 'ff', 'bytes': 0},
+                         {key: records[1][key] for key in ('firmware_size', 'firmware_sha256', 'app_data', 'bytes')})
+        self.assertEqual(16, records[2]['bytes'])
+        self.assertEqual(sorted(record['time'] for record in records), [record['time'] for record in records])
+
+    def test_record_is_written_after_flush_interval_without_further_events(self):
+        event_mgr = JsonLinesEventMgr(self.stream, flush_interval=0.05)
+        self.addCleanup(event_mgr.stop)
+
+        event_mgr.uart_startup_timing({'total_s': 0.5})
+        self.assertEqual('', self.stream.getvalue())
+
+        deadline = time.monotonic() + 5
+        while not self.stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(['uart_startup_timing'], [record['event'] for record in self.records()])
+
+    def test_dfu_end_is_flushed_immediately(self):
+        event_mgr = JsonLinesEventMgr(self.stream, flush_interval=60)
+
+        event_mgr.dfu_initialized(64, b"\x00", b"\x00", 0)
+        event_mgr.dfu_page_stored(64)
+        event_mgr.dfu_update_complete()
+
+        record = self.records()[-1]
+        self.assertEqual('dfu_update_complete', record['event'])
+        self.assertEqual(64, record['bytes'])
+        self.assertEqual(64, record['firmware_size'])
+
+    def test_event_time_is_used_as_timestamp(self):
+        event_mgr = JsonLinesEventMgr(self.stream)
+        event_mgr.event_time = 12.5
+
+        event_mgr.dfu_error("Initializing memory failed")
+
+        self.assertEqual({'time': 12.5, 'event': 'dfu_error', 'message': "Initializing memory failed"},
+                         self.records()[0])
+
+    def test_not_recoverable_uart_error_exits(self):
+        event_mgr = JsonLinesEventMgr(self.stream)
+
+        with self.assertRaises(SystemExit):
+            event_mgr.uart_error(Error.NoLicenseForModelRegistration)
+
+        self.assertTrue(self.records()[0]['not_recoverable'])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from silvair_uart_common_libs.message_types import ModemState
+from silvair_uart_common_libs.messages import UartCommand
+
+from silvair_otau_demo.dfu_logic.dfu_fail_mgr import DFUFailMgr
+from silvair_otau_demo.dfu_logic.dfu_memory import DFUStorageMode
+from silvair_otau_demo.modem_sim import ModemSimulator
+from silvair_otau_demo.script_mgr import McuOtauMock
+from silvair_otau_demo.uart_logic.states.uart_fsm_states import UART_FSMState
+
+FIRMWARE = bytes(i % 251 for i in range(4096 + 100))
+
+
+class ModemSimulatorTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.event_mgr_mock = Mock()
+
+    def run_otau(self, modem_sim, supported_page_size=1024, storage_mode=DFUStorageMode.MEMORY):
+        modem_sim.start()
+        self.addCleanup(modem_sim.stop)
+
+        mcu_otau_mock = McuOtauMock(modem_sim,
+                                    self.event_mgr_mock,
+                                    DFUFailMgr(),
+                                    os.path.join(self.tmp_dir.name, 'app_data'),
+                                    os.path.join(self.tmp_dir.name, 'firmware'),
+                                    os.path.join(self.tmp_dir.name, 'sha256'),
+                                    os.path.join(self.tmp_dir.name, 'nvm'),
+                                    supported_page_size,
+                                    0,
+                                    None,
+                                    ("1300",),
+                                    storage_mode)
+        self.addCleanup(mcu_otau_mock.delete_objects)
+
+        self.assertTrue(modem_sim.wait(timeout=10), modem_sim.error)
+        self.assertEqual(UART_FSMState.Node, mcu_otau_mock.uart_fsm.current_state_id)
+        return mcu_otau_mock
+
+    def read_firmware(self):
+        with open(os.path.join(self.tmp_dir.name, 'firmware'), 'rb') as f:
+            return f.read()
+
+    def test_otau_from_init_device(self):
+        modem_sim = ModemSimulator(FIRMWARE, page_size=512, chunk_size=64, app_data=b"\x01\x02")
+
+        self.run_otau(modem_sim)
+
+        self.assertEqual(FIRMWARE, self.read_firmware())
+        self.event_mgr_mock.dfu_update_complete.assert_called_once_with()
+        self.assertGreater(modem_sim.dfu_time, 0)
+        summary = self.event_mgr_mock.dfu_latency_summary.call_args[0][0]
+        self.assertGreater(summary[UartCommand.DfuWriteDataEvent.name]['count'], 0)
+        # Frame ending DFU is recorded before summary is taken
+        self.assertEqual((len(FIRMWARE) + 511) // 512, summary[UartCommand.DfuPageStoreRequest.name]['count'])
+        timing = self.event_mgr_mock.dfu_session_timing.call_args[0][0]
+        self.assertEqual('complete', timing['result'])
+        self.assertGreater(timing['write_data_count'], 0)
+        self.assertEqual(1, timing['sha_validation_count'])
+        self.assertGreater(timing['nvm_write_count'], 0)
+        startup = self.event_mgr_mock.uart_startup_timing.call_args[0][0]
+        self.assertIn(UART_FSMState.InitDevice.name, startup['states_s'])
+        self.assertGreaterEqual(startup['to_node_s'], 0)
+
+    def test_otau_from_node_with_smaller_supported_page_size(self):
+        modem_sim = ModemSimulator(FIRMWARE, page_size=4096, chunk_size=100, initial_state=ModemState.Node)
+
+        self.run_otau(modem_sim, supported_page_size=256, storage_mode=DFUStorageMode.STREAM)
+
+        self.assertEqual(256, modem_sim.page_size)
+        self.assertEqual(FIRMWARE, self.read_firmware())